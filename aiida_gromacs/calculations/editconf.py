@@ -10,6 +10,8 @@ from aiida.engine import CalcJob
 from aiida.orm import SinglefileData, Str
 from aiida.plugins import DataFactory
 
+from aiida_gromacs.utils import largefiles
+
 EditconfParameters = DataFactory("gromacs.editconf")
 
 
@@ -44,8 +46,15 @@ class EditconfCalculation(CalcJob):
         spec.input('metadata.options.output_filename', valid_type=str, default='editconf.out')
         spec.input('grofile', valid_type=SinglefileData, help='Input structure file.')
         spec.input('parameters', valid_type=EditconfParameters, help='Command line parameters for gmx editconf.')
-        spec.input('metadata.options.output_dir', valid_type=str, default=os.getcwd(),
+        spec.input('metadata.options.output_dir', valid_type=str, default=os.getcwd,
                 help='Directory where output files will be saved when parsed.')
+        spec.input('metadata.options.large_file_policy', valid_type=str, default='retrieve',
+                validator=largefiles.validate_large_file_policy,
+                help='How output files are stored: "retrieve" keeps them in the retrieved folder as well as the outputs, '
+                     '"store_once" and "store_once_export" only store them as outputs, and export files larger than '
+                     'large_file_threshold to output_dir only with "store_once_export".')
+        spec.input('metadata.options.large_file_threshold', valid_type=int, default=largefiles.DEFAULT_LARGE_FILE_THRESHOLD,
+                help='Size in bytes above which output files are large for the large_file_policy.')
 
         # Optional inputs.
         spec.input('n_file', required=False, valid_type=SinglefileData, help='Index file.')
@@ -105,6 +114,7 @@ class EditconfCalculation(CalcJob):
         calcinfo = CalcInfo()
         calcinfo.codes_info = [codeinfo]
         calcinfo.local_copy_list = input_files
-        calcinfo.retrieve_list = output_files
+        calcinfo.retrieve_list, calcinfo.retrieve_temporary_list = \
+            largefiles.split_retrieve_list(self, output_files)
 
         return calcinfo
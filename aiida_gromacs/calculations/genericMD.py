@@ -50,7 +50,7 @@ class GenericCalculation(CalcJob):
         spec.input('metadata.options.output_filename', valid_type=str,
                 default='file.out', help='name of file produced by default.')
         spec.input('metadata.options.output_dir', valid_type=str, 
-                default=os.getcwd(),
+                default=os.getcwd,
                 help='Directory where output files will be saved '
                     'when parsed.')
 
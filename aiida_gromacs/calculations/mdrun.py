@@ -7,10 +7,105 @@ import os
 
 from aiida.common import CalcInfo, CodeInfo
 from aiida.engine import CalcJob
-from aiida.orm import SinglefileData, Dict, Str
+from aiida.orm import ArrayData, SinglefileData, Dict, RemoteData, Str
 from aiida.plugins import DataFactory
 
+from aiida_gromacs.data import remotefiles
+from aiida_gromacs.utils import largefiles
+
 MdrunParameters = DataFactory("gromacs.mdrun")
+RemoteFilesData = DataFactory("gromacs.remotefiles")
+
+# output flags whose files can be left on the remote computer
+KEEP_REMOTE_OPTIONS = ("o", "x", "cpo")
+
+# output flags of mdrun and the output port of their files
+OUTPUT_PORTS = {
+    "c": "grofile",
+    "e": "enfile",
+    "g": "logfile",
+    "o": "trrfile",
+    "x": "x_file",
+    "cpo": "cpo_file",
+    "dhdl": "dhdl_file",
+    "field": "field_file",
+    "tpi": "tpi_file",
+    "tpid": "tpid_file",
+    "eo": "eo_file",
+    "px": "px_file",
+    "pf": "pf_file",
+    "ro": "ro_file",
+    "ra": "ra_file",
+    "rs": "rs_file",
+    "rt": "rt_file",
+    "mtx": "mtx_file",
+    "if": "if_file",
+    "swap": "swap_file",
+}
+
+# output flags of the files mdrun continues writing to with -append
+APPEND_OPTIONS = ("e", "g", "o", "x", "dhdl", "field", "tpi", "tpid", "eo",
+                  "px", "pf", "ro", "ra", "rs", "rt", "if", "swap")
+
+
+def validate_keep_remote(value, _):
+    """Validate the keep_remote option only names trajectory and checkpoint flags."""
+    unknown = [flag for flag in value if flag not in KEEP_REMOTE_OPTIONS]
+    if unknown:
+        return (f"keep_remote flags {unknown} are not one of "
+                f"{', '.join(KEEP_REMOTE_OPTIONS)}")
+    return None
+
+
+def get_parent_files(inputs):
+    """
+    Get the names of the files of a previous run that mdrun continues with
+    -append, and its checkpoint if no cpi_file is given. Files the previous
+    run did not write are skipped when they are copied.
+
+    :param inputs: the inputs of the calculation
+    :returns: list of the file names in the parent folder
+    """
+    parameters = inputs.parameters
+    filenames = [parameters[item] for item in APPEND_OPTIONS if item in parameters]
+    if "cpo" in parameters and "cpi_file" not in inputs:
+        filenames.append(parameters["cpo"])
+    return filenames
+
+
+def get_thread_parameters(parameters, options, cores_per_machine=None):
+    """
+    Get the mdrun parameters placing the ranks and OpenMP threads of mdrun
+    on the resources of the job, leaving out those set in the parameters.
+
+    Each rank runs num_cores_per_mpiproc OpenMP threads. Without MPI the
+    ranks are thread-MPI ranks started by mdrun, which only run on a single
+    machine, so -ntmpi is only set for jobs on one machine. The threads are
+    only pinned to cores when the job owns its machines, using every one of
+    their cores, as gromacs does by default, since jobs sharing a machine
+    would otherwise all be pinned to its first cores. mdrun shares out the
+    cores of a machine between its ranks itself.
+
+    :param parameters: the mdrun parameters given to the calculation
+    :param options: the metadata options of the calculation
+    :param cores_per_machine: number of cores of each machine, if
+        known, otherwise the threads are not pinned
+    :returns: dictionary of the mdrun parameters to add
+    """
+    resources = options.get("resources", {})
+    ranks = resources.get("num_mpiprocs_per_machine")
+    threads = resources.get("num_cores_per_mpiproc")
+    thread_parameters = {}
+    if "nt" not in parameters:
+        if threads:
+            thread_parameters["ntomp"] = str(threads)
+        if ranks and not options.get("withmpi") and resources.get("num_machines", 1) == 1:
+            thread_parameters["ntmpi"] = str(ranks)
+    if "pin" not in parameters and ranks and cores_per_machine \
+            and ranks * (threads or 1) == cores_per_machine:
+        thread_parameters.update({"pin": "on", "pinoffset": "0", "pinstride": "1"})
+    return {key: value for key, value in thread_parameters.items()
+            if key not in parameters}
 
 
 class MdrunCalculation(CalcJob):
@@ -47,11 +142,38 @@ class MdrunCalculation(CalcJob):
         spec.input('metadata.options.output_filename', valid_type=str, default='mdrun.out')
         spec.input('tprfile', valid_type=SinglefileData, help='Input structure.')
         spec.input('parameters', valid_type=MdrunParameters, help='Command line parameters for gmx mdrun')
-        spec.input('metadata.options.output_dir', valid_type=str, default=os.getcwd(),
+        spec.input('metadata.options.output_dir', valid_type=str, default=os.getcwd,
                 help='Directory where output files will be saved when parsed.')
+        spec.input('metadata.options.large_file_policy', valid_type=str, default='retrieve',
+                validator=largefiles.validate_large_file_policy,
+                help='How output files are stored: "retrieve" keeps them in the retrieved folder as well as the outputs, '
+                     '"store_once" and "store_once_export" only store them as outputs, and export files larger than '
+                     'large_file_threshold to output_dir only with "store_once_export".')
+        spec.input('metadata.options.large_file_threshold', valid_type=int, default=largefiles.DEFAULT_LARGE_FILE_THRESHOLD,
+                help='Size in bytes above which output files are large for the large_file_policy.')
+        spec.input('metadata.options.energy_timeseries', valid_type=bool, default=False,
+                help='Extract the energies printed every nstlog steps in the log file as an ArrayData output.')
+        spec.input('metadata.options.enfile_energies', valid_type=bool, default=False,
+                help='Read the energy terms in each frame of the energy file as an ArrayData output.')
+        spec.input('metadata.options.keep_remote', valid_type=list, default=[],
+                validator=validate_keep_remote,
+                help='Output flags (o, x, cpo) whose files are left on the remote computer and recorded, with '
+                     'their size and checksum, in the remote_files output instead of being retrieved.')
+        spec.input('metadata.options.min_ns_per_day', valid_type=(int, float), required=False,
+                help='Performance floor in ns/day, below which the gromacs.mdrun_performance monitor kills the job '
+                     'after its grace period.')
+        spec.input('metadata.options.derive_thread_parameters', valid_type=bool, default=False,
+                help='Set the ntmpi, ntomp, pin, pinoffset and pinstride parameters of mdrun from the resources option '
+                     'and withmpi, unless they are given in the parameters.')
+        spec.input('metadata.options.cores_per_machine', valid_type=int, required=False,
+                help='Number of cores of each machine of the computer. With derive_thread_parameters, the threads of '
+                     'jobs using every core of their machines are pinned to the cores.')
 
         # Optional inputs.
         spec.input('cpi_file', valid_type=SinglefileData, required=False, help='Checkpoint file')
+        spec.input('parent_folder', valid_type=RemoteData, required=False,
+                help='Working directory of a previous run continued with -cpi and -append, whose output files are '
+                     'copied to the working directory.')
         spec.input('table_file', valid_type=SinglefileData, required=False, help='xvgr/xmgr file')
         spec.input('tableb_file', valid_type=SinglefileData, required=False, help='xvgr/xmgr file')
         spec.input('tablep_file', valid_type=SinglefileData, required=False, help='xvgr/xmgr file')
@@ -65,7 +187,7 @@ class MdrunCalculation(CalcJob):
 
         # Required outputs.
         spec.output('stdout', valid_type=SinglefileData, help='stdout')
-        spec.output('trrfile', valid_type=SinglefileData, help='Output trajectory.')
+        spec.output('trrfile', required=False, valid_type=SinglefileData, help='Output trajectory.')
         spec.output('grofile', valid_type=SinglefileData, help='Output structure file.')
         spec.output('logfile', valid_type=SinglefileData, help='Output log file.')
         spec.output('enfile', valid_type=SinglefileData, help='Output energy file.')
@@ -90,9 +212,16 @@ class MdrunCalculation(CalcJob):
 
         # Outputs outside of gromacs
         spec.output('logfile_metadata', valid_type=Dict, help='metadata exracted from gromacs logfile')
+        spec.output('enfile_energies', required=False, valid_type=ArrayData, help='step, time and energy terms in each frame of the gromacs energy file')
+        spec.output('energy_timeseries', required=False, valid_type=ArrayData, help='step, time and energy terms at each nstlog step exracted from gromacs logfile')
+        spec.output('remote_files', required=False, valid_type=RemoteFilesData, help='output files left on the remote computer by the keep_remote option')
         #spec.output('test', valid_type=Dict)
 
         spec.exit_code(300, 'ERROR_MISSING_OUTPUT_FILES', message='Calculation did not produce all expected output files.')
+        spec.exit_code(301, 'ERROR_OUT_OF_WALLTIME', message='mdrun was stopped by a signal before the end of the run, e.g. at the wallclock limit.')
+        spec.exit_code(302, 'ERROR_DOMAIN_DECOMPOSITION', message='No domain decomposition of the system for the number of ranks was found.')
+        spec.exit_code(303, 'ERROR_CONSTRAINT_FAILURE', message='The LINCS, SETTLE or SHAKE constraints failed, the system may be unstable.')
+        spec.exit_code(304, 'ERROR_OUT_OF_MEMORY', message='mdrun ran out of memory.')
 
     def prepare_for_submission(self, folder):
         """
@@ -106,7 +235,6 @@ class MdrunCalculation(CalcJob):
 
         # Setup data structures for files.
         input_options = ["tprfile", "cpi_file", "table_file", "tableb_file", "tablep_file", "rerun_file", "ei_file", "multidir_file", "awh_file", "membed_file", "mp_file", "mn_file"]
-        output_options = ["c", "e", "g", "o", "x", "cpo", "dhdl", "field", "tpi", "tpid", "eo", "px", "pf", "ro", "ra", "rs", "rt", "mtx", "if", "swap", "logfile_metadata"]
         cmdline_input_files = {}
         input_files = []
         output_files = []
@@ -121,15 +249,39 @@ class MdrunCalculation(CalcJob):
                         self.inputs[item].filename,
                     ))
 
+        # Copy the output files continued from a previous run, and its
+        # checkpoint to continue from if none is given.
+        remote_copy_list = []
+        if "parent_folder" in self.inputs:
+            parent_folder = self.inputs.parent_folder
+            for filename in get_parent_files(self.inputs):
+                remote_copy_list.append((
+                        parent_folder.computer.uuid,
+                        os.path.join(parent_folder.get_remote_path(), filename),
+                        filename,
+                    ))
+            if "cpo" in self.inputs.parameters and "cpi_file" not in self.inputs:
+                cmdline_input_files["cpi_file"] = self.inputs.parameters["cpo"]
+
         # Add output files to retrieve list.
         output_files.append(self.metadata.options.output_filename)
-        for item in output_options:
+        remote_files = []
+        for item in OUTPUT_PORTS:
             if item in self.inputs.parameters:
-                output_files.append(self.inputs.parameters[item])
+                if item in self.metadata.options.keep_remote:
+                    remote_files.append(self.inputs.parameters[item])
+                else:
+                    output_files.append(self.inputs.parameters[item])
 
         # Form the commandline.
         codeinfo.cmdline_params = self.inputs.parameters.cmdline_params(cmdline_input_files)
-        
+        if self.metadata.options.derive_thread_parameters:
+            thread_parameters = get_thread_parameters(
+                    self.inputs.parameters, self.metadata.options,
+                    self.metadata.options.get("cores_per_machine"))
+            for key, value in thread_parameters.items():
+                codeinfo.cmdline_params.extend(["-" + key, value])
+
         codeinfo.code_uuid = self.inputs.code.uuid
         codeinfo.stdout_name = self.metadata.options.output_filename
         codeinfo.withmpi = self.inputs.metadata.options.withmpi
@@ -138,6 +290,13 @@ class MdrunCalculation(CalcJob):
         calcinfo = CalcInfo()
         calcinfo.codes_info = [codeinfo]
         calcinfo.local_copy_list = input_files
-        calcinfo.retrieve_list = output_files
+        calcinfo.remote_copy_list = remote_copy_list
+        calcinfo.retrieve_list, calcinfo.retrieve_temporary_list = \
+            largefiles.split_retrieve_list(self, output_files)
+
+        # Record the size and checksum of the files left on the remote computer.
+        if remote_files:
+            calcinfo.append_text = remotefiles.manifest_command(remote_files)
+            calcinfo.retrieve_list.append(remotefiles.REMOTE_FILES_MANIFEST)
 
         return calcinfo
@@ -0,0 +1,158 @@
+"""
+Calculations provided by aiida_gromacs.
+
+This calculation runs an ensemble of 'gmx mdrun' simulations in a single MPI
+job with the -multidir option.
+"""
+import os
+
+from aiida.common import CalcInfo, CodeInfo
+from aiida.engine import CalcJob
+from aiida.orm import Dict, SinglefileData
+from aiida.plugins import DataFactory
+
+from aiida_gromacs.calculations.mdrun import OUTPUT_PORTS
+from aiida_gromacs.utils import largefiles
+
+MdrunParameters = DataFactory("gromacs.mdrun")
+
+# name of the run input file in the directory of each replica
+TPR_FILENAME = "topol.tpr"
+
+
+def validate_inputs(inputs, _):
+    """
+    Validate at least one replica is given and that the MPI ranks of the
+    job can be shared equally between the replicas.
+    """
+    tprfiles = inputs.get("tprfiles", {})
+    if not tprfiles:
+        return "at least one tprfile must be given"
+    resources = inputs.get("metadata", {}).get("options", {}).get("resources", {})
+    if "num_machines" in resources and "num_mpiprocs_per_machine" in resources:
+        num_ranks = resources["num_machines"] * resources["num_mpiprocs_per_machine"]
+        if num_ranks % len(tprfiles):
+            return (f"the {num_ranks} MPI ranks of the job cannot be shared "
+                    f"equally between {len(tprfiles)} replicas")
+    return None
+
+
+def get_replicas(inputs):
+    """
+    Get the names of the replicas, which are also the names of their
+    directories. mdrun numbers the replicas, e.g. for replica exchange, in
+    the order of their directories, so they are sorted by name.
+
+    :param inputs: the inputs of the calculation
+    :returns: sorted list of the replica names
+    """
+    return sorted(inputs["tprfiles"])
+
+
+def get_replica_files(parameters, replicas):
+    """
+    Get the output files of each replica, which are written in its own
+    directory with the file names given by the parameters.
+
+    :param parameters: the mdrun parameters shared by the replicas
+    :param replicas: names of the replicas
+    :returns: dictionary of the path of the file of each output port, for
+        each replica
+    """
+    return {
+        replica: {port: f"{replica}/{parameters[item]}"
+                  for item, port in OUTPUT_PORTS.items() if item in parameters}
+        for replica in replicas
+    }
+
+
+class MdrunMultidirCalculation(CalcJob):
+    """
+    AiiDA calculation plugin running an ensemble of 'gmx mdrun' simulations
+    with -multidir.
+
+    The run input file of each replica is copied to its own directory, and
+    all the replicas are run as a single MPI job, with the MPI ranks shared
+    equally between them, so many small simulations take one allocation
+    instead of one queue entry each. The -replex and -nex parameters run
+    replica exchange between them. The output files of each replica are
+    output in its own namespace.
+    """
+
+    @classmethod
+    def define(cls, spec):
+        """Define inputs and outputs of the calculation."""
+        # yapf: disable
+        super().define(spec)
+
+        # set default values for AiiDA options, -multidir needs an MPI build of gromacs
+        spec.inputs['metadata']['options']['withmpi'].default = True
+        spec.inputs['metadata']['options']['max_wallclock_seconds'].default = 86400
+
+        # Required inputs.
+        spec.inputs['metadata']['options']['parser_name'].default = 'gromacs.mdrun_multidir'
+        spec.input('metadata.options.output_filename', valid_type=str, default='mdrun.out')
+        spec.input_namespace('tprfiles', valid_type=SinglefileData, dynamic=True,
+                help='Input structure of each replica, by the name of its directory.')
+        spec.input('parameters', valid_type=MdrunParameters,
+                help='Command line parameters for gmx mdrun, shared by the replicas')
+        spec.input('metadata.options.output_dir', valid_type=str, default=os.getcwd,
+                help='Directory where output files will be saved when parsed.')
+        spec.input('metadata.options.large_file_policy', valid_type=str, default='retrieve',
+                validator=largefiles.validate_large_file_policy,
+                help='How output files are stored: "retrieve" keeps them in the retrieved folder as well as the outputs, '
+                     '"store_once" and "store_once_export" only store them as outputs, and export files larger than '
+                     'large_file_threshold to output_dir only with "store_once_export".')
+        spec.input('metadata.options.large_file_threshold', valid_type=int, default=largefiles.DEFAULT_LARGE_FILE_THRESHOLD,
+                help='Size in bytes above which output files are large for the large_file_policy.')
+        spec.inputs.validator = validate_inputs
+
+        # Outputs.
+        spec.output('stdout', valid_type=SinglefileData, help='stdout')
+        spec.output_namespace('replicas', valid_type=(SinglefileData, Dict), dynamic=True,
+                help='Output files and logfile_metadata of each replica, by its name.')
+
+        spec.exit_code(300, 'ERROR_MISSING_OUTPUT_FILES', message='Calculation did not produce all expected output files.')
+
+    def prepare_for_submission(self, folder):
+        """
+        Create input files.
+
+        :param folder: an `aiida.common.folders.Folder` where the plugin should temporarily place all files
+            needed by the calculation.
+        :return: `aiida.common.datastructures.CalcInfo` instance
+        """
+        replicas = get_replicas(self.inputs)
+
+        # Copy the run input file of each replica to its directory.
+        input_files = []
+        for replica in replicas:
+            tprfile = self.inputs.tprfiles[replica]
+            input_files.append((tprfile.uuid, tprfile.filename, f"{replica}/{TPR_FILENAME}"))
+
+        # Form the commandline, the file names are relative to the directory
+        # of each replica.
+        codeinfo = CodeInfo()
+        codeinfo.cmdline_params = self.inputs.parameters.cmdline_params(
+                {"tprfile": TPR_FILENAME}) + ["-multidir"] + replicas
+        codeinfo.code_uuid = self.inputs.code.uuid
+        codeinfo.stdout_name = self.metadata.options.output_filename
+        codeinfo.withmpi = self.inputs.metadata.options.withmpi
+
+        # Prepare a `CalcInfo` to be returned to the engine
+        calcinfo = CalcInfo()
+        calcinfo.codes_info = [codeinfo]
+        calcinfo.local_copy_list = input_files
+
+        # Retrieve the output files keeping the directory of their replica.
+        output_files = [(path, ".", 2)
+                        for outputs in get_replica_files(self.inputs.parameters, replicas).values()
+                        for path in outputs.values()]
+        calcinfo.retrieve_list = [self.metadata.options.output_filename]
+        calcinfo.retrieve_temporary_list = []
+        if self.metadata.options.large_file_policy == "retrieve":
+            calcinfo.retrieve_list.extend(output_files)
+        else:
+            calcinfo.retrieve_temporary_list.extend(output_files)
+
+        return calcinfo
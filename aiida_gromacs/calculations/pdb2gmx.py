@@ -10,6 +10,8 @@ from aiida.engine import CalcJob
 from aiida.orm import SinglefileData, Str
 from aiida.plugins import DataFactory
 
+from aiida_gromacs.utils import largefiles
+
 Pdb2gmxParameters = DataFactory("gromacs.pdb2gmx")
 
 
@@ -44,8 +46,15 @@ class Pdb2gmxCalculation(CalcJob):
         spec.input('metadata.options.output_filename', valid_type=str, default='pdb2gmx.out')
         spec.input('pdbfile', valid_type=SinglefileData, help='Input structure.')
         spec.input('parameters', valid_type=Pdb2gmxParameters, help='Command line parameters for gmx pdb2gmx')
-        spec.input('metadata.options.output_dir', valid_type=str, default=os.getcwd(),
+        spec.input('metadata.options.output_dir', valid_type=str, default=os.getcwd,
                 help='Directory where output files will be saved when parsed.')
+        spec.input('metadata.options.large_file_policy', valid_type=str, default='retrieve',
+                validator=largefiles.validate_large_file_policy,
+                help='How output files are stored: "retrieve" keeps them in the retrieved folder as well as the outputs, '
+                     '"store_once" and "store_once_export" only store them as outputs, and export files larger than '
+                     'large_file_threshold to output_dir only with "store_once_export".')
+        spec.input('metadata.options.large_file_threshold', valid_type=int, default=largefiles.DEFAULT_LARGE_FILE_THRESHOLD,
+                help='Size in bytes above which output files are large for the large_file_policy.')
 
         # Default outputs.
         spec.output('stdout', valid_type=SinglefileData, help='stdout')
@@ -97,6 +106,7 @@ class Pdb2gmxCalculation(CalcJob):
                 self.inputs.pdbfile.filename,
             ),
         ]
-        calcinfo.retrieve_list = output_files
+        calcinfo.retrieve_list, calcinfo.retrieve_temporary_list = \
+            largefiles.split_retrieve_list(self, output_files)
 
         return calcinfo
@@ -0,0 +1,226 @@
+"""
+Calculations provided by aiida_gromacs.
+
+This calculation runs the 'gmx pdb2gmx', 'gmx editconf', 'gmx solvate',
+'gmx grompp' and 'gmx genion' steps preparing a system for minimisation in a
+single job.
+"""
+from collections import Counter
+import os
+
+from aiida.common import CalcInfo, CodeInfo, CodeRunMode
+from aiida.engine import CalcJob
+from aiida.orm import SinglefileData
+from aiida.plugins import DataFactory
+
+from aiida_gromacs.utils import largefiles
+
+Pdb2gmxParameters = DataFactory("gromacs.pdb2gmx")
+EditconfParameters = DataFactory("gromacs.editconf")
+SolvateParameters = DataFactory("gromacs.solvate")
+GromppParameters = DataFactory("gromacs.grompp")
+GenionParameters = DataFactory("gromacs.genion")
+
+# steps run in the job, in order, with the class of their parameters
+STEPS = {
+    "pdb2gmx": Pdb2gmxParameters,
+    "editconf": EditconfParameters,
+    "solvate": SolvateParameters,
+    "gromppions": GromppParameters,
+    "genion": GenionParameters,
+    "gromppmin": GromppParameters,
+}
+# file holding the group genion replaces with ions, read from stdin
+GENION_STDIN = "genion.stdin"
+# group replaced with ions when no instructions_file is given
+DEFAULT_GENION_GROUP = "SOL"
+
+
+def get_steps(inputs):
+    """
+    Get the command line and the output files of each step, which reads the
+    files written by the steps before it in the same working directory.
+
+    :param inputs: the inputs of the calculation
+    :returns: dictionary of the command line parameters and a dictionary of
+        the output file name of each output port, for each step
+    """
+    parameters = {step: inputs[step]["parameters"] for step in STEPS}
+    topfile = parameters["pdb2gmx"]["p"]
+    steps = {}
+    steps["pdb2gmx"] = (
+        parameters["pdb2gmx"].cmdline_params(inputs["pdbfile"].filename),
+        {"grofile": parameters["pdb2gmx"]["o"], "topfile": topfile,
+         "itpfile": parameters["pdb2gmx"]["i"]})
+    steps["editconf"] = (
+        parameters["editconf"].cmdline_params({"grofile": parameters["pdb2gmx"]["o"]}),
+        {"grofile": parameters["editconf"]["o"]})
+    # solvate and genion add molecules to the topology in place
+    steps["solvate"] = (
+        parameters["solvate"].cmdline_params(parameters["editconf"]["o"], topfile),
+        {"grofile": parameters["solvate"]["o"], "topfile": topfile})
+    steps["gromppions"] = (
+        parameters["gromppions"].cmdline_params({
+            "mdpfile": "gromppions.mdp", "grofile": parameters["solvate"]["o"],
+            "topfile": topfile}),
+        {"tprfile": parameters["gromppions"]["o"]})
+    steps["genion"] = (
+        parameters["genion"].cmdline_params({
+            "tprfile": parameters["gromppions"]["o"], "topfile": topfile,
+            "instructions_file": GENION_STDIN}),
+        {"grofile": parameters["genion"]["o"], "topfile": topfile})
+    steps["gromppmin"] = (
+        parameters["gromppmin"].cmdline_params({
+            "mdpfile": "gromppmin.mdp", "grofile": parameters["genion"]["o"],
+            "topfile": topfile}),
+        {"tprfile": parameters["gromppmin"]["o"]})
+    for step, (_, outputs) in steps.items():
+        outputs["stdout"] = f"{step}.out"
+    return steps
+
+
+def get_output_files(steps):
+    """
+    Get the name in the working directory of the output files of each step.
+    Gromacs backs up a file it overwrites as #name.N#, so the N-th version
+    of a file written by more than one step is in its N-th backup, and only
+    the last version keeps its name.
+
+    :param steps: the command line and output files of each step, from
+        :func:`get_steps`
+    :returns: dictionary of the file name of each output port, for each step
+    """
+    writes = Counter(filename for _, outputs in steps.values()
+                     for filename in outputs.values())
+    versions = Counter()
+    output_files = {}
+    for step, (_, outputs) in steps.items():
+        output_files[step] = {}
+        for port, filename in outputs.items():
+            versions[filename] += 1
+            if versions[filename] < writes[filename]:
+                filename = f"#{filename}.{versions[filename]}#"
+            output_files[step][port] = filename
+    return output_files
+
+
+class PreprocessCalculation(CalcJob):
+    """
+    AiiDA calculation plugin running the preprocessing steps of a system in
+    one job.
+
+    The pdb2gmx, editconf, solvate, grompp (ions), genion and grompp
+    (minimisation) steps each take a few seconds, so they are run one after
+    another in the same working directory rather than each waiting for its
+    own upload, scheduler submission and retrieval. The parameters and output
+    files of each step are in its own input and output namespace.
+    """
+
+    @classmethod
+    def define(cls, spec):
+        """Define inputs and outputs of the calculation."""
+        # yapf: disable
+        super().define(spec)
+
+        # set default values for AiiDA options
+        spec.inputs['metadata']['options']['withmpi'].default = False
+        spec.inputs['metadata']['options']['resources'].default = {
+            'num_machines': 1,
+            'num_mpiprocs_per_machine': 1,
+        }
+
+        # Required inputs.
+        spec.inputs['metadata']['options']['parser_name'].default = 'gromacs.preprocess'
+        spec.input('pdbfile', valid_type=SinglefileData, help='Input structure.')
+        spec.input('ionsmdp', valid_type=SinglefileData, help='MD parameters for adding ions.')
+        spec.input('minmdp', valid_type=SinglefileData, help='MD parameters for minimisation.')
+        for step, parameters_class in STEPS.items():
+            spec.input(f'{step}.parameters', valid_type=parameters_class,
+                    help=f'Command line parameters for the {step} step')
+        spec.input('metadata.options.output_dir', valid_type=str, default=os.getcwd,
+                help='Directory where output files will be saved when parsed.')
+        spec.input('metadata.options.large_file_policy', valid_type=str, default='retrieve',
+                validator=largefiles.validate_large_file_policy,
+                help='How output files are stored: "retrieve" keeps them in the retrieved folder as well as the outputs, '
+                     '"store_once" and "store_once_export" only store them as outputs, and export files larger than '
+                     'large_file_threshold to output_dir only with "store_once_export".')
+        spec.input('metadata.options.large_file_threshold', valid_type=int, default=largefiles.DEFAULT_LARGE_FILE_THRESHOLD,
+                help='Size in bytes above which output files are large for the large_file_policy.')
+
+        # Optional inputs.
+        spec.input('instructions_file', valid_type=SinglefileData, required=False,
+                help=f'Group genion replaces with ions, read from stdin, {DEFAULT_GENION_GROUP} by default')
+
+        for step in STEPS:
+            spec.output(f'{step}.stdout', valid_type=SinglefileData, help=f'stdout of the {step} step')
+        spec.output('pdb2gmx.grofile', valid_type=SinglefileData, help='Output forcefield compliant file.')
+        spec.output('pdb2gmx.topfile', valid_type=SinglefileData, help='Output forcefield compliant file.')
+        spec.output('pdb2gmx.itpfile', valid_type=SinglefileData, help='Output forcefield compliant file.')
+        spec.output('editconf.grofile', valid_type=SinglefileData, help='Output file containing simulation box.')
+        spec.output('solvate.grofile', valid_type=SinglefileData, help='Output solvated gro file.')
+        spec.output('solvate.topfile', valid_type=SinglefileData, help='Output topology file.')
+        spec.output('gromppions.tprfile', valid_type=SinglefileData, help='Output tpr file for adding ions.')
+        spec.output('genion.grofile', valid_type=SinglefileData, help='Output gro file with ions added.')
+        spec.output('genion.topfile', valid_type=SinglefileData, help='Output topology with ions added.')
+        spec.output('gromppmin.tprfile', valid_type=SinglefileData, help='Output tpr file for minimisation.')
+
+        spec.exit_code(300, 'ERROR_MISSING_OUTPUT_FILES', message='Calculation did not produce all expected output files.')
+
+    def prepare_for_submission(self, folder):
+        """
+        Create input files.
+
+        :param folder: an `aiida.common.folders.Folder` where the plugin should temporarily place all files
+            needed by the calculation.
+        :return: `aiida.common.datastructures.CalcInfo` instance
+        """
+        steps = get_steps(self.inputs)
+
+        codes_info = []
+        for step, (cmdline_params, _) in steps.items():
+            codeinfo = CodeInfo()
+            codeinfo.cmdline_params = cmdline_params
+            codeinfo.code_uuid = self.inputs.code.uuid
+            codeinfo.stdout_name = f"{step}.out"
+            codeinfo.withmpi = self.inputs.metadata.options.withmpi
+            if step == "genion":
+                codeinfo.stdin_name = GENION_STDIN
+            codes_info.append(codeinfo)
+
+        input_files = [
+            (self.inputs.pdbfile.uuid, self.inputs.pdbfile.filename, self.inputs.pdbfile.filename),
+            (self.inputs.ionsmdp.uuid, self.inputs.ionsmdp.filename, "gromppions.mdp"),
+            (self.inputs.minmdp.uuid, self.inputs.minmdp.filename, "gromppmin.mdp"),
+        ]
+        if "instructions_file" in self.inputs:
+            input_files.append((
+                    self.inputs.instructions_file.uuid,
+                    self.inputs.instructions_file.filename,
+                    GENION_STDIN,
+                ))
+        else:
+            with folder.open(GENION_STDIN, "w") as handle:
+                handle.write(f"{DEFAULT_GENION_GROUP}\n")
+
+        # Prepare a `CalcInfo` to be returned to the engine
+        calcinfo = CalcInfo()
+        calcinfo.codes_info = codes_info
+        calcinfo.codes_run_mode = CodeRunMode.SERIAL
+        calcinfo.local_copy_list = input_files
+        # the files overwritten by later steps are kept in their backups
+        calcinfo.prepend_text = "export GMX_MAXBACKUP=99"
+
+        # Keep the stdout of each step in the repository, like the stdout of
+        # the calculations of each tool.
+        stdout_files, output_files = [], []
+        for outputs in get_output_files(steps).values():
+            stdout_files.append(outputs["stdout"])
+            output_files.extend(filename for port, filename in outputs.items() if port != "stdout")
+        if self.metadata.options.large_file_policy == "retrieve":
+            calcinfo.retrieve_list = stdout_files + output_files
+            calcinfo.retrieve_temporary_list = []
+        else:
+            calcinfo.retrieve_list = stdout_files
+            calcinfo.retrieve_temporary_list = output_files
+
+        return calcinfo
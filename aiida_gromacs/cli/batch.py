@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+"""CLI utility to launch a batch of gmx_* and genericMD commands with AiiDA.
+
+The commands are parsed by the same CLIs used to launch them one at a time,
+and the order they run in is worked out from their input and output file
+names, so that commands that do not depend on each other run concurrently.
+
+Usage: gmx_batch --help
+"""
+
+import shlex
+import sys
+from importlib.metadata import entry_points
+from pathlib import Path
+
+import click
+import yaml
+
+from aiida import cmdline
+
+# commands accepted in a batch file under another name, as in
+# examples/gromacs-jobs.sh
+COMMAND_ALIASES = {"launch": "genericMD"}
+
+# gmx flags of each tool that name files written by the tool, as in the
+# output_options of the calculations. solvate and genion update the
+# topology given by -p in place.
+OUTPUT_FLAGS = {
+    "pdb2gmx": ["o", "p", "i", "n", "q"],
+    "editconf": ["o", "mead"],
+    "genion": ["o", "p"],
+    "grompp": ["o", "po", "pp", "imd"],
+    "make_ndx": ["o"],
+    "mdrun": ["c", "e", "g", "o", "x", "cpo", "dhdl", "field", "tpi", "tpid",
+              "eo", "px", "pf", "ro", "ra", "rs", "rt", "mtx", "if", "swap"],
+    "solvate": ["o", "p"],
+}
+
+
+def get_cli_commands():
+    """
+    Get the CLIs of the plugin that launch a calculation.
+
+    :returns: dictionary of click commands keyed by their script name
+    """
+    try:
+        console_scripts = entry_points(group="console_scripts")
+    except TypeError:
+        # python < 3.10 only returns a dictionary of the entry points by group
+        console_scripts = entry_points().get("console_scripts", [])
+    commands = {}
+    for entry_point in console_scripts:
+        if not entry_point.value.startswith("aiida_gromacs.cli."):
+            continue
+        if (entry_point.name[len("gmx_"):] in OUTPUT_FLAGS
+                or entry_point.name == "genericMD"):
+            commands[entry_point.name] = entry_point
+    return commands
+
+
+def read_batch_file(path):
+    """
+    Read the commands in a batch file, either a YAML list of commands or a
+    shell script with one command per line, where lines may be continued
+    with a backslash and comments start with #.
+
+    :param path: path of the batch file
+    :returns: list of the arguments of each command
+    :rtype: list
+    """
+    path = Path(path)
+    with open(path, encoding="utf-8") as handle:
+        if path.suffix in (".yaml", ".yml"):
+            items = yaml.safe_load(handle) or []
+            return [shlex.split(item) if isinstance(item, str)
+                    else [str(arg) for arg in item] for item in items]
+        lines = handle.read().replace("\\\n", " ").splitlines()
+    commands = []
+    for line in lines:
+        args = shlex.split(line, comments=True)
+        if args:
+            commands.append(args)
+    return commands
+
+
+def parse_command(args, cli_commands):
+    """
+    Parse a command with the CLI of its tool, without launching it, and
+    find the files it reads and writes.
+
+    :param args: the command name and its arguments
+    :param cli_commands: dictionary of the CLIs keyed by their name
+    :returns: dictionary of the command name, click command and context,
+        and the names of its input and output files
+    :rtype: dict
+    """
+    # pylint: disable=import-outside-toplevel
+    from aiida_gromacs.utils import searchprevious
+
+    name = COMMAND_ALIASES.get(args[0], args[0])
+    if name not in cli_commands:
+        raise click.UsageError(f"Unknown command '{args[0]}', expected one of "
+                               f"{sorted(cli_commands)}")
+    command = cli_commands[name].load()
+    ctx = command.make_context(name, args[1:])
+
+    if name == "genericMD":
+        inputs = list(ctx.params["inputs"])
+        outputs = list(ctx.params["outputs"])
+    else:
+        output_flags = OUTPUT_FLAGS[name[len("gmx_"):]]
+        inputs, outputs = [], []
+        for param in command.params:
+            value = ctx.params.get(param.name)
+            # gmx flags start with a single dash, unlike the plugin options
+            if (value is None or not isinstance(value, str)
+                    or any(opt.startswith("--") for opt in param.opts)):
+                continue
+            if param.name in output_flags:
+                outputs.append(value)
+            elif Path(value).suffix[1:].isalpha():
+                # other values with a file extension name input files
+                inputs.append(value)
+
+    return {
+        "name": name,
+        "command": command,
+        "ctx": ctx,
+        "inputs": {searchprevious.strip_path(f) for f in inputs},
+        "outputs": {searchprevious.strip_path(f) for f in outputs},
+    }
+
+
+def find_dependencies(commands):
+    """
+    Find the earlier commands that each command has to wait for: those
+    writing a file the command reads or writes, or reading a file the
+    command writes.
+
+    :param commands: parsed commands, in the order of the batch file
+    :returns: list of the indices of the commands each command depends on
+    :rtype: list
+    """
+    dependencies = []
+    for i, command in enumerate(commands):
+        dependencies.append({
+            j for j, previous in enumerate(commands[:i])
+            if previous["outputs"] & (command["inputs"] | command["outputs"])
+            or previous["inputs"] & command["outputs"]})
+    return dependencies
+
+
+def run_batch(commands, timeout):
+    """
+    Launch each command once the commands it depends on have finished, and
+    wait for them all to terminate. Commands depending on a command that
+    did not finish ok are not launched.
+
+    :param commands: parsed commands, in the order of the batch file
+    :param timeout: maximum time in seconds to wait for any one command
+    :returns: the indices of the commands that did not finish ok
+    :rtype: set
+    """
+    # pylint: disable=import-outside-toplevel
+    from aiida import orm
+
+    from aiida_gromacs.utils import searchprevious
+
+    dependencies = find_dependencies(commands)
+    pending = list(range(len(commands)))
+    running = {}
+    finished, failed = set(), set()
+    while pending or running:
+        for i in list(pending):
+            if dependencies[i] & failed:
+                click.echo(f"Skipping command {i + 1}, a command it depends "
+                           "on did not finish ok")
+                pending.remove(i)
+                failed.add(i)
+            elif dependencies[i] <= finished:
+                pending.remove(i)
+                command = commands[i]
+                if command["name"] == "genericMD":
+                    command["ctx"].params["submit"] = True
+                with command["ctx"] as ctx:
+                    result = command["command"].invoke(ctx)
+                # commands run rather than submitted have already finished
+                if isinstance(result, orm.ProcessNode):
+                    running[i] = result
+                else:
+                    finished.add(i)
+
+        if not running:
+            continue
+        remaining = searchprevious.wait_for_processes(
+            list(running.values()), timeout,
+            return_when=searchprevious.FIRST_TERMINATED)
+        if len(remaining) == len(running):
+            sys.exit(f"Timed out waiting for processes: "
+                     f"{', '.join(str(process.pk) for process in remaining)}")
+        for i, process in list(running.items()):
+            if process.is_terminated:
+                del running[i]
+                if process.is_finished_ok:
+                    finished.add(i)
+                else:
+                    failed.add(i)
+    return failed
+
+
+@click.command()
+@cmdline.utils.decorators.with_dbenv()
+@click.argument("batch_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--wait_timeout", default=86400, type=int, help="Maximum time in seconds to wait for any one command to finish")
+def cli(batch_file, wait_timeout):
+    """Run a batch of gmx_* and genericMD commands.
+
+    The batch file is a shell script with one command per line, or a YAML
+    list of commands, e.g.
+
+        gmx_pdb2gmx -f 1AKI_clean.pdb -ff oplsaa -water spce -o 1AKI_forcefield.gro -p 1AKI_topology.top -i 1AKI_restraints.itp
+
+        gmx_editconf -f 1AKI_forcefield.gro -center 0 -d 1.0 -bt cubic -o 1AKI_newbox.gro
+
+    Example usage:
+
+    $ gmx_batch gromacs-jobs.sh
+
+    Help: $ gmx_batch --help
+    """
+    cli_commands = get_cli_commands()
+    commands = [parse_command(args, cli_commands)
+                for args in read_batch_file(batch_file)]
+    failed = run_batch(commands, wait_timeout)
+    if failed:
+        sys.exit(f"Commands did not finish ok: "
+                 f"{', '.join(str(i + 1) for i in sorted(failed))}")
+
+
+if __name__ == "__main__":
+    cli()  # pylint: disable=no-value-for-parameter
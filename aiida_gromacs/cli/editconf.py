@@ -8,11 +8,9 @@ import os
 
 import click
 
-from aiida import cmdline, engine, orm
-from aiida.plugins import CalculationFactory, DataFactory
+from aiida import cmdline
 
-from aiida_gromacs import helpers
-from aiida_gromacs.utils import searchprevious
+from aiida_gromacs.cli import launcher, options
 
 
 def launch(params):
@@ -20,6 +18,13 @@ def launch(params):
 
     Uses helpers to add gromacs on localhost to AiiDA on the fly.
     """
+    # imported here so that --help does not import the engine
+    # pylint: disable=import-outside-toplevel
+    from aiida import engine, orm
+    from aiida.plugins import CalculationFactory, DataFactory
+
+    from aiida_gromacs import helpers
+    from aiida_gromacs.utils import searchprevious
 
     # Prune unused CLI parameters from dict.
     params = {k:v for k,v in params.items() if v != None}
@@ -30,6 +35,7 @@ def launch(params):
             "description": params.pop("description"),
         },
     }
+    wait_timeout = params.pop("wait_timeout")
 
     # If code is not initialised, then setup.
     if "code" in inputs:
@@ -58,22 +64,25 @@ def launch(params):
     inputs["parameters"] = EditconfParameters(params)
 
     # check if inputs are outputs from prev processes
-    inputs = searchprevious.link_previous_file_nodes(input_file_labels, inputs)
+    inputs = searchprevious.link_previous_file_nodes(input_file_labels, inputs,
+                                                     timeout=wait_timeout)
 
     # check if a pytest test is running, if so run rather than submit aiida job
     # Note: in order to submit your calculation to the aiida daemon, do:
-    # pylint: disable=unused-variable
     if "PYTEST_CURRENT_TEST" in os.environ:
         future = engine.run(CalculationFactory("gromacs.editconf"), **inputs)
     else:
         future = engine.submit(CalculationFactory("gromacs.editconf"), **inputs)
 
+    return future
+
 
-@click.command()
+@click.command(cls=launcher.LauncherCommand)
 @cmdline.utils.decorators.with_dbenv()
 @cmdline.params.options.CODE()
 # Plugin options
 @click.option("--description", default="record editconf data provenance via the aiida_gromacs plugin", type=str, help="Short metadata description")
+@options.WAIT_TIMEOUT
 # Input file options
 @click.option("-f", default="conf.gro", type=str, help="Input structure file")
 @click.option("-n", type=str, help="Index file")
@@ -123,7 +132,7 @@ def cli(*args, **kwargs):
     Help: $ gmx_editconf --help
     """
 
-    launch(kwargs)
+    return launch(kwargs)
 
 
 if __name__ == "__main__":
@@ -10,21 +10,22 @@ import os
 from pathlib import Path
 import click
 
-from aiida import cmdline, engine, orm, load_profile
-from aiida.common import exceptions
-from aiida.plugins import CalculationFactory
+from aiida import cmdline
 
-from aiida_gromacs import helpers
-from aiida_gromacs.utils import searchprevious
-
-# set base path for input files.
-INPUT_DIR = os.getcwd()
-profile = load_profile() # need to load profile first
-computer = helpers.get_computer()
+from aiida_gromacs.cli import launcher
+from aiida_gromacs.cli import options as cli_options
 
 
 def launch_genericMD(options):
     """Run genericMD"""
+    # imported here so that --help does not import the engine
+    # pylint: disable=import-outside-toplevel
+    from aiida import engine, orm
+    from aiida.common import exceptions
+    from aiida.plugins import CalculationFactory
+
+    from aiida_gromacs import helpers
+    from aiida_gromacs.utils import searchprevious
 
     code = options["code"]
     command = options["command"]
@@ -33,6 +34,9 @@ def launch_genericMD(options):
     output_dir = options["output_dir"]
     submit = options["submit"]
 
+    # set base path for input files.
+    input_dir = os.getcwd()
+
     print(f"command: {command}")
     print(f"code: {code}")
 
@@ -44,20 +48,16 @@ def launch_genericMD(options):
 
     # MyAppCalculation = CalculationFactory("gromacs.genericMD")
 
-    # Check if a previous calculation with the same input parameter
-    # value has been stored by loading the QueryBuilder and append
-    # all previous jobs ordered by newest first.
-    qb = searchprevious.build_query()
-
-    # Wait for previous process to finish if running
-    if submit:
-        searchprevious.check_prev_process(qb)
+    # Wait for previous processes that output the input files if running
+    searchprevious.wait_for_previous_processes(
+        [searchprevious.strip_path(filename) for filename in inputs],
+        options["wait_timeout"])
 
     # Save list of input files to a dict with keys that are formatted
     # file names and values that are SinglefileData.
     input_files = {}
     for filename in list(inputs):
-        file_path = os.path.join(INPUT_DIR, filename)
+        file_path = os.path.join(input_dir, filename)
         stripped_input = searchprevious.strip_path(filename) #.split("/")[-1]
         input_files[searchprevious.format_link_label(stripped_input)] = \
             orm.SinglefileData(file=file_path)
@@ -82,15 +82,13 @@ def launch_genericMD(options):
         },
     }
 
-    # check if previous processes have run and add previous outputs
-    # as inputs for new process if file names match
-    if qb.count() > 0:
-        process_inputs = searchprevious.append_prev_nodes(qb, inputs, 
-                        process_inputs, INPUT_DIR)
+    # add the outputs of previous processes, or stored nodes, as inputs
+    # for new process if file names and contents match
+    process_inputs = searchprevious.append_prev_nodes(inputs, process_inputs,
+                                                      input_dir)
 
     # check if a pytest test is running, if so run rather than submit aiida job
     # Submit your calculation to the aiida daemon
-    # pylint: disable=unused-variable
     if "PYTEST_CURRENT_TEST" in os.environ:
         future = engine.run(CalculationFactory("gromacs.genericMD"), 
                                **process_inputs)
@@ -104,9 +102,10 @@ def launch_genericMD(options):
 
     # future = engine.submit(process)
     print(f"Submitted calculation: {future}\n")
+    return future
 
 
-@click.command()
+@click.command(cls=launcher.LauncherCommand)
 @cmdline.utils.decorators.with_dbenv()
 # @cmdline.params.options.CODE()
 @click.option(
@@ -132,10 +131,11 @@ def launch_genericMD(options):
 )
 @click.option(
     "--output_dir",
-    default=os.path.join(os.getcwd()),
+    default=os.getcwd,
     type=str,
     help="Absolute path of directory where files are saved.",
 )
+@cli_options.WAIT_TIMEOUT
 @click.option(
     "--submit", 
     is_flag=True, 
@@ -157,7 +157,7 @@ def cli(**kwargs):
 
     Help: $ ./genericMD.py --help
     """
-    launch_genericMD(kwargs)
+    return launch_genericMD(kwargs)
 
 
 if __name__ == "__main__":
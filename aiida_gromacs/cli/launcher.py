@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+"""CLI utility to run a launcher that keeps the AiiDA profile, computer and
+codes loaded, and launches the gmx_* and genericMD commands sent to it.
+
+While the launcher is running, the gmx_* and genericMD commands send their
+arguments to it over a Unix socket rather than importing the engine and
+loading the profile themselves, and they launch the calculation in their
+own process when it is not running.
+
+Usage: gmx_launcher --help
+"""
+
+import contextlib
+import importlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import traceback
+
+import click
+
+from aiida import cmdline
+
+# environment variable setting the path of the launcher socket
+SOCKET_ENV = "AIIDA_GROMACS_LAUNCHER_SOCKET"
+# how long a command waits to connect before launching itself
+CONNECT_TIMEOUT = 1.0 # seconds
+# modules of the CLIs run by the launcher
+CLI_MODULES = [
+    "aiida_gromacs.cli.editconf",
+    "aiida_gromacs.cli.genericMD",
+    "aiida_gromacs.cli.genion",
+    "aiida_gromacs.cli.grompp",
+    "aiida_gromacs.cli.make_ndx",
+    "aiida_gromacs.cli.mdrun",
+    "aiida_gromacs.cli.pdb2gmx",
+    "aiida_gromacs.cli.solvate",
+]
+
+
+def get_socket_path():
+    """Get the path of the Unix socket the launcher listens on."""
+    return os.environ.get(SOCKET_ENV, os.path.join(
+        tempfile.gettempdir(), f"aiida_gromacs_launcher_{os.getuid()}.sock"))
+
+
+def send_request(request, socket_path=None):
+    """
+    Send a request to the launcher and wait for its response.
+
+    :param request: dictionary sent to the launcher
+    :param socket_path: path of the launcher socket, from get_socket_path
+        by default
+    :returns: the response of the launcher, or None if it is not running
+    :rtype: dict
+    """
+    socket_path = socket_path or get_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(CONNECT_TIMEOUT)
+        client.connect(socket_path)
+        # commands run rather than submitted take as long as the calculation
+        client.settimeout(None)
+    except OSError:
+        # a socket left behind by a launcher that was not stopped
+        client.close()
+        return None
+    with client, client.makefile("rwb") as stream:
+        stream.write(json.dumps(request).encode() + b"\n")
+        stream.flush()
+        response = stream.readline()
+    if not response:
+        raise click.ClickException("The launcher stopped before the command "
+                                   "finished, check with verdi process list "
+                                   "if it was launched")
+    return json.loads(response)
+
+
+def forward_command(module, args, prog_name=None):
+    """
+    Run a CLI command in the launcher, if it is running for the same AiiDA
+    configuration, and print its output.
+
+    :param module: name of the module of the CLI, e.g.
+        aiida_gromacs.cli.editconf
+    :param args: the command line arguments of the command
+    :param prog_name: name of the command shown in its messages
+    :returns: the exit code of the command, or None if it was not run
+    """
+    # tests run calculations rather than submit them, and --help is
+    # quicker printed here
+    if "PYTEST_CURRENT_TEST" in os.environ or "--help" in args:
+        return None
+    response = send_request({
+        "module": module,
+        "args": list(args),
+        "prog_name": prog_name,
+        "cwd": os.getcwd(),
+        "aiida_path": os.environ.get("AIIDA_PATH"),
+    })
+    if response is None or response["exit_code"] is None:
+        return None
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["exit_code"]
+
+
+class LauncherCommand(click.Command):
+    """
+    Click command that is sent to the launcher when it is running, and run
+    in this process otherwise.
+    """
+
+    def main(self, args=None, prog_name=None, **extra):
+        # only commands run from the command line are sent, the launcher
+        # runs them by passing their arguments
+        if args is None:
+            exit_code = forward_command(self.callback.__module__, sys.argv[1:],
+                                        prog_name or os.path.basename(sys.argv[0]))
+            if exit_code is not None:
+                sys.exit(exit_code)
+        return super().main(args, prog_name, **extra)
+
+
+def run_command(request):
+    """
+    Run a CLI command sent to the launcher in the working directory of the
+    sender, capturing its output.
+
+    :param request: dictionary of the module of the CLI, its arguments and
+        the working directory
+    :returns: dictionary of the exit code of the command and its output, with
+        an exit code of None if the command should not be run here
+    :rtype: dict
+    """
+    if (request["module"] not in CLI_MODULES
+            or request.get("aiida_path") != os.environ.get("AIIDA_PATH")):
+        return {"exit_code": None}
+    command = importlib.import_module(request["module"]).cli
+    stdout, stderr = io.StringIO(), io.StringIO()
+    exit_code = 0
+    cwd = os.getcwd()
+    try:
+        os.chdir(request["cwd"])
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                command.main(request["args"], prog_name=request.get("prog_name"),
+                             standalone_mode=False)
+            except click.ClickException as exception:
+                exception.show()
+                exit_code = exception.exit_code
+            except click.Abort:
+                click.echo("Aborted!", err=True)
+                exit_code = 1
+            except SystemExit as exception:
+                if isinstance(exception.code, str):
+                    click.echo(exception.code, err=True)
+                    exit_code = 1
+                else:
+                    exit_code = exception.code or 0
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+                exit_code = 1
+    finally:
+        os.chdir(cwd)
+    return {"exit_code": exit_code, "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue()}
+
+
+class LauncherHandler(socketserver.StreamRequestHandler):
+    """Answers a request sent to the launcher."""
+
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        if "stop" in request:
+            # shutdown waits for the request to be answered, so is called
+            # from another thread
+            threading.Thread(target=self.server.shutdown).start()
+            response = {"pid": os.getpid()}
+        elif "status" in request:
+            response = {"pid": os.getpid(), "aiida_path": os.environ.get("AIIDA_PATH")}
+        else:
+            response = run_command(request)
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+def serve(socket_path):
+    """
+    Launch the commands sent to the socket one at a time until the
+    launcher is stopped.
+
+    :param socket_path: path of the Unix socket to listen on
+    """
+    if send_request({"status": True}, socket_path) is not None:
+        raise click.ClickException(f"A launcher is already listening on {socket_path}")
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    # only the user can connect to the launcher
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, LauncherHandler)
+    finally:
+        os.umask(umask)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+
+@click.group()
+def cli():
+    """Run a launcher for the gmx_* and genericMD commands.
+
+    Example usage:
+
+    $ gmx_launcher start &
+
+    $ gmx_editconf -f 1AKI_forcefield.gro -center 0 -d 1.0 -bt cubic -o 1AKI_newbox.gro
+
+    $ gmx_launcher stop
+
+    Help: $ gmx_launcher --help
+    """
+
+
+@cli.command()
+@cmdline.utils.decorators.with_dbenv()
+@click.option("--socket", "socket_path", default=None, type=str, help=f"Path of the Unix socket, set by {SOCKET_ENV} or in the temporary directory by default")
+def start(socket_path):
+    """Start the launcher, and keep it running until it is stopped."""
+    # pylint: disable=import-outside-toplevel
+    from aiida import engine, orm  # pylint: disable=unused-import
+    from aiida.plugins import CalculationFactory
+
+    from aiida_gromacs import helpers
+
+    # load everything a command needs now, rather than for the first command
+    for module in CLI_MODULES:
+        importlib.import_module(module)
+    for entry_point in ["editconf", "genericMD", "genion", "grompp",
+                        "make_ndx", "mdrun", "pdb2gmx", "solvate"]:
+        CalculationFactory(f"gromacs.{entry_point}")
+    helpers.get_computer()
+    orm.QueryBuilder().append(orm.AbstractCode).all()
+
+    socket_path = socket_path or get_socket_path()
+    click.echo(f"Launcher listening on {socket_path} (pid {os.getpid()})")
+    serve(socket_path)
+
+
+@cli.command()
+@click.option("--socket", "socket_path", default=None, type=str, help="Path of the Unix socket")
+def stop(socket_path):
+    """Stop the launcher."""
+    response = send_request({"stop": True}, socket_path)
+    if response is None:
+        raise click.ClickException("The launcher is not running")
+    click.echo(f"Stopped the launcher (pid {response['pid']})")
+
+
+@cli.command()
+@click.option("--socket", "socket_path", default=None, type=str, help="Path of the Unix socket")
+def status(socket_path):
+    """Show if the launcher is running."""
+    response = send_request({"status": True}, socket_path)
+    if response is None:
+        click.echo("The launcher is not running")
+        sys.exit(1)
+    click.echo(f"The launcher is running (pid {response['pid']})")
+
+
+if __name__ == "__main__":
+    cli()  # pylint: disable=no-value-for-parameter
@@ -6,10 +6,8 @@ Usage: gmx_make_ndx --help
 
 import os
 import click
-from aiida import cmdline, engine
-from aiida.plugins import CalculationFactory, DataFactory
-from aiida_gromacs import helpers
-from aiida_gromacs.utils import searchprevious
+from aiida import cmdline
+from aiida_gromacs.cli import launcher, options
 
 
 def launch(params):
@@ -17,6 +15,13 @@ def launch(params):
 
     Uses helpers to add gromacs on localhost to AiiDA on the fly.
     """
+    # imported here so that --help does not import the engine
+    # pylint: disable=import-outside-toplevel
+    from aiida import engine
+    from aiida.plugins import CalculationFactory, DataFactory
+
+    from aiida_gromacs import helpers
+    from aiida_gromacs.utils import searchprevious
 
     # Prune unused CLI parameters from dict.
     params = {k:v for k,v in params.items() if v != None}
@@ -28,6 +33,7 @@ def launch(params):
             "options": {},
         },
     }
+    wait_timeout = params.pop("wait_timeout")
 
     # If code is not initialised, then setup.
     if "code" in inputs:
@@ -56,22 +62,25 @@ def launch(params):
     inputs["parameters"] = Make_ndxParameters(params)
 
     # check if inputs are outputs from prev gmx_* processes
-    inputs = searchprevious.link_previous_file_nodes(input_file_labels, inputs)
+    inputs = searchprevious.link_previous_file_nodes(input_file_labels, inputs,
+                                                     timeout=wait_timeout)
 
     # check if a pytest test is running, if so run rather than submit aiida job
     # Note: in order to submit your calculation to the aiida daemon, do:
-    # pylint: disable=unused-variable
     if "PYTEST_CURRENT_TEST" in os.environ:
         future = engine.run(CalculationFactory("gromacs.make_ndx"), **inputs)
     else:
         future = engine.submit(CalculationFactory("gromacs.make_ndx"), **inputs)
 
+    return future
+
 
-@click.command()
+@click.command(cls=launcher.LauncherCommand)
 @cmdline.utils.decorators.with_dbenv()
 @cmdline.params.options.CODE()
 # Plugin options
 @click.option("--description", default="record make_ndx data provenance via the aiida_gromacs plugin", type=str, help="Short metadata description")
+@options.WAIT_TIMEOUT
 # Input file options
 @click.option("-f", type=str, help="(Optional) Structure file: gro g96 pdb brk ent esp tpr")
 @click.option("-n", type=str, help="(Optional) Index file")
@@ -99,7 +108,7 @@ def cli(*args, **kwargs):
     Help: $ gmx_make_ndx --help
     """
 
-    launch(kwargs)
+    return launch(kwargs)
 
 
 if __name__ == "__main__":
@@ -8,11 +8,9 @@ import os
 
 import click
 
-from aiida import cmdline, engine, orm
-from aiida.plugins import CalculationFactory, DataFactory
+from aiida import cmdline
 
-from aiida_gromacs import helpers
-from aiida_gromacs.utils import searchprevious
+from aiida_gromacs.cli import launcher, options
 
 
 def launch(params):
@@ -20,6 +18,13 @@ def launch(params):
 
     Uses helpers to add gromacs on localhost to AiiDA on the fly.
     """
+    # imported here so that --help does not import the engine
+    # pylint: disable=import-outside-toplevel
+    from aiida import engine, orm
+    from aiida.plugins import CalculationFactory, DataFactory, WorkflowFactory
+
+    from aiida_gromacs import helpers
+    from aiida_gromacs.utils import searchprevious
 
     # Prune unused CLI parameters from dict.
     params = {k:v for k,v in params.items() if v != None}
@@ -30,6 +35,29 @@ def launch(params):
             "description": params.pop("description"),
         },
     }
+    wait_timeout = params.pop("wait_timeout")
+    max_iterations = params.pop("max_iterations", None)
+
+    # Extract the energies at each step from the log and energy files.
+    options = {}
+    for option in ["energy_timeseries", "enfile_energies"]:
+        if params.pop(option):
+            options[option] = True
+    # Leave the trajectory and checkpoint files on the remote computer.
+    if params.get("keep_remote"):
+        options["keep_remote"] = list(params["keep_remote"])
+    params.pop("keep_remote", None)
+    if options:
+        inputs["metadata"]["options"] = options
+
+    # Tail the log file while mdrun is running to record its progress.
+    if "progress_interval" in params:
+        inputs["monitors"] = {
+            "progress": orm.Dict({
+                "entry_point": "gromacs.mdrun_progress",
+                "minimum_poll_interval": params.pop("progress_interval"),
+            })
+        }
 
     # If code is not initialised, then setup.
     if "code" in inputs:
@@ -85,22 +113,43 @@ def launch(params):
     inputs["parameters"] = MdrunParameters(params)
 
     # check if inputs are outputs from prev processes
-    inputs = searchprevious.link_previous_file_nodes(input_file_labels, inputs)
+    inputs = searchprevious.link_previous_file_nodes(input_file_labels, inputs,
+                                                     timeout=wait_timeout)
+
+    # Continue runs stopped by the wallclock limit from their checkpoint.
+    if max_iterations is None:
+        process_class = CalculationFactory("gromacs.mdrun")
+    else:
+        process_class = WorkflowFactory("gromacs.mdrun_base")
+        inputs = {
+            "mdrun": inputs,
+            "max_iterations": orm.Int(max_iterations),
+            "metadata": {
+                "description": inputs["metadata"]["description"],
+            },
+        }
 
     # check if a pytest test is running, if so run rather than submit aiida job
     # Note: in order to submit your calculation to the aiida daemon, do:
-    # pylint: disable=unused-variable
     if "PYTEST_CURRENT_TEST" in os.environ:
-        future = engine.run(CalculationFactory("gromacs.mdrun"), **inputs)
+        future = engine.run(process_class, **inputs)
     else:
-        future = engine.submit(CalculationFactory("gromacs.mdrun"), **inputs)
+        future = engine.submit(process_class, **inputs)
+
+    return future
 
 
-@click.command()
+@click.command(cls=launcher.LauncherCommand)
 @cmdline.utils.decorators.with_dbenv()
 @cmdline.params.options.CODE()
 # Plugin options
 @click.option("--description", default="record mdrun data provenance via the aiida_gromacs plugin", type=str, help="Short metadata description")
+@options.WAIT_TIMEOUT
+@click.option("--energy_timeseries", is_flag=True, default=False, help="Save the energies at each nstlog step in the log file as an ArrayData output")
+@click.option("--progress_interval", type=int, help="Record the step, time and ns/day of the running mdrun from its log file every this many seconds")
+@click.option("--enfile_energies", is_flag=True, default=False, help="Save the energy terms in each frame of the energy file as an ArrayData output")
+@click.option("--max_iterations", type=int, help="Run mdrun in a workchain that continues the run from its checkpoint, up to this many times, when it is stopped by -maxh or the wallclock limit")
+@click.option("--keep_remote", multiple=True, type=click.Choice(["o", "x", "cpo"]), help="Leave the file of this output flag on the remote computer instead of retrieving it, can be given more than once")
 # Input file options
 @click.option("-s", default="topol.tpr", type=str, help="Portable xdr run input file")
 @click.option("-cpi", type=str, help="Checkpoint file")
@@ -168,6 +217,7 @@ def launch(params):
 @click.option("-cpnum", type=str, help="Keep and number checkpoint files")
 @click.option("-append", type=str, help="Append to previous output files when continuing from checkpoint instead of adding the simulation part number to all file names")
 @click.option("-nsteps", type=str, help="Run this number of steps (-1 means infinite, -2 means use mdp option, smaller is invalid)")
+@click.option("-resethway", type=str, help="Reset the cycle counters after half the number of steps or halfway -maxh")
 @click.option("-maxh", type=str, help="Terminate after 0.99 times this time (hours)")
 @click.option("-replex", type=str, help="Attempt replica exchange periodically with this period (steps)")
 @click.option("-nex", type=str, help="Number of random exchanges to carry out each exchange interval (N^3 is one suggestion). -nex zero or not specified gives neighbor replica exchange.")
@@ -189,7 +239,7 @@ def cli(*args, **kwargs):
     Help: $ gmx_mdrun --help
     """
 
-    launch(kwargs)
+    return launch(kwargs)
 
 
 if __name__ == "__main__":
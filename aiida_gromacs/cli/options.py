@@ -0,0 +1,18 @@
+"""Click options shared by the CLI utilities.
+
+Only click is imported here, so that the CLIs can be built, and --help
+printed, without importing the AiiDA engine or loading a profile.
+"""
+
+import click
+
+# the same as searchprevious.DEFAULT_WAIT_TIMEOUT, which imports the ORM
+DEFAULT_WAIT_TIMEOUT = 300 # seconds
+
+WAIT_TIMEOUT = click.option(
+    "--wait_timeout",
+    default=DEFAULT_WAIT_TIMEOUT,
+    type=int,
+    help="Maximum time in seconds to wait for running processes that "
+    "output the input files",
+)
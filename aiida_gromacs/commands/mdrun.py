@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+"""
+Maintain the data of mdrun calculations performed in gmx
+"""
+import click
+from aiida_gromacs.utils.reparse import reparse_logfiles
+
+@click.group()
+def mdrun():
+    """commandline help for mdrun command
+    Help: $ verdi data mdrun --help"""
+
+@mdrun.command('reparse')
+@click.option('-n', '--processes', type=int, default=None,
+              help='Number of processes parsing logfiles, defaults to the number of CPUs')
+@click.option('--output', type=click.Choice(['extras', 'dict']), default='extras',
+              help='Save the metadata in the logfile_metadata extra of each calculation, '
+              'or as a new Dict node whose uuid is saved in the logfile_metadata_uuid extra')
+@click.option('--force', is_flag=True, default=False,
+              help='Also re-parse calculations already re-parsed by this version of the parsers')
+def reparse(processes, output, force):
+    """Re-parse the logfiles of all mdrun calculations on current loaded
+    aiida profile in parallel, refreshing their logfile metadata.
+
+    Each calculation is marked once its metadata is saved, so an interrupted
+    re-parse continues where it stopped when run again.
+
+    Help: $ verdi data mdrun reparse --help"""
+    count = reparse_logfiles(processes, output, force)
+    click.echo(f"Re-parsed the logfiles of {count} mdrun calculations")
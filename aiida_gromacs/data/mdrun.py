@@ -64,6 +64,7 @@ cmdline_options = {
     Optional("cpnum"): str,
     Optional("append"): str,
     Optional("nsteps"): str,
+    Optional("resethway"): str,
     Optional("maxh"): str,
     Optional("replex"): str,
     Optional("nex"): str,
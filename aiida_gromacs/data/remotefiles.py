@@ -0,0 +1,125 @@
+"""
+Data types provided by plugin
+
+Output files of a calculation left on the remote computer, with the size and
+sha256 checksum of each file recorded so that they can be fetched later and
+verified.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+from aiida.common.escaping import escape_for_bash
+from aiida.common.hashing import chunked_file_hash
+from aiida.orm import RemoteData
+
+# name of the file written by the job script with the size, checksum and
+# name of each file kept on the remote computer
+REMOTE_FILES_MANIFEST = "_remote_files.txt"
+
+
+def manifest_command(filenames):
+    """
+    Get the bash command appended to the job script to record the size and
+    sha256 checksum of files in the manifest, skipping missing files.
+
+    :param filenames: names of the files in the working directory
+    :returns: the command as a string
+    """
+    quoted = " ".join(escape_for_bash(name) for name in filenames)
+    return (f'for f in {quoted}; do if [ -f "$f" ]; then '
+            f'echo "$(wc -c < "$f") $(sha256sum "$f")"; fi; done '
+            f"> {REMOTE_FILES_MANIFEST}")
+
+
+def parse_manifest(lines):
+    """
+    Read the size and checksum of files from the lines of a manifest.
+
+    :param lines: lines of the manifest, each the size, checksum and name
+    :returns: dictionary of {"size": int, "sha256": str} keyed by file name
+    """
+    files = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        size, checksum, name = line.rstrip("\n").split(None, 2)
+        # sha256sum marks names with escaped characters with a backslash
+        files[name] = {"size": int(size), "sha256": checksum.lstrip("\\")}
+    return files
+
+
+class RemoteFilesData(RemoteData):
+    """
+    Files in a folder on a remote computer, which are only copied to the
+    local machine when they are fetched.
+    """
+
+    def __init__(self, files=None, **kwargs):
+        """
+        :param files: dictionary of the size and sha256 checksum of each
+            file, keyed by its path relative to the remote folder
+        """
+        super().__init__(**kwargs)
+        self.base.attributes.set("files", files or {})
+
+    @property
+    def files(self):
+        """The size and sha256 checksum of each remote file."""
+        return self.base.attributes.get("files")
+
+    def _remote_file_path(self, name):
+        """Get the absolute path of a file on the remote computer."""
+        if name not in self.files:
+            raise KeyError(f"'{name}' is not one of the remote files "
+                           f"{list(self.files)}")
+        return str(Path(self.get_remote_path()) / name)
+
+    def read_bytes(self, name, start=0, length=None):
+        """
+        Read a range of bytes of a remote file without copying the rest of
+        the file.
+
+        :param name: name of the remote file
+        :param start: offset of the first byte to read
+        :param length: number of bytes to read, up to the end of the file by
+            default
+        :returns: the bytes read
+        """
+        remote_path = self._remote_file_path(name)
+        size = self.files[name]["size"]
+        length = size - start if length is None else min(length, size - start)
+        if length <= 0:
+            return b""
+        command = (f"tail -c +{start + 1} {escape_for_bash(remote_path)}"
+                   f" | head -c {length}")
+        with self.get_authinfo().get_transport() as transport:
+            retval, stdout, stderr = transport.exec_command_wait_bytes(command)
+        if retval != 0:
+            raise OSError(f"Could not read '{remote_path}': {stderr.decode()}")
+        return stdout
+
+    def fetch(self, name, path, verify=True):
+        """
+        Copy a remote file to the local machine.
+
+        :param name: name of the remote file
+        :param path: local path the file is copied to
+        :param verify: check the size and checksum of the copied file match
+            those recorded when the calculation finished
+        :returns: the local path of the file
+        """
+        remote_path = self._remote_file_path(name)
+        with self.get_authinfo().get_transport() as transport:
+            transport.getfile(remote_path, str(path))
+        if verify:
+            expected = self.files[name]
+            if os.path.getsize(path) != expected["size"]:
+                raise OSError(f"'{name}' has changed on the remote computer, "
+                              f"expected {expected['size']} bytes")
+            with open(path, "rb") as handle:
+                checksum = chunked_file_hash(handle, hashlib.sha256)
+            if checksum != expected["sha256"]:
+                raise OSError(f"'{name}' has changed on the remote computer, "
+                              "its checksum does not match")
+        return path
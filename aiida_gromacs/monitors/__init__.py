@@ -0,0 +1,5 @@
+"""
+aiida_gromacs
+
+A plugin for using GROMACS with AiiDA for molecular dymanics simulations.
+"""
\ No newline at end of file
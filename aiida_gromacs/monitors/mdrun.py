@@ -0,0 +1,139 @@
+"""
+Monitors provided by aiida_gromacs.
+
+These monitors follow the progress of a running 'gmx mdrun' calculation,
+and kill it when it runs too slowly.
+"""
+from pathlib import Path
+
+from aiida.common.escaping import escape_for_bash
+
+from aiida_gromacs.utils import fileparsers
+
+PROGRESS_EXTRA = "mdrun_progress"
+PERFORMANCE_EXTRA = "mdrun_performance"
+# seconds a run may stay below its min_ns_per_day option before it is killed
+DEFAULT_GRACE_PERIOD = 1800
+
+
+def log_progress(node, transport):
+    """
+    Tail the logfile of a running mdrun and record its progress on the node.
+
+    Only the bytes appended to the remote logfile since the last call are
+    read, starting from the offset stored with the progress record in the
+    ``mdrun_progress`` extra of the node. The record holds the latest step,
+    simulated time (ps) and ns/day, which is estimated from the simulated
+    time advanced between calls until the final performance is printed.
+
+    :param node: the CalcJobNode of the running mdrun calculation
+    :param transport: transport open to the computer running mdrun
+    :returns: None, the calculation is never killed
+    """
+    workdir = node.get_remote_workdir()
+    if workdir is None:
+        return None
+    logfile = str(Path(workdir) / node.inputs.parameters["g"])
+    if not transport.isfile(logfile):
+        return None
+
+    progress = node.base.extras.get(PROGRESS_EXTRA, {"offset": 0})
+    attributes = transport.get_attribute(logfile)
+    if attributes.st_size < progress["offset"]:
+        # the logfile has been replaced, so start again
+        progress = {"offset": 0}
+    n_bytes = attributes.st_size - progress["offset"]
+    if n_bytes == 0:
+        return None
+
+    command = (f"tail -c +{progress['offset'] + 1} {escape_for_bash(logfile)}"
+               f" | head -c {n_bytes}")
+    retval, stdout, stderr = transport.exec_command_wait_bytes(command)
+    if retval != 0:
+        node.logger.warning(f"Could not read '{logfile}': {stderr.decode()}")
+        return None
+
+    # only read complete lines, the rest is read on the next call
+    raw_lines = stdout[:stdout.rfind(b"\n") + 1].splitlines(keepends=True)
+    lines = [line.decode(errors="replace") for line in raw_lines]
+    latest, n_read = fileparsers.parse_gromacs_log_progress(lines)
+    progress["offset"] += sum(len(line) for line in raw_lines[:n_read])
+
+    if "time" in latest:
+        wall_time = attributes.st_mtime
+        if "time" in progress and wall_time > progress["wall_time"]:
+            days = (wall_time - progress["wall_time"]) / 86400
+            latest.setdefault("ns_per_day",
+                    (latest["time"] - progress["time"]) / 1000 / days)
+        latest["wall_time"] = wall_time
+    progress.update(latest)
+    node.base.extras.set(PROGRESS_EXTRA, progress)
+    return None
+
+
+def get_remote_time(transport):
+    """
+    Get the current time of the computer running mdrun, whose clock gives
+    the modification times of the remote logfile.
+
+    :param transport: transport open to the computer running mdrun
+    :returns: the seconds since the epoch, or None if it could not be read
+    """
+    retval, stdout, _ = transport.exec_command_wait("date +%s")
+    if retval != 0:
+        return None
+    return float(stdout.strip())
+
+
+def check_performance(node, transport, grace_period=DEFAULT_GRACE_PERIOD):
+    """
+    Kill a running mdrun whose ns/day stays below the min_ns_per_day option
+    of the node for grace_period seconds, e.g. after a bad node placement,
+    or whose logfile has not been written for grace_period seconds.
+
+    The ns/day is taken from the progress recorded by :func:`log_progress`,
+    and the time below the floor, from the write of the remote logfile that
+    fell below it, and since the last write are measured against the
+    current time of the remote computer, so that a stalled run is killed.
+    The floor, the latest ns/day, when the run fell below the floor and the
+    decision, "continue", "wait" or "kill", are recorded in the
+    ``mdrun_performance`` extra of the node.
+
+    :param node: the CalcJobNode of the running mdrun calculation
+    :param transport: transport open to the computer running mdrun
+    :param grace_period: seconds the run may stay below the floor
+    :returns: the reason the calculation is killed, or None
+    """
+    min_ns_per_day = node.get_option("min_ns_per_day")
+    if min_ns_per_day is None:
+        return None
+    log_progress(node, transport)
+    progress = node.base.extras.get(PROGRESS_EXTRA, {})
+    if "ns_per_day" not in progress:
+        return None
+    now = get_remote_time(transport)
+    if now is None:
+        node.logger.warning("Could not read the time of the remote computer")
+        return None
+
+    performance = node.base.extras.get(PERFORMANCE_EXTRA, {})
+    performance.update({"min_ns_per_day": min_ns_per_day,
+                        "ns_per_day": progress["ns_per_day"]})
+    message = None
+    if now - progress["wall_time"] >= grace_period:
+        performance["decision"] = "kill"
+        message = (f"mdrun has not written to its logfile for "
+                   f"{now - progress['wall_time']:.0f} s")
+    elif progress["ns_per_day"] >= min_ns_per_day:
+        performance.pop("below_since", None)
+        performance["decision"] = "continue"
+    else:
+        below_since = performance.setdefault("below_since", progress["wall_time"])
+        if now - below_since >= grace_period:
+            performance["decision"] = "kill"
+            message = (f"mdrun ran at {progress['ns_per_day']:.4g} ns/day, below the "
+                       f"min_ns_per_day of {min_ns_per_day:.4g} for {grace_period} s")
+        else:
+            performance["decision"] = "wait"
+    node.base.extras.set(PERFORMANCE_EXTRA, performance)
+    return message
@@ -10,6 +10,7 @@ from aiida.engine import ExitCode
 from aiida.orm import SinglefileData
 from aiida.parsers.parser import Parser
 from aiida.plugins import CalculationFactory
+from aiida_gromacs.utils import largefiles
 
 GenionCalculation = CalculationFactory("gromacs.genion")
 
@@ -40,10 +41,12 @@ class GenionParser(Parser):
         """
         # the directory for storing parsed output files
         output_dir = Path(self.node.get_option("output_dir"))
+        # output files retrieved outside of the repository by the large_file_policy
+        self.retrieved_temporary_folder = kwargs.get("retrieved_temporary_folder")
         outputs = ["stdout", "grofile", "topfile"]
 
         # Check that folder content is as expected
-        files_retrieved = self.retrieved.base.repository.list_object_names()
+        files_retrieved = largefiles.list_output_files(self)
         files_expected = [
             self.node.get_option("output_filename"),
             self.node.inputs.parameters["o"],
@@ -60,12 +63,12 @@ class GenionParser(Parser):
         # add outputs
         for index, thing in enumerate(files_expected):
             self.logger.info(f"Parsing '{thing}'")
-            with self.retrieved.base.repository.open(thing, "rb") as handle:
+            with largefiles.open_output_file(self, thing, "rb") as handle:
                 output_node = SinglefileData(filename=thing, file=handle)
             self.out(outputs[index], output_node)
 
         # If not in testing mode, then copy back the files.
         if "PYTEST_CURRENT_TEST" not in os.environ:
-            self.retrieved.copy_tree(output_dir)
+            largefiles.export_output_files(self, output_dir)
 
         return ExitCode(0)
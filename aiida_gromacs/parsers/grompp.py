@@ -10,6 +10,7 @@ from aiida.engine import ExitCode
 from aiida.orm import SinglefileData
 from aiida.parsers.parser import Parser
 from aiida.plugins import CalculationFactory
+from aiida_gromacs.utils import largefiles
 
 GromppCalculation = CalculationFactory("gromacs.grompp")
 
@@ -40,6 +41,8 @@ class GromppParser(Parser):
         """
         # the directory for storing parsed output files
         output_dir = Path(self.node.get_option("output_dir"))
+        # output files retrieved outside of the repository by the large_file_policy
+        self.retrieved_temporary_folder = kwargs.get("retrieved_temporary_folder")
         # Map output files to how they are named.
         outputs = ["stdout"]
         output_template = {
@@ -54,10 +57,10 @@ class GromppParser(Parser):
                 outputs.append(output_template[item])
 
         # Grab list of retrieved files.
-        files_retrieved = self.retrieved.base.repository.list_object_names()
+        files_retrieved = largefiles.list_output_files(self)
 
         # Grab list of files expected and remove the scheduler stdout and stderr files.
-        files_expected = [files for files in self.node.get_option("retrieve_list") if files not in ["_scheduler-stdout.txt", "_scheduler-stderr.txt"]]
+        files_expected = largefiles.get_expected_files(self.node)
 
         # Check if the expected files are a subset of retrieved.
         if not set(files_expected) <= set(files_retrieved):
@@ -69,12 +72,12 @@ class GromppParser(Parser):
         # Map retrieved files to data nodes.
         for i, f in enumerate(files_expected):
             self.logger.info(f"Parsing '{f}'")
-            with self.retrieved.base.repository.open(f, "rb") as handle:
+            with largefiles.open_output_file(self, f, "rb") as handle:
                 output_node = SinglefileData(filename=f, file=handle)
             self.out(outputs[i], output_node)
 
         # If not in testing mode, then copy back the files.
         if "PYTEST_CURRENT_TEST" not in os.environ:
-            self.retrieved.copy_tree(output_dir)
+            largefiles.export_output_files(self, output_dir)
 
         return ExitCode(0)
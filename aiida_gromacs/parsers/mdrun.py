@@ -3,17 +3,22 @@ Parsers provided by aiida_gromacs.
 
 This calculation configures the ability to use the 'gmx mdrun' executable.
 """
+from contextlib import ExitStack
 import os
 from pathlib import Path
 import json
+import sqlite3
 from aiida.common import exceptions
 from aiida.engine import ExitCode
-from aiida.orm import SinglefileData, Dict
+from aiida.orm import ArrayData, SinglefileData, Dict
 from aiida.parsers.parser import Parser
-from aiida.plugins import CalculationFactory
-from aiida_gromacs.utils import fileparsers
+from aiida.plugins import CalculationFactory, DataFactory
+from aiida_gromacs.calculations.mdrun import OUTPUT_PORTS
+from aiida_gromacs.data import remotefiles
+from aiida_gromacs.utils import edrparser, fileparsers, largefiles, parsecache, searchprevious
 
 MdrunCalculation = CalculationFactory("gromacs.mdrun")
+RemoteFilesData = DataFactory("gromacs.remotefiles")
 
 
 class MdrunParser(Parser):
@@ -42,56 +47,52 @@ class MdrunParser(Parser):
         """
         # the directory for storing parsed output files
         output_dir = Path(self.node.get_option("output_dir"))
+        # output files retrieved outside of the repository by the large_file_policy
+        self.retrieved_temporary_folder = kwargs.get("retrieved_temporary_folder")
         # Map output files to how they are named.
         outputs = ["stdout"]
-        output_template = {
-                "c": "grofile",
-                "e": "enfile",
-                "g": "logfile",
-                "o": "trrfile",
-                "x": "x_file",
-                "cpo": "cpo_file",
-                "dhdl": "dhdl_file",
-                "field": "field_file",
-                "tpi": "tpi_file",
-                "tpid": "tpid_file",
-                "eo": "eo_file",
-                "px": "px_file",
-                "pf": "pf_file",
-                "ro": "ro_file",
-                "ra": "ra_file",
-                "rs": "rs_file",
-                "rt": "rt_file",
-                "mtx": "mtx_file",
-                "if": "if_file",
-                "swap": "swap_file"
-            }
-
-        for item in output_template:
-            if item in self.node.inputs.parameters.keys():
-                outputs.append(output_template[item])
+
+        keep_remote = self.node.get_option("keep_remote") or []
+        for item, port in OUTPUT_PORTS.items():
+            if item in self.node.inputs.parameters.keys() and item not in keep_remote:
+                outputs.append(port)
 
         # Grab list of retrieved files.
-        files_retrieved = self.retrieved.base.repository.list_object_names()
+        files_retrieved = largefiles.list_output_files(self)
 
         # Grab list of files expected and remove the scheduler stdout and stderr files.
-        files_expected = [files for files in self.node.get_option("retrieve_list") if files not in ["_scheduler-stdout.txt", "_scheduler-stderr.txt"]]
+        files_expected = [files for files in largefiles.get_expected_files(self.node)
+                          if files != remotefiles.REMOTE_FILES_MANIFEST]
 
         # check if any trajectory file is in files_retrieved
         files_retrieved, files_expected = MdrunParser.check_trajectory_format(
                 files_retrieved, files_expected)
 
+        # Find why the run failed from the messages of mdrun and the scheduler.
+        exit_code_failure = MdrunParser.get_run_failure(self, files_retrieved)
+
         # Check if the expected files are a subset of retrieved.
         if not set(files_expected) <= set(files_retrieved):
             self.logger.error(
                 f"Found files '{files_retrieved}', expected to find '{files_expected}'"
             )
-            return self.exit_codes.ERROR_MISSING_OUTPUT_FILES
+            if exit_code_failure is None and self.node.exit_status:
+                # keep the failure found by the scheduler
+                exit_code_failure = next((exit_code for exit_code in self.exit_codes.values()
+                                          if exit_code.status == self.node.exit_status), None)
+            # Keep the checkpoint the run can be continued from.
+            cpo = self.node.inputs.parameters.get("cpo")
+            if cpo in files_retrieved and "cpo" not in keep_remote:
+                with largefiles.open_output_file(self, cpo, "rb") as handle:
+                    self.out("cpo_file", SinglefileData(filename=cpo, file=handle))
+            if exit_code_failure is None:
+                return self.exit_codes.ERROR_MISSING_OUTPUT_FILES
+            return exit_code_failure
 
         # Map retrieved files to data nodes.
         for i, f in enumerate(files_expected):
             self.logger.info(f"Parsing '{f}'")
-            with self.retrieved.base.repository.open(f, "rb") as handle:
+            with largefiles.open_output_file(self, f, "rb") as handle:
                 output_node = SinglefileData(filename=f, file=handle)
             self.out(outputs[i], output_node)
             # Include file parsers here
@@ -99,17 +100,57 @@ class MdrunParser(Parser):
                 MdrunParser.parse_file_contents(self, f, output_dir,
                                     fileparsers.parse_gromacs_logfile, 
                                     node_name="logfile_metadata")
+                if self.node.get_option("energy_timeseries"):
+                    MdrunParser.parse_energy_timeseries(self, f,
+                                    node_name="energy_timeseries")
+            if outputs[i] == "enfile" and self.node.get_option("enfile_energies"):
+                MdrunParser.parse_energy_file(self, f,
+                                    node_name="enfile_energies")
+
+        # Record the files left on the remote computer.
+        if keep_remote:
+            exit_code = MdrunParser.parse_remote_files(self, [
+                    self.node.inputs.parameters[item] for item in keep_remote
+                    if item in self.node.inputs.parameters.keys()],
+                    node_name="remote_files")
+            if exit_code:
+                return exit_code
 
         # If not in testing mode, then copy back the files.
         if "PYTEST_CURRENT_TEST" not in os.environ:
-            self.retrieved.copy_tree(output_dir)
+            largefiles.export_output_files(self, output_dir)
 
+        if exit_code_failure is not None:
+            return exit_code_failure
         return ExitCode(0)
+
+    def get_run_failure(self, files_retrieved):
+        """
+        Find why mdrun failed from the messages in its stdout, the last run
+        in its log file and the scheduler stderr.
+
+        :param files_retrieved: list of file names returned from calc
+        :returns: the exit code of the failure, or None if none was found
+        """
+        names = [self.node.get_option("output_filename"),
+                 self.node.inputs.parameters["g"]]
+        with ExitStack() as stack:
+            files = [stack.enter_context(largefiles.open_output_file(self, name, "r"))
+                     for name in names if name in files_retrieved]
+            files.append((self.node.get_scheduler_stderr() or "").splitlines())
+            label = fileparsers.get_mdrun_failure(*files)
+        if label is None:
+            return None
+        self.logger.error(f"mdrun failed: {self.exit_codes[label].message}")
+        return self.exit_codes[label]
     
     def parse_file_contents(self, f, output_dir, parser_func, node_name):
         """
         Read in the gromacs output file, save into a dictionary node and 
-        output dictionary as a json file.
+        output dictionary as a json file. A file byte-identical to one
+        already parsed by the same version of parser_func is taken from the
+        parse cache instead, recording a cache hit or miss in the
+        "<node_name>_cache" extra of the calculation node.
 
         :param f: the name of the file node outputted from mdrun for parsing
         :type f: str
@@ -119,12 +160,113 @@ class MdrunParser(Parser):
         :param node_name: the name of the outputted Dict node
         :type node_name: str
         """
-        metadata_dict = parser_func(self, f)
+        cache_key = parsecache.get_cache_key(
+                parsecache.get_output_file_hash(self, f), parser_func)
+        try:
+            metadata_dict = parsecache.ParseCache().get(cache_key)
+        except sqlite3.Error as exception:
+            self.logger.warning(f"Could not read the parse cache: {exception}")
+            metadata_dict = None
+        cache_status = "hit"
+        if metadata_dict is None:
+            cache_status = "miss"
+            metadata_dict = parser_func(self, f)
+            try:
+                parsecache.ParseCache().put(cache_key, metadata_dict)
+            except sqlite3.Error as exception:
+                self.logger.warning(f"Could not update the parse cache: {exception}")
+        self.node.base.extras.set(f"{node_name}_cache", cache_status)
         metadata_node = Dict(metadata_dict)
         self.out(node_name, metadata_node)
         MdrunParser.output_parsed_metadata(f, output_dir, metadata_dict)
 
 
+    def parse_energy_timeseries(self, f, node_name):
+        """
+        Read in the energies printed at each nstlog step of the gromacs log
+        file and save each energy term as an array in an ArrayData node.
+
+        :param f: the name of the log file node outputted from mdrun
+        :type f: str
+        :param node_name: the name of the outputted ArrayData node
+        :type node_name: str
+        """
+        with largefiles.open_output_file(self, f, "r") as handle:
+            timeseries = fileparsers.parse_gromacs_energy_timeseries(handle)
+        if not timeseries:
+            self.logger.warning(f"No energies found in '{f}'")
+            return
+        # array names can only contain alphanumeric characters and
+        # underscores, so keep the gromacs names of the energy terms too.
+        array_node = ArrayData()
+        energy_terms = {}
+        for name, values in timeseries.items():
+            array_name = searchprevious.format_link_label(name).strip("_")
+            energy_terms[array_name] = name
+            array_node.set_array(array_name, values)
+        array_node.base.attributes.set("energy_terms", energy_terms)
+        self.out(node_name, array_node)
+
+
+    def parse_energy_file(self, f, node_name):
+        """
+        Read in the energy terms in each frame of the gromacs energy file
+        and save each term as an array in an ArrayData node.
+
+        :param f: the name of the energy file node outputted from mdrun
+        :type f: str
+        :param node_name: the name of the outputted ArrayData node
+        :type node_name: str
+        """
+        with largefiles.output_file_path(self, f) as path:
+            try:
+                arrays, units = edrparser.parse_gromacs_energy_file(path)
+            except ValueError as exception:
+                self.logger.warning(f"Could not read '{f}': {exception}")
+                return
+        array_node = ArrayData()
+        energy_terms = {}
+        energy_units = {}
+        for name, values in arrays.items():
+            array_name = searchprevious.format_link_label(name).strip("_")
+            energy_terms[array_name] = name
+            energy_units[array_name] = units[name]
+            array_node.set_array(array_name, values)
+        array_node.base.attributes.set("energy_terms", energy_terms)
+        array_node.base.attributes.set("energy_units", energy_units)
+        self.out(node_name, array_node)
+
+
+    def parse_remote_files(self, filenames, node_name):
+        """
+        Read the size and checksum of the output files left on the remote
+        computer from the manifest written by the job script, and save them
+        in a RemoteFilesData node pointing to the remote working directory.
+
+        :param filenames: names of the files left on the remote computer
+        :type filenames: list
+        :param node_name: the name of the outputted RemoteFilesData node
+        :type node_name: str
+        :returns: an exit code if any of the files were not produced
+        """
+        manifest = remotefiles.REMOTE_FILES_MANIFEST
+        if manifest in self.retrieved.base.repository.list_object_names():
+            with self.retrieved.base.repository.open(manifest, "r") as handle:
+                files = remotefiles.parse_manifest(handle)
+        else:
+            files = {}
+        if not set(filenames) <= set(files):
+            self.logger.error(
+                f"Found remote files '{list(files)}', expected to find '{filenames}'"
+            )
+            return self.exit_codes.ERROR_MISSING_OUTPUT_FILES
+        remote_node = RemoteFilesData(files=files,
+                remote_path=self.node.get_remote_workdir(),
+                computer=self.node.computer)
+        self.out(node_name, remote_node)
+        return None
+
+
     def output_parsed_metadata(f, output_dir, metadata_dict):
         """
         Save a dictionary into a json file if not in testing mode.
@@ -0,0 +1,85 @@
+"""
+Parsers provided by aiida_gromacs.
+
+This parser adds the ability to parse the outputs of an ensemble of 'gmx
+mdrun' simulations run with -multidir.
+"""
+import os
+from pathlib import Path
+from aiida.common import exceptions
+from aiida.engine import ExitCode
+from aiida.orm import Dict, SinglefileData
+from aiida.parsers.parser import Parser
+from aiida.plugins import CalculationFactory
+from aiida_gromacs.calculations.mdrunmultidir import get_replica_files, get_replicas
+from aiida_gromacs.utils import fileparsers, largefiles
+
+MdrunMultidirCalculation = CalculationFactory("gromacs.mdrun_multidir")
+
+
+class MdrunMultidirParser(Parser):
+    """
+    Parser class for parsing output of calculation.
+    """
+
+    def __init__(self, node):
+        """
+        Initialize Parser instance
+
+        Checks that the ProcessNode being passed was produced by a MdrunMultidirCalculation.
+
+        :param node: ProcessNode of calculation
+        :param type node: :class:`aiida.orm.nodes.process.process.ProcessNode`
+        """
+        super().__init__(node)
+        if not issubclass(node.process_class, MdrunMultidirCalculation):
+            raise exceptions.ParsingError("Can only parse MdrunMultidirCalculation")
+
+    def parse(self, **kwargs):
+        """
+        Parse outputs, store results in database.
+
+        :returns: an exit code, if parsing fails (or nothing if parsing succeeds)
+        """
+        # the directory for storing parsed output files
+        output_dir = Path(self.node.get_option("output_dir"))
+        # output files retrieved outside of the repository by the large_file_policy
+        self.retrieved_temporary_folder = kwargs.get("retrieved_temporary_folder")
+
+        stdout = self.node.get_option("output_filename")
+        if stdout not in largefiles.list_output_files(self):
+            self.logger.error(f"Found no stdout file '{stdout}'")
+            return self.exit_codes.ERROR_MISSING_OUTPUT_FILES
+
+        # Check the files of every replica were written in its directory.
+        replica_files = get_replica_files(self.node.inputs.parameters,
+                                          get_replicas(self.node.inputs))
+        for replica, outputs in replica_files.items():
+            files_retrieved = [f"{replica}/{name}" for name in
+                               largefiles.list_output_files(self, replica)]
+            files_expected = list(outputs.values())
+            if not set(files_expected) <= set(files_retrieved):
+                self.logger.error(
+                    f"Found files '{files_retrieved}', expected to find '{files_expected}'"
+                )
+                return self.exit_codes.ERROR_MISSING_OUTPUT_FILES
+
+        with self.retrieved.base.repository.open(stdout, "rb") as handle:
+            self.out("stdout", SinglefileData(filename=stdout, file=handle))
+
+        # Map the files of each replica to data nodes in its namespace.
+        for replica, outputs in replica_files.items():
+            for port, path in outputs.items():
+                self.logger.info(f"Parsing '{path}'")
+                with largefiles.open_output_file(self, path, "rb") as handle:
+                    output_node = SinglefileData(filename=os.path.basename(path), file=handle)
+                self.out(f"replicas.{replica}.{port}", output_node)
+                if port == "logfile":
+                    metadata_dict = fileparsers.parse_gromacs_logfile(self, path)
+                    self.out(f"replicas.{replica}.logfile_metadata", Dict(metadata_dict))
+
+        # If not in testing mode, then copy back the files.
+        if "PYTEST_CURRENT_TEST" not in os.environ:
+            largefiles.export_output_files(self, output_dir)
+
+        return ExitCode(0)
@@ -0,0 +1,76 @@
+"""
+Parsers provided by aiida_gromacs.
+
+This parser adds the ability to parse the outputs of the preprocessing steps
+run in a single job.
+"""
+import os
+from pathlib import Path
+from aiida.common import exceptions
+from aiida.engine import ExitCode
+from aiida.orm import SinglefileData
+from aiida.parsers.parser import Parser
+from aiida.plugins import CalculationFactory
+from aiida_gromacs.calculations.preprocess import get_output_files, get_steps
+from aiida_gromacs.utils import largefiles
+
+PreprocessCalculation = CalculationFactory("gromacs.preprocess")
+
+
+class PreprocessParser(Parser):
+    """
+    Parser class for parsing output of calculation.
+    """
+
+    def __init__(self, node):
+        """
+        Initialize Parser instance
+
+        Checks that the ProcessNode being passed was produced by a PreprocessCalculation.
+
+        :param node: ProcessNode of calculation
+        :param type node: :class:`aiida.orm.nodes.process.process.ProcessNode`
+        """
+        super().__init__(node)
+        if not issubclass(node.process_class, PreprocessCalculation):
+            raise exceptions.ParsingError("Can only parse PreprocessCalculation")
+
+    def parse(self, **kwargs):
+        """
+        Parse outputs, store results in database.
+
+        :returns: an exit code, if parsing fails (or nothing if parsing succeeds)
+        """
+        # the directory for storing parsed output files
+        output_dir = Path(self.node.get_option("output_dir"))
+        # output files retrieved outside of the repository by the large_file_policy
+        self.retrieved_temporary_folder = kwargs.get("retrieved_temporary_folder")
+
+        # Check that folder content is as expected
+        steps = get_steps(self.node.inputs)
+        output_files = get_output_files(steps)
+        files_retrieved = largefiles.list_output_files(self)
+        files_expected = [filename for outputs in output_files.values()
+                          for filename in outputs.values()]
+
+        # Note: set(A) <= set(B) checks whether A is a subset of B
+        if not set(files_expected) <= set(files_retrieved):
+            self.logger.error(
+                f"Found files '{files_retrieved}', expected to find '{files_expected}'"
+            )
+            return self.exit_codes.ERROR_MISSING_OUTPUT_FILES
+
+        # add the outputs of each step, named as the step wrote them
+        for step, (_, outputs) in steps.items():
+            for port, filename in outputs.items():
+                thing = output_files[step][port]
+                self.logger.info(f"Parsing '{thing}'")
+                with largefiles.open_output_file(self, thing, "rb") as handle:
+                    output_node = SinglefileData(filename=filename, file=handle)
+                self.out(f"{step}.{port}", output_node)
+
+        # If not in testing mode, then copy back the files.
+        if "PYTEST_CURRENT_TEST" not in os.environ:
+            largefiles.export_output_files(self, output_dir)
+
+        return ExitCode(0)
@@ -0,0 +1,253 @@
+"""
+Reader for the energy frames saved by gromacs in .edr files.
+
+The .edr format is XDR encoded (big-endian, padded to 4 bytes) and follows
+the layout written by src/gromacs/fileio/enxio.cpp in gromacs. Energy files
+from single and double precision builds and all enx file versions are read
+without needing a gmx binary.
+"""
+from collections.abc import Mapping
+import os
+import struct
+
+import numpy as np
+
+ENX_VERSION = 5
+ENX_MAGIC = -55555
+FRAME_MAGIC = -7777777
+
+# xdr datatypes of the values in the additional blocks of a frame
+XDR_FLOAT = 1
+XDR_DOUBLE = 2
+XDR_STRING = 5
+# number of bytes taken by each value of the int, float, double, int64 and
+# char datatypes, strings are variable in size.
+XDR_DATATYPE_SIZES = (4, 4, 8, 8, 4)
+
+
+class EnergyFile(Mapping):
+    """
+    Lazy, memory-mapped columnar view of the energy terms in a .edr file.
+
+    Only the frame headers are read when the file is opened, recording the
+    step, time and byte offset of the energies in each frame. The values of
+    an energy term are gathered across all frames when the term is accessed,
+    so only the pages of the file holding that term are read. Frames without
+    energies (e.g. free energy blocks only) are skipped and reading stops at
+    a truncated last frame.
+
+    :param path: path to the .edr file
+    :type path: str or :class:`pathlib.Path`
+    """
+
+    def __init__(self, path):
+        if os.path.getsize(path) == 0:
+            raise ValueError(f"Energy file '{path}' is empty")
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        self._pos = 0
+        try:
+            self._read_names()
+        except struct.error as exception:
+            raise ValueError("Could not read the energy names, "
+                             "this is not a gromacs edr file") from exception
+        self._real_size = 8 if self._is_double() else 4
+        self._real_dtype = np.dtype(f">f{self._real_size}")
+
+        steps, times, offsets, strides = [], [], [], []
+        while self._pos < self._data.size:
+            try:
+                frame = self._read_frame()
+            except struct.error:
+                break
+            if self._pos > self._data.size:
+                break
+            if frame is not None:
+                steps.append(frame[0])
+                times.append(frame[1])
+                offsets.append(frame[2])
+                strides.append(frame[3])
+
+        self.step = np.array(steps, dtype=np.int64)
+        self.time = np.array(times, dtype=np.float64)
+        self._offsets = np.array(offsets, dtype=np.int64)
+        self._strides = np.array(strides, dtype=np.int64)
+        self._columns = {name: i for i, name in enumerate(self.names)}
+
+    def __getitem__(self, name):
+        """
+        Gather the values of an energy term in every frame.
+
+        :param name: the gromacs name of the energy term, e.g. 'Potential'
+        :returns: the values of the term as a float64 array
+        """
+        column = self._columns[name]
+        starts = self._offsets + column * self._strides
+        value_bytes = self._data[starts[:, None] + np.arange(self._real_size)]
+        return value_bytes.view(self._real_dtype).ravel().astype(np.float64)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def nframes(self):
+        """The number of frames holding energies."""
+        return self.step.size
+
+    def _unpack(self, fmt):
+        """Unpack a value at the current position and move past it."""
+        value = struct.unpack_from(fmt, self._data, self._pos)[0]
+        self._pos += struct.calcsize(fmt)
+        return value
+
+    def _unpack_string(self):
+        """Unpack a string, which is prefixed by its length and padded to
+        a multiple of 4 bytes."""
+        length = self._unpack(">i")
+        if length < 0 or self._pos + length > self._data.size:
+            raise struct.error(f"string of length {length} runs past the "
+                               "end of the file")
+        value = self._data[self._pos:self._pos + length].tobytes()
+        self._pos += length + (-length % 4)
+        return value.decode("ascii")
+
+    def _read_names(self):
+        """Read the file version and the names and units of the energy
+        terms at the start of the file."""
+        magic = self._unpack(">i")
+        if magic > 0:
+            # the oldest files start with the number of energy terms
+            self.version = 1
+            self.nre = magic
+        else:
+            if magic != ENX_MAGIC:
+                raise ValueError("Energy names magic number mismatch, "
+                                 "this is not a gromacs edr file")
+            self.version = self._unpack(">i")
+            if self.version > ENX_VERSION:
+                raise ValueError(f"Reading edr file version {self.version} "
+                                 f"with version {ENX_VERSION} implementation")
+            self.nre = self._unpack(">i")
+        self.names = []
+        self.units = {}
+        for _ in range(self.nre):
+            name = self._unpack_string()
+            self.names.append(name)
+            self.units[name] = (self._unpack_string()
+                                if self.version >= 2 else "kJ/mol")
+
+    def _is_double(self):
+        """Check whether the reals of the first frame are double precision
+        by looking ahead for where values are expected with single precision.
+        """
+        if self.version == 1:
+            # time (8 bytes) and step (4 bytes) come before the number of
+            # energy terms in double precision files.
+            offset, expected = 12, self.nre
+        else:
+            # the frame magic number follows the first real
+            offset, expected = 4, FRAME_MAGIC
+        if self._pos + offset + 4 > self._data.size:
+            return False
+        value = struct.unpack_from(">i", self._data, self._pos + offset)[0]
+        if self.version == 1:
+            return value == expected
+        return value != expected
+
+    def _read_frame(self):
+        """
+        Read the header of a frame and move past its energies and blocks.
+
+        :returns: the step, time, offset of the first energy and the bytes
+            between the energies of consecutive terms, or None if the frame
+            has no energies
+        """
+        real = ">d" if self._real_size == 8 else ">f"
+        real_type = XDR_DOUBLE if self._real_size == 8 else XDR_FLOAT
+
+        first_real = self._unpack(real)
+        if first_real > -1e-10:
+            # frames of the oldest files have no magic number
+            if self.version != 1:
+                raise ValueError("Expected edr file version 1, "
+                                 f"found version {self.version}")
+            frame_version = 1
+            time = first_real
+            step = self._unpack(">i")
+            nsum = 0
+        else:
+            if self._unpack(">i") != FRAME_MAGIC:
+                raise ValueError("Energy header magic number mismatch, "
+                                 "this is not a gromacs edr file")
+            frame_version = self._unpack(">i")
+            time = self._unpack(">d")
+            step = self._unpack(">q")
+            nsum = self._unpack(">i")
+            if frame_version >= 3:
+                self._unpack(">q")  # nsteps
+            if frame_version >= 5:
+                self._unpack(">d")  # dt
+        nre = self._unpack(">i")
+        ndisre = self._unpack(">i") if frame_version < 4 else 0
+        if frame_version >= 4:
+            self._unpack(">i")  # reserved
+        nblock = self._unpack(">i")
+
+        # (datatype, number of values) of each subblock in the frame
+        subblocks = []
+        if ndisre > 0:
+            subblocks += [(real_type, ndisre), (real_type, ndisre)]
+        for _ in range(nblock):
+            if frame_version < 4:
+                subblocks.append((real_type, self._unpack(">i")))
+            else:
+                self._unpack(">i")  # block id
+                nsub = self._unpack(">i")
+                for _ in range(nsub):
+                    datatype = self._unpack(">i")
+                    subblocks.append((datatype, self._unpack(">i")))
+        self._pos += 12  # e_size and two reserved ints
+
+        # each energy is followed by its average and sum when these are
+        # saved, and an unused real in the oldest files.
+        offset = self._pos
+        if self.version == 1:
+            nvalues = 4
+        else:
+            nvalues = 3 if nsum > 0 else 1
+        stride = nvalues * self._real_size
+        self._pos += nre * stride
+
+        for datatype, nr in subblocks:
+            if datatype == XDR_STRING:
+                for _ in range(nr):
+                    self._unpack_string()
+            elif 0 <= datatype < len(XDR_DATATYPE_SIZES):
+                self._pos += nr * XDR_DATATYPE_SIZES[datatype]
+            else:
+                raise ValueError("Reading unknown block data type: this "
+                                 "file is corrupted or from the future")
+
+        if nre == 0:
+            return None
+        if nre != self.nre:
+            raise ValueError(f"Frame at step {step} has {nre} energy terms, "
+                             f"expected {self.nre}")
+        return step, time, offset, stride
+
+
+def parse_gromacs_energy_file(path):
+    """
+    Read the step, time and energy terms of every frame in a .edr file into
+    a dictionary of arrays, keyed by the gromacs names of the terms.
+
+    :param path: path to the .edr file
+    :returns: dictionary of numpy arrays, with the energy term units
+    """
+    energies = EnergyFile(path)
+    arrays = {"step": energies.step, "time": energies.time}
+    arrays.update(energies.items())
+    units = {"step": "", "time": "ps", **energies.units}
+    return arrays, units
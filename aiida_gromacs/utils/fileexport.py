@@ -0,0 +1,103 @@
+"""
+Export files from the AiiDA repository to the local filesystem.
+
+Files stored as loose objects in a disk-objectstore repository are opened as
+the real files on disk, so these are cloned (reflink) when the filesystem
+supports copy-on-write, or copied by the kernel with os.sendfile, instead of
+being read through python in small chunks. Other files are streamed with
+large buffers. Hardlinks are not used, as the exported file would then share
+its contents with the repository object and a later write to it, e.g. by
+mdrun -append, would corrupt the repository.
+"""
+import os
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError: # not available on windows
+    fcntl = None
+
+from aiida.repository import FileType
+
+# linux ioctl request to clone the extents of a file, e.g. on btrfs or xfs
+FICLONE = 0x40049409
+BUFFER_SIZE = 8 * 1024 * 1024 # bytes
+
+
+def export_file(handle, file_path):
+    """
+    Write the contents of an open repository file to a path.
+
+    :param handle: file handle opened in binary mode at its start
+    :param file_path: path of the file to write
+    :returns: the method used, "reflink", "sendfile" or "copy"
+    """
+    source = getattr(handle, "name", None)
+    on_disk = (isinstance(source, str) and os.path.isfile(source)
+               and handle.tell() == 0)
+    with open(file_path, "wb") as f_out:
+        if on_disk:
+            if fcntl is not None:
+                try:
+                    fcntl.ioctl(f_out.fileno(), FICLONE, handle.fileno())
+                    return "reflink"
+                except OSError:
+                    pass
+            try:
+                size = os.fstat(handle.fileno()).st_size
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(f_out.fileno(), handle.fileno(),
+                                       offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                return "sendfile"
+            except (AttributeError, OSError):
+                # sendfile is not available or only writes to sockets
+                f_out.seek(0)
+                f_out.truncate()
+        shutil.copyfileobj(handle, f_out, BUFFER_SIZE)
+        return "copy"
+
+
+def export_files(self, filenames, output_dir):
+    """
+    Export files of the retrieved folder of a calculation to a directory,
+    including the contents of any subdirectories, logging the rate at which
+    each file is written.
+
+    :param self: parser instance
+    :param filenames: names of the files or directories in the retrieved
+        folder to export
+    :param output_dir: path of directory where files should be saved
+    """
+    repository = self.retrieved.base.repository
+    for name in filenames:
+        if repository.get_object(name).file_type == FileType.DIRECTORY:
+            for root, _, subfilenames in repository.walk(name):
+                export_files(self, [str(root / subname)
+                        for subname in subfilenames], output_dir)
+            continue
+        file_path = os.path.join(output_dir, name)
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        start = time.perf_counter()
+        with repository.open(name, "rb") as handle:
+            method = export_file(handle, file_path)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(file_path)
+        rate = size / elapsed if elapsed > 0 else float("inf")
+        self.logger.info(f"Exported '{name}' ({size} bytes) to '{output_dir}' "
+                         f"by {method} at {rate:.0f} bytes/s")
+
+
+def export_tree(self, output_dir):
+    """
+    Export all files of the retrieved folder of a calculation to a directory.
+
+    :param self: parser instance
+    :param output_dir: path of directory where files should be saved
+    """
+    export_files(self, self.retrieved.base.repository.list_object_names(),
+                 output_dir)
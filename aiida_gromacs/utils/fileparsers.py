@@ -4,7 +4,79 @@ Functions for parsing various gromacs input/output files and extracting
 metadata into a dictionary.
 """
 import re
-import os
+
+import numpy as np
+
+from aiida_gromacs.utils import fileexport, largefiles
+
+# version of the metadata output by the parsers, increased whenever their
+# output changes so that files parsed by an older version are parsed again
+PARSER_VERSION = 1
+
+# numeric columns of the tables in the cycle and time accounting section,
+# values in a row are matched to the rightmost columns
+CYCLE_ACCOUNTING_COLUMNS = ["Num Ranks", "Num Threads", "Call Count",
+        "Wall time (s)", "Giga-Cycles", "%"]
+GPU_TIMINGS_COLUMNS = ["Count", "Wall t (s)", "ms/step", "%"]
+
+# domain decomposition and PME rank load balancing statistics
+LOAD_IMBALANCE_PATTERNS = {
+    "Average load imbalance (%)":
+        r"Average load imbalance: (-?[\d.]+)",
+    "Balanceable part of MD step (%)":
+        r"balanceable part of the MD step is (-?[\d.]+)",
+    "Time waiting due to load imbalance (%)":
+        r"spent waiting due to load imbalance: (-?[\d.]+)",
+    "Average PME mesh/force load":
+        r"Average PME mesh/force load: (-?[\d.]+)",
+    "Time waiting due to PP/PME imbalance (%)":
+        r"spent waiting due to PP/PME imbalance: (-?[\d.]+)",
+}
+
+# log message at the start of each run appended to the mdrun log file
+RUN_START = "Started mdrun"
+
+# messages of mdrun, the MPI launcher and the scheduler telling why a run
+# failed, by the exit code of the failure, in the order they are checked
+MDRUN_FAILURE_PATTERNS = {
+    "ERROR_DOMAIN_DECOMPOSITION": re.compile(
+        r"There is no domain decomposition for|smaller than the cell size limit"
+        r"|mdrun option -rdd or -dds"),
+    "ERROR_CONSTRAINT_FAILURE": re.compile(
+        r"Too many (LINCS|SETTLE) warnings|can not be settled|SHAKE did not converge"),
+    "ERROR_OUT_OF_MEMORY": re.compile(
+        r"Not enough memory|std::bad_alloc|out of memory|oom[-_ ]kill"
+        r"|Exceeded job memory limit|Cannot allocate memory", re.IGNORECASE),
+    "ERROR_OUT_OF_WALLTIME": re.compile(
+        r"Received the (TERM|INT|USR1) signal|DUE TO TIME LIMIT"),
+    "ERROR_SCHEDULER_NODE_FAILURE": re.compile(r"DUE TO NODE FAILURE"),
+}
+
+
+def get_mdrun_failure(*files):
+    """
+    Find why mdrun failed from the messages in its output files. Only the
+    last run appended to a log file is checked.
+
+    :param files: iterables of the lines of the output files, e.g. the
+        stdout, the log file and the scheduler stderr
+    :return: the label of the exit code of the failure, or None
+    """
+    failures = set()
+    for lines in files:
+        run_failures = set()
+        for line in lines:
+            if line.startswith(RUN_START):
+                run_failures.clear()
+            for label, pattern in MDRUN_FAILURE_PATTERNS.items():
+                if pattern.search(line):
+                    run_failures.add(label)
+        failures.update(run_failures)
+    for label in MDRUN_FAILURE_PATTERNS:
+        if label in failures:
+            return label
+    return None
+
 
 def parse_process_files(self, files_retrieved, output_dir):
     """
@@ -18,48 +90,43 @@ def parse_process_files(self, files_retrieved, output_dir):
     # parse retrieved files and write them to where command was run
     for thing in files_retrieved:
         self.logger.info(f"Parsing '{thing}'")
-        file_path = os.path.join(output_dir, thing)
-        try:
-            with self.retrieved.open(thing, "rb") as handle:
-                with open(file_path, "wb") as f_out:
-                    while True:
-                        chunk = handle.read(1024)
-                        if not chunk:
-                            break
-                        f_out.write(chunk)
-
-        except UnicodeDecodeError:
-            with self.retrieved.open(thing, "r") as handle:
-                with open(file_path, "w", encoding="utf-8") as f_out:
-                    for line in handle.read():
-                        f_out.write(line)
-
-
-def extract_nested_dict(i, j, lines, input_dict, split_with, leading_space, 
-            leading_space_check_list):
-    """
-    For each of the input parameers defined in the gromacs log file, output
-    each indented section into dictionary format.
-
-    :param i: line number in file
-    :param j: line number from line i in file
-    :param lines: lines in file
-    :param input_dict: dictionary for storing parsed data
+    fileexport.export_files(self, files_retrieved, output_dir)
+
+
+def leading_space_count(line):
+    """
+    Count the number of spaces at the start of a line.
+
+    :param line: line in file
+    :return: index of the first non-whitespace character in the line
+    """
+    return re.search(r"\S", line).start()
+
+
+def update_nested_dicts(nested_dicts, line, leading_space_check,
+            split_with="="):
+    """
+    For each of the indented input parameter sections that are still being
+    read, add the contents of the line to the dictionary of that section.
+    A section stops being read when a line containing ":" is found with a
+    number of leading spaces in its leading_space_check_list.
+
+    :param nested_dicts: list of [input_dict, leading_space,
+        leading_space_check_list] for each section still being read
+    :param line: line in file
+    :param leading_space_check: the number of spaces at the start of the line
     :param split_with: the delimiter used to split contents in a file
-    :param leading_space: the number of spaces at the start of a line
-    :param leading_space_check_list: list of acceptable number of starting spaces in a line
-    """
-    for k, line3 in enumerate(lines[i+j+1:]):
-        if line3 == "\n":
-            break
-        leading_space_check = re.search(r"\S", line3).start()
-        if ":" in line3 and leading_space_check in leading_space_check_list:
-            break
-        if split_with in line3:
-            l = line3.strip().split(split_with)
+    """
+    for nested in list(nested_dicts):
+        input_dict, leading_space, leading_space_check_list = nested
+        if ":" in line and leading_space_check in leading_space_check_list:
+            nested_dicts.remove(nested)
+            continue
+        if split_with in line:
+            l = line.strip().split(split_with)
             if leading_space_check > leading_space:
                 input_dict[l[0].strip()] = l[1].strip()
-    return input_dict
+
 
 def parse_gromacs_logfile(self, f):
     """
@@ -69,136 +136,334 @@ def parse_gromacs_logfile(self, f):
     :param f: name of file in output node 
     :return: dictionary of logfile metadata
     """
+    with largefiles.open_output_file(self, f, "r") as handle:
+        return parse_gromacs_logfile_lines(handle)
+
+
+def parse_gromacs_logfile_lines(lines):
+    """
+    Parse the lines of a gromacs mdrun logfile in a single pass. Each section
+    of interest is switched on when its header line is found and switched off
+    again at the line that ends it, so only the previous line needs to be
+    kept and the file is never read into memory as a whole.
+
+    :param lines: iterable of lines in the logfile, e.g. an open file handle
+    :return: dictionary of logfile metadata
+    """
     input_params = {}
     averages = {}
-    with self.retrieved.base.repository.open(f, "r") as handle:
-        lines = handle.readlines()
-        for i, line in enumerate(lines):
-            # find line containing executable and save subsequent lines with
-            # zero leading spaces
-            if re.match(r"(?i)Executable:", line):
-                for j, line2 in enumerate(lines[i:]):
-                    if line2 == "\n":
-                        break
-                    leading_space = re.search(r"\S", line2).start()
-                    if ":" in line2 and leading_space == 0:
-                        top = line2.strip().split(":")[0].strip()
-                        val = line2.strip().split(":")[1].strip()
-                        input_params[top] = val
-            # find line containing command, assumes the command is on next line
-            if "Command line:" in line:
-                if i + 1 < len(lines):
-                    command = lines[i+1].strip()
-                    input_params["Command line"] = rf"{command}"
-            # save subsequent lines with zero leading spaces
-            if re.match(r"(?i)GROMACS version:", line):
-                for j, line2 in enumerate(lines[i:]):
-                    if line2 == "\n":
-                        break
-                    leading_space = re.search(r"\S", line2).start()
-                    if ":" in line2 and leading_space == 0:
-                        top = line2.strip().split(":")[0].strip()
-                        val = line2.strip().split(":")[1].strip()
-                        input_params[top] = val
-            # extract compute from line containing "Running"
-            if re.match(r"(?i)Running", line):
-                compute_info = line.split()
-                top = " ".join(compute_info[:2])
-                input_params[top] = {}
-                input_params[top][compute_info[3]] = compute_info[2] #nodes
-                input_params[top][compute_info[7][:-1]] = compute_info[6] #cores
-                input_params[top][" ".join(compute_info[-2:])] = compute_info[8] #PUs
-            # Extract Hardware info, delimiters are not like input params
-            if re.match(r"(?i)Hardware detected:", line):
-                for j, line2 in enumerate(lines[i:]):
-                    if line2 == "\n":
-                        break
-                    leading_space = re.search(r"\S", line2).start()
-                    if ":" in line2 and leading_space == 0:
-                        top = line2.strip().split(":")[0]
-                        input_params[top] = {}
-                    if ":" in line2 and leading_space == 2:
-                        top2 = line2.strip().split(r":")[0]
-                        top2_val = line2.strip().split(r":")[1]
-                        input_params[top][top2] = {}
-                    if ":" in line2 and leading_space == 4:
-                        top3 = line2.strip()
-                        top3 = re.split(r"\s{3}", top3)
-                        for pair in top3:
-                            key_val = pair.split(r":")
-                            key = key_val[0].strip()
-                            val = key_val[1].strip()
-                            if len(key_val) == 2:
-                                if val != "":
-                                    input_params[top][top2][key] = val
-                                else:
-                                    input_params[top][top2][key] = {}
-                    if ":" in line2 and leading_space == 6:
-                        key_val2 = line2.split(r":")
-                        key2 = key_val2[0].strip()
-                        val2 = key_val2[1].strip()
-                        input_params[top][top2][key][key2] = val2
-            # extract input params
-            if re.match(r"(?i)Input\sParameters", line):
-                for j, line2 in enumerate(lines[i:]):
-                    if line2 == "\n":
-                        break
-                    leading_space = re.search(r"\S", line2).start()
-                    if ":" in line2 and leading_space == 0:
-                        top = line2.strip().split(":")[0]
-                        input_params[top] = {}
-                        extract_nested_dict(i, j, lines, input_params[top], 
-                                "=", leading_space, [0,3])
-                    if ":" in line2 and leading_space == 3:
-                        top2 = line2.strip().split(":")[0]
-                        input_params[top][top2] = {}
-                        extract_nested_dict(i, j, lines, input_params[top][top2], 
-                                "=", leading_space, [3,5])
-                    if ":" in line2 and leading_space == 5:
-                        top3 = line2.strip().split(":")[0]
-                        input_params[top][top2][top3] = {}
-                        extract_nested_dict(i, j, lines, 
-                                input_params[top][top2][top3], "=", leading_space, 
-                                [5,7])
-                    if ":" in line2 and leading_space == 7:
-                        top4 = line2.strip().split(":")[0]
-                        input_params[top][top2][top3][top4] = {}
-                        extract_nested_dict(i, j, lines, 
-                                input_params[top][top2][top3][top4], 
-                                "=", leading_space, [7])
-            # extract ensemble averages
-            if "A V E R A G E S" in line:
-                for j, line2 in enumerate(lines[i:]):
-                    if "Statistics" in line2:
-                        l = line2.strip().split()
-                        averages["total-steps"] = l[2]
-                        averages["total-frames"] = l[5]
-                    if "M E G A - F L O P S" in line2:
-                        break
-                    numbers = re.findall(r"\d+\.\d+e[\+|-]\d+", line2, re.DOTALL)
-                    if len(numbers) != 0:
-                        possible_header = lines[i+j-1].strip() #remove \n
-                        if re.match(r"[a-z,A-Z]", possible_header):    
-                            header = re.split(r"\s{2}+", possible_header)
-                            header = list(filter(None, header)) # remove "" entries          
-                            if len(numbers) == len(header):
-                                for hn in range(len(header)):
-                                    averages[header[hn].strip()] = numbers[hn]
-            if "Time:" in line:
-                averages["Time"] = {}
-                l = line.strip().split()[1:]
-                head = list(filter(None, lines[i-1].strip().split("  ")))
-                for hn in range(len(head)):
-                    averages["Time"][head[hn]] = l[hn]
-            if "Performance:" in line:
-                averages["Performance"] = {}
-                l = line.strip().split()[1:]
-                # head = list(filter(None, lines[i-1].strip().split("  ")))
-                head = list(filter(None, re.split(r'\s{2,}', lines[i-1].strip())))
-                for hn in range(len(head)):
-                    averages["Performance"][head[hn]] = l[hn]
-                        
+    cycle_accounting = {}
+    cycle_table = [None, CYCLE_ACCOUNTING_COLUMNS] # table, columns
+    sections = [] # sections being read, in the order they were found
+    nested_dicts = [] # indented input parameter sections being read
+    hardware_keys = [None, None, None] # section, subsection, key
+    input_keys = [None, None, None] # section, subsection, subsubsection
+    previous_line = ""
+    command_next = False
+
+    def read_header(line, leading_space):
+        # save lines with zero leading spaces
+        if ":" in line and leading_space == 0:
+            top = line.strip().split(":")[0].strip()
+            val = line.strip().split(":")[1].strip()
+            input_params[top] = val
+
+    def read_hardware(line, leading_space):
+        # Extract Hardware info, delimiters are not like input params
+        top, top2, key = hardware_keys
+        if ":" in line and leading_space == 0:
+            top = line.strip().split(":")[0]
+            input_params[top] = {}
+        if ":" in line and leading_space == 2:
+            top2 = line.strip().split(r":")[0]
+            input_params[top][top2] = {}
+        if ":" in line and leading_space == 4:
+            top3_pairs = re.split(r"\s{3}", line.strip())
+            for pair in top3_pairs:
+                key_val = pair.split(r":")
+                key = key_val[0].strip()
+                val = key_val[1].strip()
+                if len(key_val) == 2:
+                    if val != "":
+                        input_params[top][top2][key] = val
+                    else:
+                        input_params[top][top2][key] = {}
+        if ":" in line and leading_space == 6:
+            key_val2 = line.split(r":")
+            key2 = key_val2[0].strip()
+            val2 = key_val2[1].strip()
+            input_params[top][top2][key][key2] = val2
+        hardware_keys[:] = top, top2, key
+
+    def read_input_params(line, leading_space):
+        # extract input params, each indented section collects the "="
+        # separated lines that follow it until the section ends
+        top, top2, top3 = input_keys
+        update_nested_dicts(nested_dicts, line, leading_space)
+        if ":" in line and leading_space == 0:
+            top = line.strip().split(":")[0]
+            input_params[top] = {}
+            nested_dicts.append([input_params[top], leading_space, [0,3]])
+        if ":" in line and leading_space == 3:
+            top2 = line.strip().split(":")[0]
+            input_params[top][top2] = {}
+            nested_dicts.append([input_params[top][top2], leading_space,
+                    [3,5]])
+        if ":" in line and leading_space == 5:
+            top3 = line.strip().split(":")[0]
+            input_params[top][top2][top3] = {}
+            nested_dicts.append([input_params[top][top2][top3],
+                    leading_space, [5,7]])
+        if ":" in line and leading_space == 7:
+            top4 = line.strip().split(":")[0]
+            input_params[top][top2][top3][top4] = {}
+            nested_dicts.append([input_params[top][top2][top3][top4],
+                    leading_space, [7]])
+        input_keys[:] = top, top2, top3
+
+    def read_averages(line, leading_space):
+        # extract ensemble averages
+        # pylint: disable=unused-argument
+        if "Statistics" in line:
+            l = line.strip().split()
+            averages["total-steps"] = l[2]
+            averages["total-frames"] = l[5]
+        if "M E G A - F L O P S" in line:
+            sections.remove(read_averages)
+            return
+        numbers = re.findall(r"\d+\.\d+e[\+|-]\d+", line, re.DOTALL)
+        if len(numbers) != 0:
+            possible_header = previous_line.strip() #remove \n
+            if re.match(r"[a-z,A-Z]", possible_header):
+                header = re.split(r"\s{2}+", possible_header)
+                header = list(filter(None, header)) # remove "" entries
+                if len(numbers) == len(header):
+                    for hn in range(len(header)):
+                        averages[header[hn].strip()] = numbers[hn]
+
+    def read_cycle_accounting(line, leading_space):
+        # extract the wall time, giga-cycles and percentage of each task
+        # pylint: disable=unused-argument
+        if "R E A L   C Y C L E" in line:
+            averages["Cycle Accounting"] = cycle_accounting
+            return
+        if "Core t (s)" in line:
+            sections.remove(read_cycle_accounting)
+            return
+        stripped = line.strip()
+        if re.match(r"(?i)On \d+ MPI rank", stripped):
+            parallelism = cycle_accounting.get("Parallelism", "")
+            cycle_accounting["Parallelism"] = f"{parallelism} {stripped}".strip()
+        elif "GPU/CPU" in stripped:
+            cycle_accounting[stripped.split(":")[0]] = float(stripped.split()[-1])
+        elif re.match(r"(?i)(Breakdown of|GPU timings)", stripped):
+            cycle_table[0] = cycle_accounting[stripped] = {}
+            cycle_table[1] = (GPU_TIMINGS_COLUMNS if "GPU" in stripped
+                    else CYCLE_ACCOUNTING_COLUMNS)
+        elif ":" in stripped or stripped.startswith("-"):
+            # table headers and separators
+            if cycle_table[0] is None and re.match(r"(?i)(Computing|Activity):",
+                    stripped):
+                cycle_table[0] = cycle_accounting["Tasks"] = {}
+            return
+        elif cycle_table[0] is not None:
+            # the task name is followed by its numeric columns
+            values = []
+            words = stripped.split()
+            while words and re.fullmatch(r"-?\d+(\.\d*)?", words[-1]):
+                values.insert(0, words.pop())
+            if len(values) == 0:
+                return
+            task = " ".join(words).rstrip(" *")
+            columns = cycle_table[1][-len(values):]
+            cycle_table[0][task] = {column: int(value) if value.isdigit()
+                    else float(value) for column, value in zip(columns, values)}
+
+    # sections that are not ended by a blank line and not indented
+    unindented_sections = (read_averages, read_cycle_accounting)
+
+    def start_section(section, line):
+        if section not in sections:
+            sections.append(section)
+            section(line, None if section in unindented_sections
+                    else leading_space_count(line))
+
+    for line in lines:
+        # a blank line ends every section apart from the averages and
+        # cycle accounting
+        if line == "\n":
+            sections = [s for s in sections if s in unindented_sections]
+            nested_dicts.clear()
+        if sections:
+            leading_space = None
+            for section in list(sections):
+                if (section not in unindented_sections
+                        and leading_space is None):
+                    leading_space = leading_space_count(line)
+                section(line, leading_space)
+        # the command is on the line after "Command line:"
+        if command_next:
+            input_params["Command line"] = line.strip()
+            command_next = False
+        # find line containing executable or version and save subsequent
+        # lines with zero leading spaces
+        if re.match(r"(?i)Executable:", line):
+            start_section(read_header, line)
+        # find line containing command, assumes the command is on next line
+        if "Command line:" in line:
+            command_next = True
+        if re.match(r"(?i)GROMACS version:", line):
+            start_section(read_header, line)
+        # extract compute from line containing "Running"
+        if re.match(r"(?i)Running", line):
+            compute_info = line.split()
+            running = " ".join(compute_info[:2])
+            input_params[running] = {}
+            input_params[running][compute_info[3]] = compute_info[2] #nodes
+            input_params[running][compute_info[7][:-1]] = compute_info[6] #cores
+            input_params[running][" ".join(compute_info[-2:])] = compute_info[8] #PUs
+        if re.match(r"(?i)Hardware detected:", line):
+            start_section(read_hardware, line)
+        if re.match(r"(?i)Input\sParameters", line):
+            start_section(read_input_params, line)
+        if "A V E R A G E S" in line:
+            start_section(read_averages, line)
+        for key, pattern in LOAD_IMBALANCE_PATTERNS.items():
+            match = re.search(pattern, line)
+            if match:
+                averages.setdefault("Load Imbalance", {})[key] = float(
+                        match.group(1).rstrip("."))
+        if "R E A L   C Y C L E" in line:
+            start_section(read_cycle_accounting, line)
+        if "Time:" in line:
+            averages["Time"] = {}
+            l = line.strip().split()[1:]
+            head = list(filter(None, previous_line.strip().split("  ")))
+            for hn in range(len(head)):
+                averages["Time"][head[hn]] = l[hn]
+        if "Performance:" in line:
+            averages["Performance"] = {}
+            l = line.strip().split()[1:]
+            head = list(filter(None, re.split(r'\s{2,}', previous_line.strip())))
+            for hn in range(len(head)):
+                averages["Performance"][head[hn]] = l[hn]
+        previous_line = line
+
     averages = {"Summary": averages}
     # merge dicts
     all_dict = input_params | averages
     return all_dict
+
+
+def parse_gromacs_energy_timeseries(lines, chunk_size=4096):
+    """
+    Extract the energies printed every nstlog steps in a gromacs mdrun
+    logfile into columns. Frames are written into preallocated numpy chunks
+    of chunk_size rows, so memory grows in fixed steps with the number of
+    frames and the chunks are only joined once the whole file has been read.
+
+    :param lines: iterable of lines in the logfile, e.g. an open file handle
+    :param chunk_size: number of frames allocated at a time
+    :return: dictionary of 1D arrays with keys "step", "time" and the
+        name of each energy term, empty if no energies are found
+    """
+    columns = {"step": 0, "time": 1} # column index of each array
+    chunks = [] # filled chunks
+    chunk = None
+    n_rows = chunk_size # rows filled in the current chunk
+    state = None
+    names = []
+    for line in lines:
+        # the step and time header starts a new frame
+        if re.match(r"\s+Step\s+Time", line):
+            state = "step"
+            continue
+        if state == "step":
+            values = line.split()
+            if len(values) == 0:
+                continue
+            try:
+                step, time = int(values[0]), float(values[1])
+            except (IndexError, ValueError):
+                state = None
+                continue
+            if n_rows == chunk_size:
+                if chunk is not None:
+                    chunks.append(chunk)
+                chunk = np.full((chunk_size, len(columns)), np.nan)
+                n_rows = 0
+            chunk[n_rows, :] = np.nan
+            chunk[n_rows, 0:2] = step, time
+            state = "energies"
+        elif state == "energies":
+            if "Energies" in line:
+                state = "names"
+        elif state == "names":
+            # a blank line after the energies ends the frame
+            if line.strip() == "":
+                n_rows += 1
+                state = None
+                continue
+            # energy term names are right aligned in 15 character columns
+            line = line.rstrip()
+            names = [line[i:i+15].strip() for i in range(0, len(line), 15)]
+            for name in names:
+                if name not in columns:
+                    columns[name] = len(columns)
+                    chunk = np.hstack((chunk,
+                            np.full((chunk_size, 1), np.nan)))
+            state = "values"
+        elif state == "values":
+            values = line.split()
+            if len(values) != len(names):
+                state = None
+                continue
+            for name, value in zip(names, values):
+                chunk[n_rows, columns[name]] = float(value)
+            state = "names"
+
+    if chunk is None:
+        return {}
+    # pad chunks filled before any new energy terms were found
+    chunks = [np.hstack((c, np.full((chunk_size, len(columns) - c.shape[1]),
+            np.nan))) for c in chunks]
+    chunks.append(chunk[:n_rows])
+    data = np.concatenate(chunks)
+    timeseries = {name: data[:, column] for name, column in columns.items()}
+    timeseries["step"] = timeseries["step"].astype(np.int64)
+    return timeseries
+
+
+def parse_gromacs_log_progress(lines):
+    """
+    Find the latest step and time, and the performance once the run has
+    finished, in the lines of a gromacs mdrun logfile. Intended for the lines
+    appended to the logfile of a running mdrun since it was last read, so a
+    step and time header without its values yet is left to be read again.
+
+    :param lines: list of complete lines from the logfile
+    :return: dictionary of the progress found, with any of the keys "step",
+        "time" and "ns_per_day", and the number of lines read
+    """
+    progress = {}
+    n_read = len(lines)
+    header = None # index of a step and time header awaiting its values
+    for i, line in enumerate(lines):
+        if re.match(r"\s+Step\s+Time", line):
+            header = i
+            continue
+        if header is not None:
+            values = line.split()
+            if len(values) == 0:
+                continue
+            try:
+                progress["step"] = int(values[0])
+                progress["time"] = float(values[1])
+            except (IndexError, ValueError):
+                pass
+            header = None
+        elif line.startswith("Performance:"):
+            progress["ns_per_day"] = float(line.split()[1])
+    if header is not None:
+        n_read = header
+    return progress, n_read
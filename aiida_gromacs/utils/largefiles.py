@@ -0,0 +1,185 @@
+"""
+Storage policies for the output files of gromacs calculations.
+
+By default every output file is retrieved into the repository, stored again
+as a SinglefileData output and exported to the output_dir, so a large
+trajectory is kept three times. With the "store_once" policies the output
+files, other than the stdout, are put in the retrieve_temporary_list of the
+calculation instead. The engine then only copies them to a temporary folder
+for the parser, which stores each file once as its SinglefileData output and
+exports it from the temporary folder. Files larger than the
+large_file_threshold option are only exported with "store_once_export".
+
+Files in the temporary folder are deleted once parsed, so calculations run
+with a "store_once" policy cannot be parsed again from their retrieved
+folder, although the output files are still available as their outputs.
+"""
+from contextlib import contextmanager
+import os
+import shutil
+import time
+
+from aiida_gromacs.utils import fileexport
+
+LARGE_FILE_POLICIES = ("retrieve", "store_once", "store_once_export")
+DEFAULT_LARGE_FILE_THRESHOLD = 100 * 1024 * 1024 # bytes
+SCHEDULER_FILES = ("_scheduler-stdout.txt", "_scheduler-stderr.txt")
+
+
+def validate_large_file_policy(value, _):
+    """
+    Validate the large_file_policy option of a calculation.
+
+    :param value: the name of the policy
+    :returns: an error message if the policy is not known
+    """
+    if value not in LARGE_FILE_POLICIES:
+        return (f"large_file_policy '{value}' is not one of "
+                f"{', '.join(LARGE_FILE_POLICIES)}")
+    return None
+
+
+def split_retrieve_list(calc, output_files):
+    """
+    Split the output files of a calculation into the files retrieved into
+    the repository and the files only retrieved temporarily for parsing,
+    following the large_file_policy option.
+
+    :param calc: calculation instance
+    :param output_files: names of the output files, starting with the stdout
+    :returns: the retrieve_list and the retrieve_temporary_list
+    """
+    if calc.metadata.options.large_file_policy == "retrieve":
+        return output_files, []
+    stdout = calc.metadata.options.output_filename
+    return ([stdout], [name for name in output_files if name != stdout])
+
+
+def get_expected_files(node):
+    """
+    Get the output files a calculation should have retrieved, in the order
+    they were given to the engine, without the scheduler stdout and stderr.
+
+    :param node: the calculation node
+    :returns: list of file names
+    """
+    retrieve_list = (node.get_option("retrieve_list") or []) + \
+        (node.get_option("retrieve_temporary_list") or [])
+    return [name for name in retrieve_list if name not in SCHEDULER_FILES]
+
+
+def list_output_files(self, path=None):
+    """
+    List the output files retrieved into the repository or the temporary
+    folder of a calculation.
+
+    :param self: parser instance, with the retrieved_temporary_folder
+        attribute set to the path of the temporary folder or None
+    :param path: subdirectory of the working directory to list, by default
+        the working directory itself
+    :returns: list of file names, relative to path
+    """
+    try:
+        files = self.retrieved.base.repository.list_object_names(path)
+    except FileNotFoundError:
+        files = []
+    temporary_folder = getattr(self, "retrieved_temporary_folder", None)
+    if temporary_folder is not None:
+        folder = os.path.join(temporary_folder, path or "")
+        if os.path.isdir(folder):
+            files += [name for name in os.listdir(folder)
+                      if name not in files]
+    return files
+
+
+@contextmanager
+def open_output_file(self, name, mode="rb"):
+    """
+    Open an output file from the temporary folder, if it was retrieved
+    there, or otherwise from the retrieved folder of a calculation.
+
+    :param self: parser instance, see :func:`list_output_files`
+    :param name: name of the output file
+    :param mode: the mode to open the file in, "r" or "rb"
+    """
+    temporary_folder = getattr(self, "retrieved_temporary_folder", None)
+    if temporary_folder is not None and \
+            os.path.isfile(os.path.join(temporary_folder, name)):
+        encoding = None if "b" in mode else "utf-8"
+        with open(os.path.join(temporary_folder, name), mode,
+                  encoding=encoding) as handle:
+            yield handle
+    else:
+        with self.retrieved.base.repository.open(name, mode) as handle:
+            yield handle
+
+
+@contextmanager
+def output_file_path(self, name):
+    """
+    Get a path on disk to an output file, see :func:`open_output_file`.
+
+    :param self: parser instance, see :func:`list_output_files`
+    :param name: name of the output file
+    """
+    temporary_folder = getattr(self, "retrieved_temporary_folder", None)
+    if temporary_folder is not None and \
+            os.path.isfile(os.path.join(temporary_folder, name)):
+        yield os.path.join(temporary_folder, name)
+    else:
+        with self.retrieved.base.repository.as_path(name) as path:
+            yield path
+
+
+def export_temporary_file(source, file_path):
+    """
+    Write a file of the temporary folder to a path. The temporary file is
+    deleted after parsing, so it is hardlinked when on the same filesystem,
+    otherwise it is copied, which is done by the kernel on linux.
+
+    :param source: path of the file in the temporary folder
+    :param file_path: path of the file to write
+    :returns: the method used, "hardlink" or "copy"
+    """
+    if os.path.lexists(file_path):
+        os.remove(file_path)
+    try:
+        os.link(source, file_path)
+        return "hardlink"
+    except OSError:
+        shutil.copyfile(source, file_path)
+        return "copy"
+
+
+def export_output_files(self, output_dir):
+    """
+    Export the output files of a calculation to a directory, skipping the
+    files in the temporary folder larger than the large_file_threshold
+    option unless the large_file_policy is "store_once_export".
+
+    :param self: parser instance, see :func:`list_output_files`
+    :param output_dir: path of directory where files should be saved
+    """
+    fileexport.export_tree(self, output_dir)
+    temporary_folder = getattr(self, "retrieved_temporary_folder", None)
+    if temporary_folder is None:
+        return
+    export_all = self.node.get_option("large_file_policy") == "store_once_export"
+    threshold = self.node.get_option("large_file_threshold")
+    for root, _, filenames in os.walk(temporary_folder):
+        for filename in filenames:
+            source = os.path.join(root, filename)
+            name = os.path.relpath(source, temporary_folder)
+            size = os.path.getsize(source)
+            if size > threshold and not export_all:
+                self.logger.info(f"Not exporting '{name}' ({size} bytes), "
+                                 "it is larger than the large_file_threshold")
+                continue
+            file_path = os.path.join(output_dir, name)
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            start = time.perf_counter()
+            method = export_temporary_file(source, file_path)
+            elapsed = time.perf_counter() - start
+            rate = size / elapsed if elapsed > 0 else float("inf")
+            self.logger.info(f"Exported '{name}' ({size} bytes) to '{output_dir}' "
+                             f"by {method} at {rate:.0f} bytes/s")
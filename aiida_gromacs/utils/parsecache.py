@@ -0,0 +1,159 @@
+"""
+On-disk cache of the metadata parsed from gromacs output files.
+
+Entries are keyed on the sha256 hash of the file content, the parser function
+and the PARSER_VERSION of the parsers, so a byte-identical file is only parsed
+once by each version of a parser. The cache is a single sqlite database, shared by
+all profiles, whose size is bounded by evicting the least recently used
+entries.
+"""
+from contextlib import closing
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from aiida.common.hashing import chunked_file_hash
+from aiida.manage import get_manager
+from aiida.manage.configuration import get_config
+
+from aiida_gromacs.utils import fileparsers, largefiles
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024 # bytes
+
+
+def get_content_hash(handle):
+    """
+    Get the sha256 hash of the content of a file.
+
+    :param handle: file handle opened in binary mode
+    :returns: the hash of the file content
+    """
+    return chunked_file_hash(handle, hashlib.sha256)
+
+
+def get_object_hash(node, name):
+    """
+    Get the sha256 hash of the content of a file in the repository of a
+    node. The file is not read if the node is stored, as the repository
+    keys its objects by the sha256 hash of their content.
+
+    :param node: the node holding the file
+    :param name: the path of the file in the repository of the node
+    :returns: the hash of the file content
+    """
+    repository = get_manager().get_profile_storage().get_repository()
+    if node.is_stored and repository.key_format == "sha256":
+        return node.base.repository.get_object(name).key
+    with node.base.repository.open(name, "rb") as handle:
+        return get_content_hash(handle)
+
+
+def get_output_file_hash(self, name):
+    """
+    Get the sha256 hash of the content of an output file, only reading the
+    files in the temporary folder, see :func:`get_object_hash`.
+
+    :param self: parser instance, see :func:`largefiles.list_output_files`
+    :param name: name of the output file
+    :returns: the hash of the file content
+    """
+    temporary_folder = getattr(self, "retrieved_temporary_folder", None)
+    if temporary_folder is not None and \
+            os.path.isfile(os.path.join(temporary_folder, name)):
+        with largefiles.open_output_file(self, name, "rb") as handle:
+            return get_content_hash(handle)
+    return get_object_hash(self.retrieved, name)
+
+
+def get_cache_key(content_hash, parser_func):
+    """
+    Get the key of a file in the cache.
+
+    :param content_hash: the sha256 hash of the file content, which is the
+        key of the file in the repository
+    :param parser_func: the function used to parse the file
+    :type parser_func: `class 'function'`
+    :returns: the key combining the content hash, parser and parser version
+    """
+    parser_name = f"{parser_func.__module__}.{parser_func.__name__}"
+    return f"{content_hash}:{parser_name}:{fileparsers.PARSER_VERSION}"
+
+
+class ParseCache:
+    """
+    Size-bounded LRU store of parsed metadata dictionaries.
+
+    :param path: path to the sqlite database, defaults to a file in the
+        AiiDA configuration directory
+    :param max_size: maximum total size in bytes of the json encoded entries
+    """
+
+    def __init__(self, path=None, max_size=DEFAULT_MAX_SIZE):
+        if path is None:
+            path = os.path.join(get_config().dirpath,
+                                "aiida_gromacs_parse_cache.sqlite")
+        self.path = path
+        self.max_size = max_size
+
+    def _connect(self):
+        """Open the database, creating the entries table if needed."""
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, "
+            "value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        return connection
+
+    def get(self, key):
+        """
+        Get a cached dictionary and mark it as recently used.
+
+        :param key: the cache key of the parsed file
+        :returns: the parsed dictionary, or None if it is not cached
+        """
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE entries SET last_used = ? WHERE key = ?",
+                               (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """
+        Store a dictionary, evicting the least recently used entries until
+        the cache fits in its maximum size.
+
+        :param key: the cache key of the parsed file
+        :param value: the parsed dictionary, must be json serialisable
+        """
+        value = json.dumps(value)
+        if len(value) > self.max_size:
+            return
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()))
+            total_size = connection.execute(
+                "SELECT SUM(size) FROM entries").fetchone()[0]
+            if total_size <= self.max_size:
+                return
+            entries = connection.execute(
+                "SELECT key, size FROM entries ORDER BY last_used").fetchall()
+            for old_key, size in entries:
+                if total_size <= self.max_size:
+                    break
+                connection.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+                total_size -= size
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM entries")
+
+    def __len__(self):
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Re-parse the logfiles of existing mdrun calculations in bulk
+"""
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+import io
+import os
+
+import click
+
+from aiida import load_profile, orm
+from aiida.manage import get_manager
+
+from aiida_gromacs.utils import fileparsers, parsecache
+
+VERSION_EXTRA = "logfile_metadata_version"
+
+
+def find_mdrun_logfiles(force=False):
+    """
+    Find the logfile nodes outputted by mdrun calculations with a single
+    query, skipping calculations already re-parsed by this version of the
+    parsers unless forced.
+
+    :param force: include calculations already re-parsed by this version
+    :returns: list of (calculation pk, logfile pk) pairs, oldest first
+    """
+    filters = {"process_type": "aiida.calculations:gromacs.mdrun"}
+    if not force:
+        filters["or"] = [
+            {"extras": {"!has_key": VERSION_EXTRA}},
+            {f"extras.{VERSION_EXTRA}": {"!==": fileparsers.PARSER_VERSION}},
+        ]
+    qb = orm.QueryBuilder()
+    qb.append(orm.CalcJobNode, tag="calc", filters=filters, project="id")
+    qb.append(orm.SinglefileData, with_incoming="calc",
+              edge_filters={"label": "logfile"}, project="id")
+    qb.order_by({"calc": {"ctime": "asc"}})
+    return qb.all()
+
+
+def load_worker_profile(profile_name):
+    """
+    Load the profile of the re-parse in a worker process, if it was not
+    inherited from the parent process.
+
+    :param profile_name: name of the profile
+    """
+    load_profile(profile_name, allow_switch=True)
+
+
+def parse_logfile_object(key):
+    """
+    Parse a logfile streamed from the repository of the profile, run in the
+    worker processes so that only the key of the logfile is sent to them.
+
+    :param key: the key of the logfile in the repository
+    :returns: dictionary of logfile metadata
+    """
+    repository = get_manager().get_profile_storage().get_repository()
+    with repository.open(key) as handle:
+        return fileparsers.parse_gromacs_logfile_lines(
+            io.TextIOWrapper(handle, encoding="utf-8", errors="replace"))
+
+
+def store_metadata(calc, metadata_dict, output):
+    """
+    Save the re-parsed metadata of a calculation and mark it as re-parsed by
+    this version of the parsers, so that an interrupted re-parse resumes
+    from the calculations still left.
+
+    :param calc: the mdrun CalcJobNode
+    :param metadata_dict: the re-parsed logfile metadata
+    :param output: "extras" to save the metadata in the logfile_metadata
+        extra of the calculation, "dict" to store a new Dict node whose uuid
+        is saved in the logfile_metadata_uuid extra
+    """
+    if output == "dict":
+        metadata_node = orm.Dict(metadata_dict)
+        metadata_node.label = "logfile_metadata"
+        metadata_node.description = f"Re-parsed logfile metadata of {calc.uuid}"
+        metadata_node.store()
+        extras = {"logfile_metadata_uuid": metadata_node.uuid}
+    else:
+        extras = {"logfile_metadata": metadata_dict}
+    extras[VERSION_EXTRA] = fileparsers.PARSER_VERSION
+    calc.base.extras.set_many(extras)
+
+
+def reparse_logfiles(processes=None, output="extras", force=False):
+    """
+    Re-parse the logfiles of all mdrun calculations in the loaded profile
+    with a pool of processes. The logfiles are found and the results stored
+    by this process, while the pool reads and parses each logfile from the
+    repository by its key, with a bounded number of logfiles waiting to be
+    parsed at a time.
+
+    :param processes: number of worker processes, defaults to the number of
+        CPUs
+    :param output: where to save the metadata, see :func:`store_metadata`
+    :param force: also re-parse calculations already re-parsed by this
+        version of the parsers
+    :returns: the number of calculations re-parsed
+    """
+    profile = load_profile()
+    logfiles = find_mdrun_logfiles(force)
+    cache = parsecache.ParseCache()
+    processes = processes or os.cpu_count()
+    pending = {} # logfiles being parsed, with their calculation and cache key
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=load_worker_profile,
+                             initargs=(profile.name,)) as executor, \
+            click.progressbar(length=len(logfiles),
+                              label="Re-parsing mdrun logfiles") as progress:
+
+        def store_finished(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                calc_pk, cache_key = pending.pop(future)
+                metadata_dict = future.result()
+                cache.put(cache_key, metadata_dict)
+                store_metadata(orm.load_node(calc_pk), metadata_dict, output)
+                progress.update(1)
+
+        for calc_pk, logfile_pk in logfiles:
+            logfile = orm.load_node(logfile_pk)
+            cache_key = parsecache.get_cache_key(
+                    parsecache.get_object_hash(logfile, logfile.filename),
+                    fileparsers.parse_gromacs_logfile)
+            metadata_dict = cache.get(cache_key)
+            if metadata_dict is not None:
+                store_metadata(orm.load_node(calc_pk), metadata_dict, output)
+                progress.update(1)
+                continue
+            key = logfile.base.repository.get_object(logfile.filename).key
+            future = executor.submit(parse_logfile_object, key)
+            pending[future] = (calc_pk, cache_key)
+            if len(pending) >= 2 * processes:
+                store_finished(FIRST_COMPLETED)
+        if pending:
+            store_finished(ALL_COMPLETED)
+
+    return len(logfiles)
@@ -2,14 +2,35 @@
 and appending nodes from previous processes to current process nodes.
 """
 
+from contextlib import closing
+import hashlib
 import os
 import re
+import threading
 import time
 import sys
 
+import kiwipy
+
 from aiida import orm
+from aiida.common.exceptions import ConfigurationError
+from aiida.common.hashing import chunked_file_hash
+from aiida.common.links import LinkType
+from aiida.manage import get_manager
 from aiida.orm.nodes.process.process import ProcessState
 
+DEFAULT_WAIT_TIMEOUT = 300 # seconds
+# how often the database is checked, in case a state change broadcast is
+# missed or the profile has no broker to broadcast them.
+POLL_INTERVAL = 10 # seconds
+ACTIVE_PROCESS_STATES = [ProcessState.CREATED.value, ProcessState.WAITING.value,
+                         ProcessState.RUNNING.value]
+# when wait_for_processes returns
+ALL_TERMINATED = "ALL_TERMINATED"
+FIRST_TERMINATED = "FIRST_TERMINATED"
+TERMINAL_PROCESS_STATES = [ProcessState.FINISHED, ProcessState.KILLED,
+                           ProcessState.EXCEPTED]
+
 
 def format_link_label(filename: str) -> str:
     """
@@ -37,76 +58,205 @@ def strip_path(input: str) -> str:
     return input.split("/")[-1]
 
 
-def build_query():
+def get_expected_output_files(process):
     """
-    Uses AiiDA querybuilder to find previously run processes and order from
-    newest to oldest
+    Get the names of the files a process is expected to output, from its
+    retrieve lists once its job has been submitted, or otherwise from the
+    file names in its Dict and List inputs, excluding its input files.
+
+    :param process: the process node
+    :type process: :py:class:`aiida.orm.ProcessNode`
+    :returns: the file names, stripped of any paths
+    :rtype: set
+    """
+    names = []
+    for retrieve_list in ["retrieve_list", "retrieve_temporary_list"]:
+        names += process.base.attributes.get(retrieve_list, None) or []
+    input_files = set()
+    for link in process.base.links.get_incoming().all():
+        if isinstance(link.node, orm.SinglefileData):
+            input_files.add(link.node.filename)
+        elif isinstance(link.node, orm.List):
+            names += link.node.get_list()
+        elif isinstance(link.node, orm.Dict):
+            names += link.node.get_dict().values()
+    return {strip_path(name) for name in names
+            if isinstance(name, str)} - input_files
+
 
-    :returns: the query entries
-    :rtype: :py:class:`aiida.orm.querybuilder.QueryBuilder`
+def find_producing_processes(filenames):
     """
+    Find the calculations still running that are expected to output any of
+    the given files.
+
+    :param filenames: names of the files
+    :type filenames: list
+    :returns: the calculation nodes
+    :rtype: list
+    """
+    filenames = {strip_path(filename) for filename in filenames}
     qb = orm.QueryBuilder()
-    qb.append(orm.ProcessNode, tag='process')
-    qb.order_by({orm.ProcessNode: {"ctime": "desc"}})
-    return qb
-
-
-def check_prev_process(qb):
-    """Wait for a previous process to finish if it is still running. The
-    process state is checked every 10 seconds for up to 5 minutes and stops 
-    when the process state is set to finished. If a previous processes takes 
-    longer than 5 minutes, the latest submitted process is exited.
-
-    :param qb: The queries of previous processes in the AiiDA database
-    :type qb: :py:class:`aiida.orm.querybuilder.QueryBuilder`
-    """
-    if qb.count() > 0:
-        # Get the most recently process that was already submitted to the
-        # daemon and check if it has finished, wait 10s if not.
-        prev_calc = qb.first()[0]
-        if prev_calc.process_state != ProcessState.EXCEPTED:  
-            timeout = time.time() + 60*5 # 5 minutes from now
-            while prev_calc.process_state != ProcessState.FINISHED:
-                print(f"Previous process status: {prev_calc.process_state}")
-                print("Waiting for previous process to finish...")
-                time.sleep(10)
-                if time.time() > timeout:
-                    sys.exit("Wait time exceeded for previous "
-                             "process to complete")
-        else:
-            sys.exit("Previous process did not complete successfully, "
-                     "please check")
-            
-
-def find_previous_file_nodes(qb):
-    """
-    For any previous processes, store nodes that are files into a list
-
-    :param qb: The queries of previous processes in the AiiDA database
-    :type qb: :py:class:`aiida.orm.querybuilder.QueryBuilder`
-    """
-    file_nodes = []
-    if qb.count() > 0:
-        for entry in qb.all():
-            # A previous calculation exists - use its output as input for the
-            # current calculation.
-            previous_calculation = entry[0]
-            for label in previous_calculation.outputs:
-                # Get the outputs from a previous process.
-                previous_output_node = previous_calculation.outputs[f"{label}"]
-                # check if the output node is a file.
-                if isinstance(previous_output_node, orm.SinglefileData):
-                    file_nodes.append(previous_output_node)
-    return file_nodes
-
-
-def append_prev_nodes(qb, inputs, process_inputs, INPUT_DIR):
+    qb.append(orm.CalculationNode, filters={
+        "attributes.process_state": {"in": ACTIVE_PROCESS_STATES}})
+    return [process for process in qb.all(flat=True)
+            if get_expected_output_files(process) & filenames]
+
+
+def wait_for_processes(processes, timeout=DEFAULT_WAIT_TIMEOUT,
+                       return_when=ALL_TERMINATED):
+    """
+    Wait for processes to terminate. The wait is woken by the state change
+    broadcasts of the processes, so it returns as soon as the last process
+    terminates, with the database checked every POLL_INTERVAL seconds in
+    case there is no broker to send the broadcasts.
+
+    :param processes: the process nodes to wait for
+    :type processes: list
+    :param timeout: maximum time to wait in seconds
+    :param return_when: ALL_TERMINATED to wait for all of the processes, or
+        FIRST_TERMINATED to return as soon as any of them terminates
+    :returns: the processes that have not terminated
+    :rtype: list
+    """
+    remaining = [process for process in processes if not process.is_terminated]
+    if len(remaining) < len(processes) and return_when == FIRST_TERMINATED:
+        return remaining
+    n_running = len(remaining)
+    if not remaining:
+        return remaining
+    state_changed = threading.Event()
+
+    def on_state_changed(_communicator, _body, sender, _subject, _correlation_id):
+        if sender in {process.pk for process in remaining}:
+            state_changed.set()
+
+    communicator = None
+    try:
+        # processes are run, and their state changes broadcast, by the daemon
+        if not get_manager().get_daemon_client().is_daemon_running:
+            raise ConfigurationError("the daemon is not running")
+        communicator = get_manager().get_communicator()
+        broadcast_filter = kiwipy.BroadcastFilter(on_state_changed)
+        for state in TERMINAL_PROCESS_STATES:
+            broadcast_filter.add_subject_filter(f"state_changed.*.{state.value}")
+        identifier = communicator.add_broadcast_subscriber(broadcast_filter)
+    except Exception as exception:  # pylint: disable=broad-except
+        # no broker is configured or it cannot be reached
+        print(f"Checking previous processes every {POLL_INTERVAL}s, "
+              f"state changes are not broadcast: {exception}")
+        communicator = None
+
+    deadline = time.monotonic() + timeout
+    n_waiting = 0
+    try:
+        while True:
+            # check after subscribing too, in case a process terminated first
+            remaining = [process for process in remaining
+                         if not process.is_terminated]
+            wait_time = deadline - time.monotonic()
+            if not remaining or wait_time <= 0:
+                break
+            if return_when == FIRST_TERMINATED and len(remaining) < n_running:
+                break
+            if len(remaining) != n_waiting:
+                n_waiting = len(remaining)
+                print("Waiting for previous processes to finish: "
+                      f"{', '.join(str(process.pk) for process in remaining)}")
+            state_changed.wait(min(POLL_INTERVAL, wait_time))
+            state_changed.clear()
+    finally:
+        if communicator is not None:
+            communicator.remove_broadcast_subscriber(identifier)
+    return remaining
+
+
+def wait_for_previous_processes(filenames, timeout=DEFAULT_WAIT_TIMEOUT):
+    """
+    Wait for the running processes expected to output any of the given
+    files, which are inputs to a new process, to finish. Processes that do
+    not output these files are not waited for. Exits if a process does not
+    finish successfully or the timeout is exceeded.
+
+    :param filenames: names of the input files of the new process
+    :type filenames: list
+    :param timeout: maximum time to wait in seconds
+    """
+    processes = find_producing_processes(filenames)
+    if not processes:
+        return
+    if wait_for_processes(processes, timeout):
+        sys.exit("Wait time exceeded for previous process to complete")
+    for process in processes:
+        if not process.is_finished_ok:
+            sys.exit(f"Previous process {process.pk} did not complete "
+                     "successfully, please check")
+
+
+def get_content_hash(file_node):
+    """
+    Hash the content of a file node in the same way as the repository of the
+    profile, whose objects are keyed by the hash of their content.
+
+    :param file_node: the file node, which may not be stored
+    :type file_node: :py:class:`aiida.orm.SinglefileData`
+    :returns: the hash of the file content
+    :rtype: str
+    """
+    key_format = get_manager().get_profile_storage().get_repository().key_format
+    with file_node.open(mode="rb") as handle:
+        return chunked_file_hash(handle, getattr(hashlib, key_format))
+
+
+def find_file_nodes_by_content(file_nodes):
+    """
+    Find stored file nodes with the same file name and content as new file
+    nodes, so that these can be reused instead of storing another copy. The
+    newest node created by a previous process is preferred, so that the
+    provenance of the file is kept, otherwise the oldest stored node is used.
+
+    :param file_nodes: the new, unstored file nodes keyed by their labels
+    :type file_nodes: dict
+    :returns: the stored nodes matching the new nodes, keyed by the labels
+    :rtype: dict
+    """
+    wanted = {} # labels of the new nodes keyed by file name and content hash
+    for label, file_node in file_nodes.items():
+        wanted.setdefault((file_node.filename, get_content_hash(file_node)),
+                          []).append(label)
+    matches = {}
+    if not wanted:
+        return matches
+
+    filenames = list({filename for filename, _ in wanted})
+    created = orm.QueryBuilder()
+    created.append(orm.ProcessNode, tag="process")
+    created.append(orm.SinglefileData, with_incoming="process",
+                   edge_filters={"type": LinkType.CREATE.value},
+                   filters={"attributes.filename": {"in": filenames}},
+                   project=["attributes.filename", "repository_metadata", "id"])
+    created.order_by({"process": {"ctime": "desc"}})
+    stored = orm.QueryBuilder()
+    stored.append(orm.SinglefileData, tag="file",
+                  filters={"attributes.filename": {"in": filenames}},
+                  project=["attributes.filename", "repository_metadata", "id"])
+    stored.order_by({"file": {"ctime": "asc"}})
+
+    for qb in [created, stored]:
+        with closing(qb.iterall()) as results:
+            for filename, repository_metadata, pk in results:
+                key = repository_metadata.get("o", {}).get(filename, {}).get("k")
+                for label in wanted.pop((filename, key), []):
+                    matches[label] = orm.load_node(pk)
+                if not wanted:
+                    return matches
+    return matches
+
+
+def append_prev_nodes(inputs, process_inputs, INPUT_DIR):
     """Checks if previous processes exists for genericMD calcs and links the 
     most recent SinglefileData type output nodes from previous processs as 
-    inputs to the new process if the file names match.
+    inputs to the new process if the file names and contents match.
 
-    :param qb: The query entries of previous processes in the AiiDA database
-    :type qb: :py:class:`aiida.orm.querybuilder.QueryBuilder`
     :param inputs: Input files for the command to be run via AiiDA
     :type inputs: list
     :param process_inputs: All inputs for the current process to be submitted
@@ -115,66 +265,41 @@ def append_prev_nodes(qb, inputs, process_inputs, INPUT_DIR):
     :returns: Updated inputs for the current process
     :rtype: dict
     """
-    file_nodes = find_previous_file_nodes(qb)
-    if file_nodes:
-        stripped_inputs = []
-        prev_files = []  # list of previous files already saved.
-        prev = {} # dict for genericMD inputs
-        for inp in inputs:  # strip input file names of any paths.
-            stripped_inputs.append(strip_path(inp))
-        for prev_file_node in file_nodes:
-            prev_output_filename = prev_file_node.base.attributes.get(
-                            "filename") # get filename of the node
-            # check if output file is an input for new process and
-            # hasn't already been included as an input.
-            if (
-                prev_output_filename in stripped_inputs
-                and prev_output_filename not in prev_files
-            ):
-                prev_files.append(prev_output_filename)
-                prev[
-                    format_link_label(prev_output_filename)
-                ] = prev_file_node
-
-        # save input files not found in previous nodes too.
-        for filename in list(inputs):
-            stripped_input = strip_path(filename)
-            if stripped_input not in prev_files:
-                prev[format_link_label(stripped_input)] = orm.SinglefileData(
-                    file=os.path.join(INPUT_DIR, filename)
-                )
-
-        # update the calculation inputs dict with new dictionary of
-        # input files including nodes from previous processes.
-        process_inputs["input_files"] = prev
+    prev = {} # dict for genericMD inputs
+    for filename in list(inputs):
+        prev[format_link_label(strip_path(filename))] = orm.SinglefileData(
+            file=os.path.join(INPUT_DIR, filename)
+        )
+    # reuse the nodes of input files with the same content from previous
+    # processes, or already stored, instead of storing another copy.
+    prev.update(find_file_nodes_by_content(prev))
+
+    # update the calculation inputs dict with new dictionary of
+    # input files including nodes from previous processes.
+    process_inputs["input_files"] = prev
     return process_inputs
 
 
-def link_previous_file_nodes(input_file_labels: dict, inputs: dict):
+def link_previous_file_nodes(input_file_labels: dict, inputs: dict,
+                             timeout=DEFAULT_WAIT_TIMEOUT):
     """
     For an incoming process, check if an input file is an output of a previous
-    process. If this is the case, then rename the node with the new label
+    process, or already stored, with the same content. If this is the case,
+    then use that node with the new label instead of the new file node.
+    Previous processes still running that output the input files are waited
+    for first.
 
     :param input_file_labels: dictionary with keys of filenames and values the
         label for the node
     :param inputs: dictionary used for all inputs for 
+    :param timeout: maximum time in seconds to wait for previous processes
     """
-    qb = build_query()
-    # if previous processes exist then check if input files are stored as
-    # previous nodes and use these nodes as inputs for new process.
-    file_nodes = find_previous_file_nodes(qb)
-    prev_files = []  # list of previous files already saved.
-    if file_nodes:
-        for prev_file_node in file_nodes:
-            prev_output_filename = prev_file_node.base.attributes.get(
-                            "filename") # get filename of the node
-            # save previous file nodes if the filenames match with current process
-            # input files
-            if (prev_output_filename in input_file_labels.keys() and 
-                    prev_output_filename not in prev_files):
-                prev_files.append(prev_output_filename)
-                label = input_file_labels[prev_output_filename]
-                inputs[label] = prev_file_node
+    wait_for_previous_processes(input_file_labels.keys(), timeout)
+    # if input files are stored as outputs of previous processes, or already
+    # stored, with the same content, use these nodes as inputs for new process.
+    new_file_nodes = {label: inputs[label] for label in input_file_labels.values()
+                      if label in inputs and not inputs[label].is_stored}
+    inputs.update(find_file_nodes_by_content(new_file_nodes))
     return inputs
 
 
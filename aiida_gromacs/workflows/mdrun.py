@@ -0,0 +1,335 @@
+"""
+aiida_gromacs
+
+A workflow running a long molecular dynamics simulation as a chain of
+mdrun calculations, each continuing from the checkpoint of the last, and
+restarting the calculations that failed.
+"""
+import os
+import re
+import tempfile
+
+from aiida import orm
+from aiida.common import AttributeDict
+from aiida.engine import BaseRestartWorkChain, ProcessHandlerReport, calcfunction, process_handler, while_
+from aiida.plugins.factories import CalculationFactory, DataFactory
+
+from aiida_gromacs.calculations.mdrun import get_thread_parameters
+from aiida_gromacs.monitors.mdrun import PERFORMANCE_EXTRA
+from aiida_gromacs.utils.fileparsers import RUN_START
+
+MdrunCalculation = CalculationFactory("gromacs.mdrun")
+MdrunParameters = DataFactory("gromacs.mdrun")
+
+# fraction of the wallclock request mdrun runs for before writing its
+# checkpoint and stopping, leaving time to write and retrieve the outputs
+MAXH_FRACTION = 0.95
+# checkpoint written when the parameters do not name one
+DEFAULT_CHECKPOINT = "state.cpt"
+# log messages of a run stopped before all its steps by -maxh or a signal
+INCOMPLETE_RUN_PATTERN = re.compile(r"Run time exceeded .* hours|Received the \w+ signal")
+# default -dds of mdrun, and the largest -dds it is raised to after a domain
+# decomposition error, by DDS_STEP at a time
+DEFAULT_DDS = 0.8
+MAX_DDS = 0.95
+DDS_STEP = 0.05
+# fraction of the -rdd of mdrun kept after a domain decomposition error
+RDD_FRACTION = 0.8
+# monitor killing the runs slower than their min_ns_per_day option
+PERFORMANCE_MONITOR = "gromacs.mdrun_performance"
+# output flags of the trajectories kept on the remote computer by each run,
+# and their output port, so that only the trajectory of the last run is stored
+STORE_LAST_OPTIONS = {"o": "trrfile", "x": "x_file"}
+
+
+def get_maxh(options):
+    """
+    Get the -maxh of mdrun from the wallclock request of a calculation.
+
+    :param options: the metadata options of the calculation
+    :returns: the maximum run time in hours, as an mdrun parameter
+    :rtype: str
+    """
+    wallclock = options.get("max_wallclock_seconds")
+    if wallclock is None:
+        wallclock = MdrunCalculation.spec().inputs["metadata"]["options"]["max_wallclock_seconds"].default
+    return f"{wallclock * MAXH_FRACTION / 3600:.4g}"
+
+
+def is_incomplete_run(logfile):
+    """
+    Check if the log of mdrun shows the last run stopped before all its steps.
+    The log of a continued run holds the logs of the runs before it.
+
+    :param logfile: the log file of the calculation
+    :returns: True if mdrun was stopped by -maxh or a signal
+    """
+    incomplete = False
+    with logfile.open() as handle:
+        for line in handle:
+            if line.startswith(RUN_START):
+                incomplete = False
+            elif INCOMPLETE_RUN_PATTERN.search(line):
+                incomplete = True
+    return incomplete
+
+
+def get_fewer_ranks(parameters, options):
+    """
+    Get the mdrun parameters running half the thread-MPI ranks, each with
+    twice the OpenMP threads, so the same cores are used.
+
+    :param parameters: dictionary of the mdrun parameters
+    :param options: the metadata options of the calculation
+    :returns: the new parameters, or None if mdrun runs a single rank or
+        its ranks are MPI ranks set by the resources
+    """
+    if options.get("derive_thread_parameters", False):
+        parameters = {**get_thread_parameters(parameters, options), **parameters}
+    if options.get("withmpi") or int(parameters.get("ntmpi", 0)) < 2:
+        return None
+    parameters = dict(parameters)
+    parameters["ntmpi"] = str(int(parameters["ntmpi"]) // 2)
+    if "ntomp" in parameters:
+        parameters["ntomp"] = str(int(parameters["ntomp"]) * 2)
+    return parameters
+
+
+def get_smaller_cells(parameters):
+    """
+    Get the mdrun parameters allowing smaller domain decomposition cells:
+    a larger -dds, leaving less margin for dynamic load balancing, and a
+    shorter -rdd, if it is set.
+
+    :param parameters: dictionary of the mdrun parameters
+    :returns: the new parameters, or None if -dds is already MAX_DDS
+    """
+    dds = float(parameters.get("dds", DEFAULT_DDS))
+    if dds >= MAX_DDS:
+        return None
+    parameters = dict(parameters)
+    parameters["dds"] = f"{min(dds + DDS_STEP, MAX_DDS):.3g}"
+    if float(parameters.get("rdd", 0)) > 0:
+        parameters["rdd"] = f"{float(parameters['rdd']) * RDD_FRACTION:.3g}"
+    return parameters
+
+
+@calcfunction
+def fetch_remote_files(remote_files, filenames):
+    """
+    Store files kept on the remote computer by a calculation.
+
+    :param remote_files: the remote_files output of the calculation
+    :param filenames: dictionary of the output port of each remote file name,
+        files that were not written are skipped
+    :returns: dictionary of the stored files by their output port
+    """
+    outputs = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for port, filename in filenames.get_dict().items():
+            if filename not in remote_files.files:
+                continue
+            path = remote_files.fetch(filename, os.path.join(workdir, filename))
+            outputs[port] = orm.SinglefileData(path)
+    return outputs
+
+
+class MdrunBaseWorkChain(BaseRestartWorkChain):
+    """
+    WorkChain running mdrun until all the steps of the simulation are run.
+
+    Each calculation stops before its wallclock request runs out, and the
+    next one continues from its checkpoint, appending to its output files.
+    The outputs of the last calculation hold the whole simulation. The
+    trajectories are kept on the remote computer by each calculation, and
+    only stored from the last one, rather than storing the whole trajectory
+    again for every calculation.
+    Calculations failing with a domain decomposition error are run again
+    with fewer ranks or smaller cells, with fewer ranks after running out of
+    memory, and from their checkpoint after a constraint or node failure.
+    Runs killed for running below their min_ns_per_day option, or stalling,
+    are continued from their checkpoint in a new job.
+    """
+
+    _process_class = MdrunCalculation
+
+    @classmethod
+    def define(cls, spec):
+        """Specify workflow recipe."""
+        super().define(spec)
+        spec.expose_inputs(MdrunCalculation, namespace="mdrun")
+        spec.expose_outputs(MdrunCalculation)
+
+        spec.outline(
+            cls.setup,
+            while_(cls.should_run_process)(
+                cls.run_process,
+                cls.inspect_process,
+            ),
+            cls.results,
+        )
+
+        spec.exit_code(410, "ERROR_UNSTABLE_SYSTEM",
+                       message="The constraints failed again after continuing from the checkpoint, the system is likely unstable.")
+        spec.exit_code(411, "ERROR_NO_DOMAIN_DECOMPOSITION",
+                       message="No domain decomposition was found with fewer ranks or smaller cells.")
+        spec.exit_code(412, "ERROR_OUT_OF_MEMORY",
+                       message="mdrun ran out of memory with a single rank.")
+
+    def setup(self):
+        """
+        Set the checkpoint and the -maxh of mdrun, unless they are given,
+        keep the trajectories on the remote computer, and monitor the
+        performance of runs with a min_ns_per_day option.
+        """
+        super().setup()
+        self.ctx.inputs = AttributeDict(self.exposed_inputs(MdrunCalculation, "mdrun"))
+
+        parameters = self.ctx.inputs.parameters.get_dict()
+        parameters.setdefault("cpo", DEFAULT_CHECKPOINT)
+        if "maxh" not in parameters:
+            parameters["maxh"] = get_maxh(self.ctx.inputs.metadata.get("options", {}))
+        if parameters != self.ctx.inputs.parameters.get_dict():
+            self.ctx.inputs.parameters = MdrunParameters(parameters)
+        self.ctx.constraint_failures = 0
+
+        # trajectories the parameters keep on the remote computer are not stored
+        options = dict(self.ctx.inputs.metadata.get("options", {}))
+        keep_remote = list(options.get("keep_remote", []))
+        self.ctx.store_last = [flag for flag in STORE_LAST_OPTIONS
+                               if flag in parameters and flag not in keep_remote]
+        if self.ctx.store_last:
+            options["keep_remote"] = keep_remote + self.ctx.store_last
+            self.ctx.inputs.metadata = {**self.ctx.inputs.metadata, "options": options}
+
+        monitors = dict(self.ctx.inputs.get("monitors", {}))
+        if "min_ns_per_day" in self.ctx.inputs.metadata.get("options", {}) and not any(
+                monitor["entry_point"] == PERFORMANCE_MONITOR for monitor in monitors.values()):
+            monitors["performance"] = orm.Dict({"entry_point": PERFORMANCE_MONITOR})
+            self.ctx.inputs.monitors = monitors
+
+    def continue_from_checkpoint(self, node):
+        """
+        Continue the run of a calculation from its checkpoint, copied with
+        the output files it appends to from the working directory of the
+        calculation.
+        """
+        parameters = self.ctx.inputs.parameters.get_dict()
+        parameters["append"] = "true"
+        self.ctx.inputs.parameters = MdrunParameters(parameters)
+        self.ctx.inputs.parent_folder = node.outputs.remote_folder
+        # the checkpoint is copied from the parent folder
+        self.ctx.inputs.pop("cpi_file", None)
+
+    @process_handler(priority=500)
+    def handle_incomplete_run(self, node):
+        """
+        Continue a run stopped by -maxh, a signal or the scheduler from its checkpoint.
+        """
+        if node.is_finished_ok:
+            if "logfile" not in node.outputs or not is_incomplete_run(node.outputs.logfile):
+                return None
+        elif node.exit_status not in (MdrunCalculation.exit_codes.ERROR_SCHEDULER_OUT_OF_WALLTIME.status,
+                                      MdrunCalculation.exit_codes.ERROR_OUT_OF_WALLTIME.status):
+            return None
+        if "remote_folder" not in node.outputs:
+            return None
+
+        self.report(f"{node.process_label}<{node.pk}> stopped before the end of the run, continuing from its checkpoint")
+        self.continue_from_checkpoint(node)
+        self.ctx.constraint_failures = 0
+        return ProcessHandlerReport(do_break=True)
+
+    @process_handler(priority=400, exit_codes=MdrunCalculation.exit_codes.ERROR_DOMAIN_DECOMPOSITION)
+    def handle_domain_decomposition(self, node):
+        """
+        Run again with half the ranks, or else with smaller domain
+        decomposition cells, when no domain decomposition was found.
+        """
+        options = self.ctx.inputs.metadata.get("options", {})
+        parameters = self.ctx.inputs.parameters.get_dict()
+        new_parameters = get_fewer_ranks(parameters, options)
+        if new_parameters is not None:
+            action = f"running with -ntmpi {new_parameters['ntmpi']}"
+        else:
+            new_parameters = get_smaller_cells(parameters)
+            if new_parameters is None:
+                self.report(f"{node.process_label}<{node.pk}> found no domain decomposition with -dds {MAX_DDS}, aborting")
+                return ProcessHandlerReport(do_break=True, exit_code=self.exit_codes.ERROR_NO_DOMAIN_DECOMPOSITION)
+            action = f"running with -dds {new_parameters['dds']}"
+
+        self.report(f"{node.process_label}<{node.pk}> found no domain decomposition, {action}")
+        self.ctx.inputs.parameters = MdrunParameters(new_parameters)
+        return ProcessHandlerReport(do_break=True)
+
+    @process_handler(priority=300, exit_codes=[
+            MdrunCalculation.exit_codes.ERROR_OUT_OF_MEMORY,
+            MdrunCalculation.exit_codes.ERROR_SCHEDULER_OUT_OF_MEMORY])
+    def handle_out_of_memory(self, node):
+        """
+        Run again with half the ranks, from the checkpoint if one was
+        written, when mdrun ran out of memory.
+        """
+        options = self.ctx.inputs.metadata.get("options", {})
+        new_parameters = get_fewer_ranks(self.ctx.inputs.parameters.get_dict(), options)
+        if new_parameters is None:
+            self.report(f"{node.process_label}<{node.pk}> ran out of memory with a single rank, aborting")
+            return ProcessHandlerReport(do_break=True, exit_code=self.exit_codes.ERROR_OUT_OF_MEMORY)
+
+        self.report(f"{node.process_label}<{node.pk}> ran out of memory, running with -ntmpi {new_parameters['ntmpi']}")
+        self.ctx.inputs.parameters = MdrunParameters(new_parameters)
+        if "cpo_file" in node.outputs:
+            self.continue_from_checkpoint(node)
+        return ProcessHandlerReport(do_break=True)
+
+    @process_handler(priority=200, exit_codes=[
+            MdrunCalculation.exit_codes.ERROR_CONSTRAINT_FAILURE,
+            MdrunCalculation.exit_codes.ERROR_SCHEDULER_NODE_FAILURE])
+    def handle_failed_run(self, node):
+        """
+        Continue a run that failed from its checkpoint, or run it again if no
+        checkpoint was written. A run whose constraints fail again is not
+        continued.
+        """
+        if node.exit_status == MdrunCalculation.exit_codes.ERROR_CONSTRAINT_FAILURE.status:
+            self.ctx.constraint_failures += 1
+            if self.ctx.constraint_failures > 1:
+                self.report(f"{node.process_label}<{node.pk}> failed the constraints again, aborting")
+                return ProcessHandlerReport(do_break=True, exit_code=self.exit_codes.ERROR_UNSTABLE_SYSTEM)
+
+        if "cpo_file" in node.outputs:
+            self.report(f"{node.process_label}<{node.pk}> failed, continuing from its checkpoint")
+            self.continue_from_checkpoint(node)
+        else:
+            self.report(f"{node.process_label}<{node.pk}> failed before writing a checkpoint, running it again")
+        return ProcessHandlerReport(do_break=True)
+
+    @process_handler(priority=100, exit_codes=MdrunCalculation.exit_codes.STOPPED_BY_MONITOR)
+    def handle_slow_run(self, node):
+        """
+        Continue a run killed for running below its min_ns_per_day option,
+        or stalling, from its checkpoint in a new job, or run it again if it
+        wrote none.
+        """
+        performance = node.base.extras.get(PERFORMANCE_EXTRA, {})
+        if performance.get("decision") != "kill":
+            return None
+
+        self.report(f"{node.process_label}<{node.pk}> was killed as {node.exit_message}, submitting it again")
+        if "cpo_file" in node.outputs:
+            self.continue_from_checkpoint(node)
+        return ProcessHandlerReport(do_break=True)
+
+    def results(self):
+        """
+        Attach the outputs of the last calculation, and store the
+        trajectories it kept on the remote computer.
+        """
+        exit_code = super().results()
+        if exit_code is not None or not self.ctx.store_last:
+            return exit_code
+        node = self.ctx.children[self.ctx.iteration - 1]
+        parameters = node.inputs.parameters
+        filenames = {STORE_LAST_OPTIONS[flag]: parameters[flag] for flag in self.ctx.store_last}
+        self.out_many(fetch_remote_files(node.outputs.remote_files, orm.Dict(filenames)))
+        return None
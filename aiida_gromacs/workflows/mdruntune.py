@@ -0,0 +1,270 @@
+"""
+aiida_gromacs
+
+A workflow benchmarking mdrun parallelisation parameters for a system on a
+computer, and choosing the fastest.
+"""
+import hashlib
+import itertools
+import json
+
+from aiida import orm
+from aiida.common import AttributeDict
+from aiida.common.hashing import chunked_file_hash
+from aiida.engine import ToContext, WorkChain, calcfunction, if_, while_
+from aiida.plugins.factories import CalculationFactory, DataFactory
+
+MdrunCalculation = CalculationFactory("gromacs.mdrun")
+MdrunParameters = DataFactory("gromacs.mdrun")
+
+# mdrun parameters that can be tuned
+TUNE_OPTIONS = ("ntmpi", "ntomp", "npme", "nstlist", "dlb", "pin")
+# benchmark every combination, or tune one parameter at a time keeping the
+# fastest values found so far
+SEARCH_METHODS = ("grid", "coordinate")
+# extra of the workchain identifying the system, computer and resources
+TUNING_EXTRA = "mdrun_tuning_key"
+
+
+def validate_search_space(value, _):
+    """Check only tunable parameters are searched, over at least one value."""
+    unknown = [key for key in value.keys() if key not in TUNE_OPTIONS]
+    if unknown:
+        return (f"search_space keys {unknown} are not one of "
+                f"{', '.join(TUNE_OPTIONS)}")
+    empty = [key for key, values in value.items()
+             if not isinstance(values, list) or not values]
+    if empty:
+        return f"search_space values of {empty} must be non-empty lists"
+    return None
+
+
+def validate_search(value, _):
+    """Check the search method is known."""
+    if value.value not in SEARCH_METHODS:
+        return f"search must be one of {', '.join(SEARCH_METHODS)}"
+    return None
+
+
+def get_stages(search_space, search):
+    """
+    Get the parameters benchmarked in each stage of the search.
+
+    :param search_space: dictionary of the values of each tuned parameter
+    :param search: "grid" for a single stage of every combination of values,
+        or "coordinate" for a stage for each parameter in turn, run with the
+        fastest values of the stages before it
+    :returns: list of stages, each a list of dictionaries of parameters
+    """
+    search_space = {key: [str(value) for value in values]
+                    for key, values in search_space.items()}
+    if search == "grid":
+        keys = list(search_space)
+        return [[dict(zip(keys, values))
+                 for values in itertools.product(*search_space.values())]]
+    return [[{key: value} for value in values]
+            for key, values in search_space.items()]
+
+
+def get_ns_per_day(logfile_metadata):
+    """
+    Get the performance of a run from the metadata parsed from its log.
+
+    :param logfile_metadata: the logfile_metadata output of the calculation
+    :returns: the performance in ns/day, or None if it was not printed
+    """
+    performance = logfile_metadata.get_dict().get("Summary", {}).get("Performance", {})
+    if "(ns/day)" not in performance:
+        return None
+    return float(performance["(ns/day)"])
+
+
+def get_tuning_key(tprfile, computer, resources, search_space, search):
+    """
+    Get the key of the tuned parameters of a system on a computer.
+
+    :param tprfile: the run input file of the system
+    :param computer: the computer running mdrun
+    :param resources: the resources requested from the scheduler
+    :param search_space: dictionary of the values of each tuned parameter
+    :param search: the search method over the search space
+    :returns: sha256 hash of the run input file, computer, resources and
+        search
+    """
+    with tprfile.open(mode="rb") as handle:
+        system_hash = chunked_file_hash(handle, hashlib.sha256)
+    search_space = {key: [str(value) for value in values]
+                    for key, values in search_space.items()}
+    key = json.dumps([system_hash, computer.uuid, resources, search_space, search],
+                     sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+@calcfunction
+def get_fastest_parameters(benchmarks):
+    """
+    Get the parameters of the fastest benchmark.
+
+    :param benchmarks: list of the benchmarked parameters and their ns/day,
+        None if the benchmark failed
+    :returns: dictionary of the values of the tuned parameters
+    """
+    benchmarks = [benchmark for benchmark in benchmarks.get_list()
+                  if benchmark["ns_per_day"] is not None]
+    fastest = max(benchmarks, key=lambda benchmark: benchmark["ns_per_day"])
+    return orm.Dict(fastest["parameters"])
+
+
+@calcfunction
+def tune_parameters(parameters, tuned):
+    """
+    Set the tuned parameters in the mdrun parameters.
+
+    :param parameters: the mdrun parameters of the production run
+    :param tuned: dictionary of the values of the tuned parameters
+    :returns: the mdrun parameters with the tuned parameters set
+    """
+    return MdrunParameters({**parameters.get_dict(), **tuned.get_dict()})
+
+
+class MdrunTuneWorkChain(WorkChain):
+    """
+    WorkChain choosing the mdrun parallelisation parameters of a system.
+
+    Short runs of the system are benchmarked with each set of parameters in
+    the search space, one at a time so that they do not compete for the
+    computer, and the parameters of the fastest are set in the parameters
+    output. The fastest values are reused for the same system, computer,
+    resources and search, rather than benchmarking again.
+    """
+
+    @classmethod
+    def define(cls, spec):
+        """Specify workflow recipe."""
+        super().define(spec)
+        spec.expose_inputs(MdrunCalculation, namespace="mdrun")
+        spec.input("search_space", valid_type=orm.Dict, validator=validate_search_space,
+                   help=f"Values of each mdrun parameter to benchmark, of {', '.join(TUNE_OPTIONS)}")
+        spec.input("search", valid_type=orm.Str, default=lambda: orm.Str("grid"),
+                   validator=validate_search,
+                   help="grid to benchmark every combination of values, or coordinate to tune "
+                        "one parameter at a time with the fastest values of the parameters before it")
+        spec.input("nsteps", valid_type=orm.Int, default=lambda: orm.Int(5000),
+                   help="Number of steps of each benchmark, the timings of the first half are not counted")
+        spec.input("use_cache", valid_type=orm.Bool, default=lambda: orm.Bool(True),
+                   help="Reuse the parameters tuned for the same system, computer, resources and search")
+
+        spec.outline(
+            cls.setup,
+            if_(cls.is_cached)(
+                cls.use_cached,
+            ).else_(
+                while_(cls.should_run_benchmark)(
+                    cls.run_benchmark,
+                    cls.inspect_benchmark,
+                ),
+                cls.result,
+            ),
+        )
+
+        spec.output("parameters", valid_type=MdrunParameters,
+                    help="The mdrun parameters with the fastest benchmarked parameters set.")
+        spec.output("tuned_parameters", valid_type=orm.Dict,
+                    help="The fastest benchmarked values of the tuned parameters.")
+
+        spec.exit_code(400, "ERROR_NO_SUCCESSFUL_BENCHMARK",
+                       message="None of the benchmarks reported their performance.")
+
+    def setup(self):
+        """Find parameters tuned before, and the stages of the search."""
+        self.ctx.inputs = AttributeDict(self.exposed_inputs(MdrunCalculation, "mdrun"))
+        options = self.ctx.inputs.metadata.get("options", {})
+        computer = self.ctx.inputs.metadata.get("computer") or self.ctx.inputs.code.computer
+        self.ctx.key = get_tuning_key(self.ctx.inputs.tprfile, computer,
+                                      dict(options.get("resources", {})),
+                                      self.inputs.search_space.get_dict(),
+                                      self.inputs.search.value)
+        self.node.base.extras.set(TUNING_EXTRA, self.ctx.key)
+
+        self.ctx.cached = None
+        if self.inputs.use_cache:
+            qb = orm.QueryBuilder()
+            qb.append(orm.WorkChainNode, tag="tune", filters={
+                "process_type": self.node.process_type,
+                "attributes.exit_status": 0,
+                f"extras.{TUNING_EXTRA}": self.ctx.key,
+            })
+            qb.append(orm.Dict, with_incoming="tune",
+                      edge_filters={"label": "tuned_parameters"})
+            qb.order_by({"tune": {"ctime": "desc"}})
+            self.ctx.cached = qb.first(flat=True)
+
+        self.ctx.stages = get_stages(self.inputs.search_space.get_dict(),
+                                     self.inputs.search.value)
+        self.ctx.stage = 0
+        self.ctx.candidates = list(self.ctx.stages[0])
+        self.ctx.fastest = {}
+        self.ctx.benchmarks = []
+
+    def is_cached(self):
+        """Check if the parameters were tuned before."""
+        return self.ctx.cached is not None
+
+    def use_cached(self):
+        """Set the parameters tuned before in the mdrun parameters."""
+        self.report(f"using the parameters <{self.ctx.cached.pk}> tuned before for this "
+                    "system, computer, resources and search")
+        self.out("tuned_parameters", self.ctx.cached)
+        self.out("parameters", tune_parameters(self.inputs.mdrun.parameters, self.ctx.cached))
+
+    def should_run_benchmark(self):
+        """Check if parameters are left to benchmark."""
+        return bool(self.ctx.candidates)
+
+    def run_benchmark(self):
+        """Run a short mdrun with the next parameters."""
+        candidate = {**self.ctx.fastest, **self.ctx.candidates.pop(0)}
+        parameters = {**self.ctx.inputs.parameters.get_dict(), **candidate}
+        # reset the counters halfway, so that the startup and load balancing
+        # are not counted
+        parameters.update({"nsteps": str(self.inputs.nsteps.value), "resethway": "true"})
+
+        inputs = AttributeDict(self.ctx.inputs)
+        inputs.parameters = MdrunParameters(parameters)
+        inputs.metadata = AttributeDict(inputs.get("metadata", {}))
+        inputs.metadata.call_link_label = f"benchmark_{len(self.ctx.benchmarks)}"
+        inputs.metadata.description = f"Benchmark {json.dumps(candidate)}"
+
+        self.ctx.candidate = candidate
+        future = self.submit(MdrunCalculation, **inputs)
+        return ToContext(benchmark=future)
+
+    def inspect_benchmark(self):
+        """Record the performance of the benchmark, and start the next stage."""
+        node = self.ctx.benchmark
+        ns_per_day = None
+        if node.is_finished_ok and "logfile_metadata" in node.outputs:
+            ns_per_day = get_ns_per_day(node.outputs.logfile_metadata)
+        if ns_per_day is None:
+            self.report(f"{node.process_label}<{node.pk}> with {self.ctx.candidate} "
+                        "did not report its performance")
+        self.ctx.benchmarks.append({"parameters": self.ctx.candidate, "ns_per_day": ns_per_day})
+
+        if self.ctx.candidates:
+            return
+        stage = [benchmark for benchmark in self.ctx.benchmarks[-len(self.ctx.stages[self.ctx.stage]):]
+                 if benchmark["ns_per_day"] is not None]
+        if stage:
+            self.ctx.fastest = max(stage, key=lambda benchmark: benchmark["ns_per_day"])["parameters"]
+        self.ctx.stage += 1
+        if self.ctx.stage < len(self.ctx.stages):
+            self.ctx.candidates = list(self.ctx.stages[self.ctx.stage])
+
+    def result(self):
+        """Output the parameters with the fastest benchmarked parameters set."""
+        if all(benchmark["ns_per_day"] is None for benchmark in self.ctx.benchmarks):
+            return self.exit_codes.ERROR_NO_SUCCESSFUL_BENCHMARK
+        tuned = get_fastest_parameters(orm.List(self.ctx.benchmarks))
+        self.out("tuned_parameters", tuned)
+        self.out("parameters", tune_parameters(self.inputs.mdrun.parameters, tuned))
+        return None
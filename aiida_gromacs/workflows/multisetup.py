@@ -0,0 +1,166 @@
+"""
+aiida_gromacs
+
+A workflow setting up many systems with the same parameters, running a
+bounded number of setups at a time.
+"""
+from aiida import orm
+from aiida.common import AttributeDict
+from aiida.common.links import validate_link_label
+from aiida.engine import ToContext, WorkChain, while_
+
+from aiida_gromacs.utils.searchprevious import format_link_label
+from aiida_gromacs.workflows.simsetup import SetupWorkChain
+
+
+def validate_max_concurrent(value, _):
+    """Check at least one setup is run at a time."""
+    if value.value < 1:
+        return "max_concurrent must be at least 1"
+    return None
+
+
+def validate_inputs(inputs, _):
+    """Check the pdb files are given, named by valid link labels."""
+    if not inputs.get("pdbfiles") and "pdb_group" not in inputs:
+        return "one of pdbfiles or pdb_group must be given"
+    for name in inputs.get("pdbfiles", {}):
+        try:
+            validate_link_label(name)
+        except ValueError as exception:
+            return f"pdbfiles name '{name}' is not a valid link label: {exception}"
+        if "__" in name:
+            return f"pdbfiles name '{name}' cannot contain a double underscore"
+    return None
+
+
+def get_systems(pdbfiles, pdb_group=None):
+    """
+    Get the pdb file of each system to set up.
+
+    :param pdbfiles: dictionary of pdb files by the name of their system
+    :param pdb_group: label of a group of pdb files, named "pdb_" followed
+        by their file name and pk, as file names may start with a digit
+    :returns: dictionary of the pdb files by the name of their system, a
+        valid link label
+    """
+    systems = dict(pdbfiles)
+    if pdb_group is not None:
+        for node in orm.load_group(pdb_group).nodes:
+            if isinstance(node, orm.SinglefileData):
+                stem = node.filename.rsplit(".", 1)[0]
+                systems[format_link_label(f"pdb_{stem}_{node.pk}")] = node
+    return systems
+
+
+class MultiSetupWorkChain(WorkChain):
+    """
+    WorkChain running the SetupWorkChain of many systems.
+
+    At most max_concurrent setups run at a time, so the daemon and the
+    scheduler queue are not flooded. The work chain waits for any running
+    setup to finish, and then starts new setups in the places of every setup
+    that has finished. The result of each setup is collected in a group.
+    """
+
+    # the work chain setting up each system
+    _setup_class = SetupWorkChain
+
+    @classmethod
+    def define(cls, spec):
+        """Specify workflow recipe."""
+        super().define(spec)
+        spec.expose_inputs(cls._setup_class, namespace="setup", exclude=("pdbfile",))
+        spec.input_namespace("pdbfiles", valid_type=orm.SinglefileData, dynamic=True,
+                             required=False, help="Input structure of each system, by its name.")
+        spec.input("pdb_group", valid_type=orm.Str, required=False,
+                   help="Label of a group of input structures.")
+        spec.input("max_concurrent", valid_type=orm.Int, default=lambda: orm.Int(10),
+                   validator=validate_max_concurrent,
+                   help="Maximum number of setups running at a time.")
+        spec.input("output_group", valid_type=orm.Str, required=False,
+                   help="Label of the group the results are added to, created if needed, "
+                        "by default named after this work chain")
+        spec.inputs.validator = validate_inputs
+
+        spec.outline(
+            cls.setup,
+            while_(cls.should_run_setups)(
+                cls.run_setups,
+            ),
+            cls.results,
+        )
+
+        spec.output_namespace("results", valid_type=orm.SinglefileData, dynamic=True,
+                              help="Trajectory of the first production run of each system.")
+
+        spec.exit_code(400, "ERROR_SETUPS_FAILED",
+                       message="The setups of some systems failed, the results of the others are collected.")
+
+    def setup(self):
+        """Find the systems to set up."""
+        pdb_group = self.inputs.pdb_group.value if "pdb_group" in self.inputs else None
+        systems = get_systems(self.inputs.get("pdbfiles", {}), pdb_group)
+        self.report(f"setting up {len(systems)} systems, {self.inputs.max_concurrent.value} at a time")
+        self.ctx.pending = [(name, node.pk) for name, node in sorted(systems.items())]
+        self.ctx.running = []
+        self.ctx.children = {}
+
+    def should_run_setups(self):
+        """Check if setups are left to start or still running."""
+        return bool(self.ctx.pending or self.ctx.running)
+
+    def run_setups(self):
+        """Start setups in the free places, and wait for any running to finish."""
+        self.ctx.running = [name for name in self.ctx.running
+                            if not orm.load_node(self.ctx.children[name]).is_terminated]
+        while self.ctx.pending and len(self.ctx.running) < self.inputs.max_concurrent.value:
+            name, pk = self.ctx.pending.pop(0)
+            inputs = AttributeDict(self.exposed_inputs(self._setup_class, "setup"))
+            inputs.pdbfile = orm.load_node(pk)
+            inputs.metadata = {
+                "call_link_label": f"setup_{name}",
+                "description": f"Setup of {name}.",
+            }
+            future = self.submit(self._setup_class, **inputs)
+            self.ctx.children[name] = future.pk
+            self.ctx.running.append(name)
+        return ToContext(**{f"setups.{name}": orm.load_node(self.ctx.children[name])
+                            for name in self.ctx.running})
+
+    def _on_awaitable_finished(self, awaitable):
+        """
+        Resume as soon as any of the running setups has finished, rather than
+        once all of them have, so that its place is filled straight away. The
+        setups still running are waited for again by the next step.
+        """
+        if awaitable not in self._awaitables:
+            # a setup waited for by an earlier step, which has already resumed
+            return
+        # stop waiting for the others before resolving, which can yield to
+        # the callbacks of setups finishing at the same time
+        self._awaitables[:] = [awaitable]
+        super()._on_awaitable_finished(awaitable)
+
+    def results(self):
+        """Collect the results of the setups in the output group."""
+        if "output_group" in self.inputs:
+            label = self.inputs.output_group.value
+        else:
+            label = f"{self.node.process_label}<{self.node.pk}>"
+        group, _ = orm.Group.collection.get_or_create(label)
+
+        failed = []
+        for name, pk in sorted(self.ctx.children.items()):
+            node = orm.load_node(pk)
+            if not node.is_finished_ok:
+                failed.append(name)
+                continue
+            self.out(f"results.{name}", node.outputs.result)
+            group.add_nodes(node.outputs.result)
+        self.report(f"added the results of {len(self.ctx.children) - len(failed)} "
+                    f"systems to group {label}")
+        if failed:
+            self.report(f"the setups of {', '.join(failed)} failed")
+            return self.exit_codes.ERROR_SETUPS_FAILED
+        return None
@@ -3,11 +3,15 @@ aiida_gromacs
 
 A workflow for setting up basic molecular dynamics simulations.
 """
-from aiida.engine import ToContext, WorkChain
-from aiida.orm import Code, SinglefileData
+import io
+import secrets
+
+from aiida.engine import ToContext, WorkChain, append_, calcfunction, if_
+from aiida.orm import Bool, Code, Dict, Int, List, SinglefileData
 from aiida.plugins.factories import CalculationFactory, DataFactory
 
 from aiida_gromacs import helpers
+from aiida_gromacs.workflows.mdrun import MdrunBaseWorkChain
 
 Pdb2gmxCalculation = CalculationFactory("gromacs.pdb2gmx")
 EditconfCalculation = CalculationFactory("gromacs.editconf")
@@ -15,6 +19,7 @@ SolvateCalculation = CalculationFactory("gromacs.solvate")
 GromppCalculation = CalculationFactory("gromacs.grompp")
 GenionCalculation = CalculationFactory("gromacs.genion")
 MdrunCalculation = CalculationFactory("gromacs.mdrun")
+PreprocessCalculation = CalculationFactory("gromacs.preprocess")
 
 Pdb2gmxParameters = DataFactory("gromacs.pdb2gmx")
 EditconfParameters = DataFactory("gromacs.editconf")
@@ -24,6 +29,65 @@ GenionParameters = DataFactory("gromacs.genion")
 MdrunParameters = DataFactory("gromacs.mdrun")
 
 
+# mdp options seeding the generated velocities and the stochastic
+# thermostats and integrators, so that each replica follows its own trajectory
+SEED_OPTIONS = ["gen_seed", "ld_seed"]
+
+
+@calcfunction
+def seed_mdpfile(mdpfile, seed):
+    """
+    Set the random seeds of an mdp file, replacing any seeds already set.
+
+    :param mdpfile: the mdp file
+    :param seed: the seed, or -1 for gromacs to pick a random seed
+    :returns: the mdp file with the seeds set
+    """
+    lines = []
+    for line in mdpfile.get_content().splitlines():
+        option = line.split(";")[0].split("=")[0].strip().replace("-", "_")
+        if option.lower() not in SEED_OPTIONS:
+            lines.append(line)
+    lines += [f"{option:<24}= {seed.value}" for option in SEED_OPTIONS]
+    content = "\n".join(lines) + "\n"
+    return SinglefileData(io.BytesIO(content.encode()), filename=mdpfile.filename)
+
+
+def seed_replica_mdpfiles(mdpfile, num_replicas, replica_seeds=None):
+    """
+    Get the production mdp file of each replica.
+
+    :param mdpfile: the production mdp file
+    :param num_replicas: the number of replicas
+    :param replica_seeds: the seed of each replica, by default a distinct
+        random seed is chosen for each of more than one replica, so that the
+        seeds are recorded in the provenance of the mdp files
+    :returns: list of the mdp file of each replica
+    """
+    if replica_seeds is None:
+        if num_replicas == 1:
+            return [mdpfile]
+        replica_seeds = set()
+        while len(replica_seeds) < num_replicas:
+            replica_seeds.add(secrets.randbelow(2**31))
+    return [seed_mdpfile(mdpfile, Int(seed)) for seed in replica_seeds]
+
+
+def validate_num_replicas(value, _):
+    """Check at least one replica is run."""
+    if value.value < 1:
+        return "num_replicas must be at least 1"
+    return None
+
+
+def validate_inputs(inputs, _):
+    """Check a seed is given for each replica."""
+    if "replica_seeds" in inputs and \
+            len(inputs["replica_seeds"]) != inputs["num_replicas"].value:
+        return "replica_seeds must have one seed for each of the num_replicas"
+    return None
+
+
 class SetupWorkChain(WorkChain):
     """WorkChain for setting up a gromacs simulation automatically."""
 
@@ -120,14 +184,55 @@ class SetupWorkChain(WorkChain):
             valid_type=MdrunParameters,
             help="Command line parameters for gmx mdrun production run",
         )
+        spec.input_namespace(
+            "mdrunmonitors",
+            valid_type=Dict,
+            required=False,
+            help="Monitors for the gmx mdrun production run, e.g. gromacs.mdrun_progress",
+        )
+        spec.input(
+            "max_iterations",
+            valid_type=Int,
+            required=False,
+            help="Maximum number of runs of each production run, which is "
+            "continued from its checkpoint when it stops early",
+        )
+        spec.input(
+            "num_replicas",
+            valid_type=Int,
+            default=lambda: Int(1),
+            validator=validate_num_replicas,
+            help="Number of independent production runs started from the "
+            "same equilibrated system",
+        )
+        spec.input(
+            "replica_seeds",
+            valid_type=List,
+            required=False,
+            help="The gen_seed and ld_seed of the production mdp of each "
+            "replica, -1 for a random seed. With more than one replica, "
+            "a distinct random seed is chosen for each by default",
+        )
+        spec.input(
+            "fused",
+            valid_type=Bool,
+            default=lambda: Bool(False),
+            help="Run the pdb2gmx, editconf, solvate, grompp and genion "
+            "steps before the minimisation in one job",
+        )
+        spec.inputs.validator = validate_inputs
 
         spec.outline(
-            cls.pdb2gmx,
-            cls.editconf,
-            cls.solvate,
-            cls.gromppions,
-            cls.genion,
-            cls.gromppmin,
+            if_(cls.is_fused)(
+                cls.preprocess,
+            ).else_(
+                cls.pdb2gmx,
+                cls.editconf,
+                cls.solvate,
+                cls.gromppions,
+                cls.genion,
+                cls.gromppmin,
+            ),
             cls.minimise,
             cls.gromppnvt,
             cls.nvtequilibrate,
@@ -138,7 +243,58 @@ class SetupWorkChain(WorkChain):
             cls.result,
         )
 
-        spec.output("result")
+        spec.output("result", help="Trajectory of the first production run.")
+        spec.output_namespace(
+            "trajectories",
+            valid_type=SinglefileData,
+            dynamic=True,
+            help="Trajectory of the production run of each replica.",
+        )
+
+        spec.exit_code(
+            400,
+            "ERROR_PRODUCTION_FAILED",
+            message="The production runs of some replicas failed, the "
+            "trajectories of the others are output.",
+        )
+
+    def is_fused(self):
+        """Check if the preprocessing steps are run in one job."""
+        return self.inputs.fused.value
+
+    def step_outputs(self, step):
+        """
+        Get the outputs of a preprocessing step, run in its own job or in
+        the fused job.
+
+        :param step: name of the step, e.g. genion
+        :returns: the outputs of the step
+        """
+        if "preprocess" in self.ctx:
+            return self.ctx.preprocess.outputs[step]
+        return self.ctx[step].outputs
+
+    def preprocess(self):
+        """Run the steps preparing the system for minimisation in one job."""
+        inputs = {
+            "code": self.inputs.local_code,
+            "pdbfile": self.inputs.pdbfile,
+            "ionsmdp": self.inputs.ionsmdp,
+            "minmdp": self.inputs.minmdp,
+            "pdb2gmx": {"parameters": self.inputs.pdb2gmxparameters},
+            "editconf": {"parameters": self.inputs.editconfparameters},
+            "solvate": {"parameters": self.inputs.solvateparameters},
+            "gromppions": {"parameters": self.inputs.gromppionsparameters},
+            "genion": {"parameters": self.inputs.genionparameters},
+            "gromppmin": {"parameters": self.inputs.gromppminparameters},
+            "metadata": {
+                "description": "prepare the system for minimisation.",
+            },
+        }
+
+        future = self.submit(PreprocessCalculation, **inputs)
+
+        return ToContext(preprocess=future)
 
     def pdb2gmx(self):
         """Convert PDB file to forcefield compliant GRO file"""
@@ -246,7 +402,7 @@ class SetupWorkChain(WorkChain):
         inputs = {
             "code": self.inputs.local_code,
             "parameters": self.inputs.minimiseparameters,
-            "tprfile": self.ctx.gromppmin.outputs.tprfile,
+            "tprfile": self.step_outputs("gromppmin").tprfile,
             "metadata": {
                 "description": "minimise system.",
             },
@@ -263,8 +419,8 @@ class SetupWorkChain(WorkChain):
             "parameters": self.inputs.gromppnvtparameters,
             "mdpfile": self.inputs.nvtmdp,
             "grofile": self.ctx.minimise.outputs.grofile,
-            "topfile": self.ctx.genion.outputs.topfile,
-            "itpfile": self.ctx.pdb2gmx.outputs.itpfile,
+            "topfile": self.step_outputs("genion").topfile,
+            "itp_files": {"itpfile0": self.step_outputs("pdb2gmx").itpfile},
             "metadata": {
                 "description": "prepare the tpr for NVT equlibration.",
             },
@@ -296,8 +452,8 @@ class SetupWorkChain(WorkChain):
             "parameters": self.inputs.gromppnptparameters,
             "mdpfile": self.inputs.nptmdp,
             "grofile": self.ctx.nvtequilibrate.outputs.grofile,
-            "topfile": self.ctx.genion.outputs.topfile,
-            "itpfile": self.ctx.pdb2gmx.outputs.itpfile,
+            "topfile": self.step_outputs("genion").topfile,
+            "itp_files": {"itpfile0": self.step_outputs("pdb2gmx").itpfile},
             "metadata": {
                 "description": "prepare the tpr for NPT equlibration.",
             },
@@ -323,25 +479,30 @@ class SetupWorkChain(WorkChain):
         return ToContext(nptequilibrate=future)
 
     def gromppprod(self):
-        """Create a tpr for production run."""
-        inputs = {
-            "code": self.inputs.local_code,
-            "parameters": self.inputs.gromppprodparameters,
-            "mdpfile": self.inputs.prodmdp,
-            "grofile": self.ctx.nptequilibrate.outputs.grofile,
-            "topfile": self.ctx.genion.outputs.topfile,
-            "itpfile": self.ctx.pdb2gmx.outputs.itpfile,
-            "metadata": {
-                "description": "prepare the tpr for production run.",
-            },
-        }
-
-        future = self.submit(GromppCalculation, **inputs)
-
-        return ToContext(gromppprod=future)
+        """Create a tpr for the production run of each replica."""
+        replica_seeds = None
+        if "replica_seeds" in self.inputs:
+            replica_seeds = self.inputs.replica_seeds.get_list()
+        mdpfiles = seed_replica_mdpfiles(self.inputs.prodmdp,
+                                         self.inputs.num_replicas.value, replica_seeds)
+        for mdpfile in mdpfiles:
+            inputs = {
+                "code": self.inputs.local_code,
+                "parameters": self.inputs.gromppprodparameters,
+                "mdpfile": mdpfile,
+                "grofile": self.ctx.nptequilibrate.outputs.grofile,
+                "topfile": self.step_outputs("genion").topfile,
+                "itp_files": {"itpfile0": self.step_outputs("pdb2gmx").itpfile},
+                "metadata": {
+                    "description": "prepare the tpr for production run.",
+                },
+            }
+
+            future = self.submit(GromppCalculation, **inputs)
+            self.to_context(gromppprod=append_(future))
 
     def prodmd(self):
-        """Run production MD"""
+        """Run production MD of all replicas at once."""
 
         if "remote_code" in self.inputs:
             code = self.inputs.remote_code
@@ -349,19 +510,33 @@ class SetupWorkChain(WorkChain):
         else:
             code = self.inputs.local_code
 
-        inputs = {
-            "code": code,
-            "parameters": self.inputs.mdrunparameters,
-            "tprfile": self.ctx.gromppprod.outputs.tprfile,
-            "metadata": {
-                "description": "Production MD.",
-            },
-        }
-
-        future = self.submit(MdrunCalculation, **inputs)
-
-        return ToContext(prodmd=future)
+        for gromppprod in self.ctx.gromppprod:
+            inputs = {
+                "code": code,
+                "parameters": self.inputs.mdrunparameters,
+                "tprfile": gromppprod.outputs.tprfile,
+            }
+            if "mdrunmonitors" in self.inputs:
+                inputs["monitors"] = dict(self.inputs.mdrunmonitors)
+            restart = {}
+            if "max_iterations" in self.inputs:
+                restart["max_iterations"] = self.inputs.max_iterations
+
+            future = self.submit(MdrunBaseWorkChain, mdrun=inputs, **restart,
+                                 metadata={"description": "Production MD."})
+            self.to_context(prodmd=append_(future))
 
     def result(self):
         """Results"""
-        self.out("result", self.ctx.prodmd.outputs.trrfile)
+        failed = []
+        for replica, prodmd in enumerate(self.ctx.prodmd):
+            if not prodmd.is_finished_ok:
+                failed.append(f"{prodmd.process_label}<{prodmd.pk}>")
+                continue
+            self.out(f"trajectories.replica_{replica}", prodmd.outputs.trrfile)
+        if self.ctx.prodmd[0].is_finished_ok:
+            self.out("result", self.ctx.prodmd[0].outputs.trrfile)
+        if failed:
+            self.report(f"the production runs {', '.join(failed)} failed")
+            return self.exit_codes.ERROR_PRODUCTION_FAILED
+        return None
@@ -5,4 +5,18 @@ in pytest style (test_calculations.py).
 """
 import os
 
+from aiida import orm
+
 TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+def get_latest_process():
+    """Get the most recently created process in the AiiDA database.
+
+    :returns: the newest process node
+    :rtype: :py:class:`aiida.orm.ProcessNode`
+    """
+    qb = orm.QueryBuilder()
+    qb.append(orm.ProcessNode)
+    qb.order_by({orm.ProcessNode: {"ctime": "desc"}})
+    return qb.first(flat=True)
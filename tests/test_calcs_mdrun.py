@@ -4,13 +4,15 @@
 import os
 
 from aiida.engine import run
-from aiida.orm import Dict
+from aiida.orm import ArrayData, Dict
 from aiida.plugins import CalculationFactory, DataFactory
 
+from aiida_gromacs.calculations.mdrun import get_thread_parameters
+
 from . import TEST_DIR
 
 
-def run_mdrun(gromacs_code):
+def run_mdrun(gromacs_code, options=None):
     """Run an instance of mdrun and return the results."""
 
     # Prepare input parameters
@@ -41,6 +43,8 @@ def run_mdrun(gromacs_code):
             "description": "mdrun test",
         },
     }
+    if options:
+        inputs["metadata"]["options"] = options
 
     result = run(CalculationFactory("gromacs.mdrun"), **inputs)
 
@@ -84,3 +88,74 @@ def test_file_name_match(gromacs_code):
         == "mdrun_1AKI_minimised.edr"
     )
     assert isinstance(result["logfile_metadata"], Dict)
+
+
+def test_energy_timeseries(gromacs_code):
+    """Test the energies in the logfile are outputted as arrays when the
+    energy_timeseries option is set."""
+
+    result = run_mdrun(gromacs_code, options={"energy_timeseries": True})
+
+    assert isinstance(result["energy_timeseries"], ArrayData)
+    assert "step" in result["energy_timeseries"].get_arraynames()
+    assert "energy_timeseries" not in run_mdrun(gromacs_code)
+
+
+def test_enfile_energies(gromacs_code):
+    """Test the energy terms in the energy file are outputted as arrays when
+    the enfile_energies option is set."""
+
+    result = run_mdrun(gromacs_code, options={"enfile_energies": True})
+
+    assert isinstance(result["enfile_energies"], ArrayData)
+    assert "Potential" in result["enfile_energies"].get_arraynames()
+    assert result["enfile_energies"].get_array("step")[0] == 0
+
+
+def test_large_file_policy_store_once(gromacs_code):
+    """Test the output files are only stored as outputs, and not in the
+    retrieved folder, with the store_once large_file_policy."""
+
+    result = run_mdrun(gromacs_code, options={"large_file_policy": "store_once"})
+
+    assert result["retrieved"].base.repository.list_object_names() == ["mdrun.out"]
+    assert (
+        result["trrfile"].base.repository.list_object_names()[0]
+        == "mdrun_1AKI_minimised.trr"
+    )
+    assert isinstance(result["logfile_metadata"], Dict)
+
+
+def test_keep_remote(gromacs_code, tmp_path):
+    """Test the trajectory is left on the remote computer with the keep_remote
+    option, and can be fetched and verified against its recorded checksum."""
+
+    result = run_mdrun(gromacs_code, options={"keep_remote": ["o"]})
+
+    assert "trrfile" not in result
+    remote_files = result["remote_files"]
+    assert list(remote_files.files) == ["mdrun_1AKI_minimised.trr"]
+    path = remote_files.fetch("mdrun_1AKI_minimised.trr", tmp_path / "md.trr")
+    assert path.stat().st_size == remote_files.files["mdrun_1AKI_minimised.trr"]["size"]
+    assert remote_files.read_bytes("mdrun_1AKI_minimised.trr", length=4) \
+        == path.read_bytes()[:4]
+
+
+def test_get_thread_parameters():
+    """Test the ranks and threads of mdrun are set from the resources, with
+    thread-MPI ranks only on one machine, pinning only when the job uses
+    every core of its machines, and the parameters given taking precedence"""
+
+    resources = {"num_machines": 1, "num_mpiprocs_per_machine": 4, "num_cores_per_mpiproc": 2}
+    options = {"resources": resources, "withmpi": False}
+    assert get_thread_parameters({}, options, 16) == {"ntmpi": "4", "ntomp": "2"}
+    assert get_thread_parameters({"ntomp": "1"}, options, 8) == {
+        "ntmpi": "4", "pin": "on", "pinoffset": "0", "pinstride": "1"}
+    assert get_thread_parameters({"nt": "8", "pinstride": "2"}, options, 8) == {
+        "pin": "on", "pinoffset": "0"}
+    assert get_thread_parameters({"pin": "off"}, options, 8) == {"ntmpi": "4", "ntomp": "2"}
+
+    resources["num_machines"] = 2
+    assert get_thread_parameters({}, options) == {"ntomp": "2"}
+    options["withmpi"] = True
+    assert get_thread_parameters({}, options) == {"ntomp": "2"}
@@ -0,0 +1,153 @@
+""" Tests for the multidir mdrun calculation
+
+"""
+import os
+import shlex
+
+from aiida import orm
+from aiida.common.links import LinkType
+from aiida.engine import run_get_node
+from aiida.plugins import DataFactory
+
+from aiida_gromacs.calculations.mdrunmultidir import (
+    MdrunMultidirCalculation,
+    get_replica_files,
+    validate_inputs,
+)
+from aiida_gromacs.parsers.mdrunmultidir import MdrunMultidirParser
+
+from . import TEST_DIR
+
+
+def test_validate_inputs():
+    """
+    Test the MPI ranks of the job must be shared equally between the replicas
+    """
+    resources = {"num_machines": 2, "num_mpiprocs_per_machine": 3}
+    inputs = {"tprfiles": {"T300": None, "T310": None},
+              "metadata": {"options": {"resources": resources}}}
+    assert validate_inputs(inputs, None) is None
+    inputs["tprfiles"]["T320"] = None
+    assert validate_inputs(inputs, None) is None
+    inputs["tprfiles"]["T330"] = None
+    assert "4 replicas" in validate_inputs(inputs, None)
+    assert validate_inputs({"tprfiles": {}}, None)
+
+
+def test_replica_files():
+    """
+    Test the output files of each replica are in its own directory
+    """
+    parameters = DataFactory("gromacs.mdrun")({"cpo": "state.cpt"})
+    replica_files = get_replica_files(parameters, ["T300", "T310"])
+    assert list(replica_files) == ["T300", "T310"]
+    assert replica_files["T310"] == {
+        "grofile": "T310/confout.gro",
+        "enfile": "T310/energy.edr",
+        "logfile": "T310/md.log",
+        "trrfile": "T310/trajectory.trr",
+        "cpo_file": "T310/state.cpt",
+    }
+
+
+def get_multidir_inputs(code, parameters):
+    """Get the inputs of a multidir mdrun calculation of two replicas."""
+    tprfile = orm.SinglefileData(os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_em.tpr"))
+    return {
+        "code": code,
+        "tprfiles": {"T310": tprfile, "T300": tprfile},
+        "parameters": DataFactory("gromacs.mdrun")(parameters),
+        "metadata": {
+            "options": {
+                "resources": {"num_machines": 1, "num_mpiprocs_per_machine": 2},
+            },
+        },
+    }
+
+
+def test_prepare_for_submission(bash_code, tmp_path, monkeypatch):
+    """
+    Test the run input file of each replica is copied to its directory, the
+    replicas are run with -multidir in the order of their names and their
+    output files are retrieved into their directories
+    """
+    inputs = get_multidir_inputs(bash_code, {"cpo": "state.cpt"})
+    inputs["metadata"].update({"dry_run": True, "store_provenance": False})
+    # the dry run writes the job folder in the working directory
+    monkeypatch.chdir(tmp_path)
+    _, node = run_get_node(MdrunMultidirCalculation, **inputs)
+    folder = node.dry_run_info["folder"]
+
+    for replica in ["T300", "T310"]:
+        path = os.path.join(folder, replica, "topol.tpr")
+        with open(path, "rb") as handle, inputs["tprfiles"][replica].open(mode="rb") as tprfile:
+            assert handle.read() == tprfile.read()
+    with open(os.path.join(folder, node.dry_run_info["script_filename"])) as handle:
+        argv = shlex.split(handle.read().splitlines()[-1])
+    assert argv[argv.index("-s") + 1] == "topol.tpr"
+    assert argv[argv.index("-multidir") + 1:argv.index("-multidir") + 3] == ["T300", "T310"]
+
+    retrieve_list = [tuple(item) if isinstance(item, list) else item
+                     for item in node.get_retrieve_list()]
+    assert "mdrun.out" in retrieve_list
+    assert ("T310/state.cpt", ".", 2) in retrieve_list
+    assert sorted(item for item in retrieve_list if isinstance(item, tuple)) == sorted(
+        (path, ".", 2) for replica in ["T300", "T310"]
+        for path in get_replica_files(inputs["parameters"], [replica])[replica].values())
+    assert not node.get_retrieve_temporary_list()
+
+
+def create_multidir_node(computer, tmp_path, missing=None):
+    """
+    Store a finished multidir mdrun calculation node of two replicas, with a
+    retrieved folder of their output files.
+
+    :param missing: path of an output file left out of the retrieved folder
+    """
+    inputs = get_multidir_inputs(None, {})
+    node = orm.CalcJobNode(computer=computer,
+                           process_type="aiida.calculations:gromacs.mdrun_multidir")
+    node.set_option("resources", {"num_machines": 1, "num_mpiprocs_per_machine": 2})
+    node.set_option("output_filename", "mdrun.out")
+    node.set_option("output_dir", str(tmp_path))
+    node.set_option("large_file_policy", "retrieve")
+    node.base.links.add_incoming(inputs["parameters"].store(), LinkType.INPUT_CALC, "parameters")
+    for replica, tprfile in inputs["tprfiles"].items():
+        node.base.links.add_incoming(tprfile.store(), LinkType.INPUT_CALC, f"tprfiles__{replica}")
+    node.store()
+
+    retrieved = orm.FolderData()
+    retrieved.base.repository.put_object_from_bytes(b"", "mdrun.out")
+    logfile = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_nvt.log")
+    for outputs in get_replica_files(inputs["parameters"], ["T300", "T310"]).values():
+        for port, path in outputs.items():
+            if path == missing:
+                continue
+            if port == "logfile":
+                retrieved.base.repository.put_object_from_file(logfile, path)
+            else:
+                retrieved.base.repository.put_object_from_bytes(b"data", path)
+    retrieved.base.links.add_incoming(node, LinkType.CREATE, "retrieved")
+    retrieved.store()
+    return node
+
+
+def test_parser(aiida_localhost, tmp_path):
+    """
+    Test the output files and logfile metadata of each replica are output in
+    its own namespace, and missing files of a replica fail the parsing
+    """
+    node = create_multidir_node(aiida_localhost, tmp_path)
+    results, calcfunction = MdrunMultidirParser.parse_from_node(node, store_provenance=False)
+    assert calcfunction.is_finished_ok
+    assert sorted(results["replicas"]) == ["T300", "T310"]
+    for replica in ["T300", "T310"]:
+        outputs = results["replicas"][replica]
+        assert sorted(outputs) == ["enfile", "grofile", "logfile", "logfile_metadata", "trrfile"]
+        assert outputs["logfile"].filename == "md.log"
+        assert outputs["logfile_metadata"]["Input Parameters"]["integrator"] == "md"
+
+    node = create_multidir_node(aiida_localhost, tmp_path, missing="T310/energy.edr")
+    _, calcfunction = MdrunMultidirParser.parse_from_node(node, store_provenance=False)
+    assert calcfunction.exit_status == \
+        MdrunMultidirCalculation.exit_codes.ERROR_MISSING_OUTPUT_FILES.status
@@ -0,0 +1,86 @@
+""" Tests for calculations
+
+"""
+import os
+
+from aiida.engine import run
+from aiida.plugins import CalculationFactory, DataFactory
+
+from aiida_gromacs.calculations.preprocess import get_output_files
+
+from . import TEST_DIR
+
+
+def run_preprocess(gromacs_code):
+    """Run an instance of the fused preprocessing steps and return the results."""
+
+    # Prepare input parameters
+    GromppParameters = DataFactory("gromacs.grompp")
+    parameters = {
+        "pdb2gmx": DataFactory("gromacs.pdb2gmx")({
+            "ff": "oplsaa", "water": "spce", "o": "1AKI_forcefield.gro",
+            "p": "1AKI_topology.top", "i": "1AKI_restraints.itp"}),
+        "editconf": DataFactory("gromacs.editconf")({
+            "center": "0", "d": "1.0", "bt": "cubic", "o": "1AKI_newbox.gro"}),
+        "solvate": DataFactory("gromacs.solvate")({
+            "cs": "spc216.gro", "o": "1AKI_solvated.gro"}),
+        "gromppions": GromppParameters({"o": "1AKI_ions.tpr"}),
+        "genion": DataFactory("gromacs.genion")({
+            "o": "1AKI_solvated_ions.gro", "pname": "NA", "nname": "CL", "neutral": "true"}),
+        "gromppmin": GromppParameters({"o": "1AKI_em.tpr"}),
+    }
+
+    SinglefileData = DataFactory("core.singlefile")
+
+    # set up calculation
+    inputs = {
+        "code": gromacs_code,
+        "pdbfile": SinglefileData(
+            file=os.path.join(TEST_DIR, "input_files", "pdb2gmx_1AKI_clean.pdb")),
+        "ionsmdp": SinglefileData(
+            file=os.path.join(TEST_DIR, "input_files", "grompp_ions.mdp")),
+        "minmdp": SinglefileData(
+            file=os.path.join(TEST_DIR, "input_files", "grompp2_min.mdp")),
+        "metadata": {
+            "description": "preprocess test",
+        },
+    }
+    for step, step_parameters in parameters.items():
+        inputs[step] = {"parameters": step_parameters}
+
+    result = run(CalculationFactory("gromacs.preprocess"), **inputs)
+
+    return result
+
+
+def test_process(gromacs_code):
+    """Test running the preprocessing steps in one calculation, with the
+    topology of each step as it was written by that step"""
+
+    result = run_preprocess(gromacs_code)
+
+    assert "tprfile" in result["gromppmin"]
+    assert result["pdb2gmx"]["topfile"].filename == "1AKI_topology.top"
+    assert "SOL" not in result["pdb2gmx"]["topfile"].get_content()
+    assert "NA" not in result["solvate"]["topfile"].get_content().split("[ molecules ]")[1]
+    assert "NA" in result["genion"]["topfile"].get_content().split("[ molecules ]")[1]
+
+
+def test_output_files():
+    """Test the earlier versions of a file written by more than one step are
+    read from the backups of gromacs"""
+
+    steps = {
+        "pdb2gmx": ([], {"grofile": "conf.gro", "topfile": "topol.top"}),
+        "solvate": ([], {"grofile": "solvated.gro", "topfile": "topol.top"}),
+        "gromppions": ([], {"tprfile": "ions.tpr"}),
+        "genion": ([], {"grofile": "ions.gro", "topfile": "topol.top"}),
+        "gromppmin": ([], {"tprfile": "ions.tpr"}),
+    }
+    assert get_output_files(steps) == {
+        "pdb2gmx": {"grofile": "conf.gro", "topfile": "#topol.top.1#"},
+        "solvate": {"grofile": "solvated.gro", "topfile": "#topol.top.2#"},
+        "gromppions": {"tprfile": "#ions.tpr.1#"},
+        "genion": {"grofile": "ions.gro", "topfile": "topol.top"},
+        "gromppmin": {"tprfile": "ions.tpr"},
+    }
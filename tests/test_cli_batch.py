@@ -0,0 +1,56 @@
+""" Test for batch cli script
+
+"""
+
+from aiida_gromacs.cli import batch
+
+BATCH_SCRIPT = """#!/bin/bash
+# prepare the system
+gmx_pdb2gmx -f 1AKI_clean.pdb -ff oplsaa -water spce \\
+    -o 1AKI_forcefield.gro -p 1AKI_topology.top -i 1AKI_restraints.itp
+
+gmx_editconf -f 1AKI_forcefield.gro -center 0 -d 1.0 -bt cubic -o 1AKI_newbox.gro
+gmx_solvate -cp 1AKI_newbox.gro -cs spc216.gro -p 1AKI_topology.top -o 1AKI_solvated.gro
+launch --code bash@localhost --command "cp 1AKI_clean.pdb copy.pdb" --inputs inputs/1AKI_clean.pdb --outputs copy.pdb
+"""
+
+
+def test_read_batch_file(tmp_path):
+    """
+    Test the commands of a batch script or YAML file are split into their
+    arguments, skipping comments and joining continued lines
+    """
+    script = tmp_path / "jobs.sh"
+    script.write_text(BATCH_SCRIPT)
+    commands = batch.read_batch_file(script)
+    assert len(commands) == 4
+    assert commands[0][-2:] == ["-i", "1AKI_restraints.itp"]
+    assert commands[3][:5] == ["launch", "--code", "bash@localhost",
+                               "--command", "cp 1AKI_clean.pdb copy.pdb"]
+
+    yaml_file = tmp_path / "jobs.yaml"
+    yaml_file.write_text("- gmx_editconf -f a.gro -o b.gro\n"
+                         "- [gmx_make_ndx, -f, b.gro]\n")
+    assert batch.read_batch_file(yaml_file) == [
+        ["gmx_editconf", "-f", "a.gro", "-o", "b.gro"],
+        ["gmx_make_ndx", "-f", "b.gro"]]
+
+
+def test_find_dependencies(tmp_path):
+    """
+    Test the input and output files of each command are found from its
+    arguments, and commands only depend on earlier commands writing the
+    files they read or write
+    """
+    script = tmp_path / "jobs.sh"
+    script.write_text(BATCH_SCRIPT)
+    cli_commands = batch.get_cli_commands()
+    commands = [batch.parse_command(args, cli_commands)
+                for args in batch.read_batch_file(script)]
+
+    assert commands[1]["inputs"] == {"1AKI_forcefield.gro"}
+    assert commands[1]["outputs"] == {"1AKI_newbox.gro"}
+    assert commands[2]["outputs"] == {"1AKI_solvated.gro", "1AKI_topology.top"}
+    assert commands[3]["name"] == "genericMD"
+    assert commands[3]["inputs"] == {"1AKI_clean.pdb"}
+    assert batch.find_dependencies(commands) == [set(), {0}, {0, 1}, set()]
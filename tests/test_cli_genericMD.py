@@ -8,9 +8,7 @@ import tempfile
 
 from aiida.orm.nodes.process.process import ProcessState
 
-from aiida_gromacs.utils import searchprevious
-
-from . import TEST_DIR
+from . import TEST_DIR, get_latest_process
 
 
 def test_launch_genericMD():
@@ -44,11 +42,8 @@ def test_launch_genericMD():
             output_dir,
         ]
     )
-    # append run process to qb
-    # pylint: disable=unused-variable
-    qb = searchprevious.build_query()
-    # pylint: disable=unsubscriptable-object
-    prev_calc = qb.first()[0]
+    # get the process run by the command
+    prev_calc = get_latest_process()
     # check the process has finished and exited correctly
     assert prev_calc.process_state == ProcessState.FINISHED
     assert prev_calc.exit_status == 0
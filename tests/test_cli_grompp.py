@@ -7,9 +7,7 @@ import subprocess
 
 from aiida.orm.nodes.process.process import ProcessState
 
-from aiida_gromacs.utils import searchprevious
-
-from . import TEST_DIR
+from . import TEST_DIR, get_latest_process
 
 
 def test_launch_grompp():
@@ -34,11 +32,8 @@ def test_launch_grompp():
             "1AKI_ions.tpr",
         ]
     )
-    # append run process to qb
-    # pylint: disable=unused-variable
-    qb = searchprevious.build_query()
-    # pylint: disable=unsubscriptable-object
-    prev_calc = qb.first()[0]
+    # get the process run by the command
+    prev_calc = get_latest_process()
     # check the process has finished and exited correctly
     assert prev_calc.process_state == ProcessState.FINISHED
     assert prev_calc.exit_status == 0
@@ -66,11 +61,8 @@ def test_launch_grompp2():
             "1AKI_min.tpr",
         ]
     )
-    # append run process to qb
-    # pylint: disable=unused-variable
-    qb = searchprevious.build_query()
-    # pylint: disable=unsubscriptable-object
-    prev_calc = qb.first()[0]
+    # get the process run by the command
+    prev_calc = get_latest_process()
     # check the process has finished and exited correctly
     assert prev_calc.process_state == ProcessState.FINISHED
     assert prev_calc.exit_status == 0
@@ -101,11 +93,8 @@ def test_launch_grompp3():
             "1AKI_nvt.tpr", 
         ]
     )
-    # append run process to qb
-    # pylint: disable=unused-variable
-    qb = searchprevious.build_query()
-    # pylint: disable=unsubscriptable-object
-    prev_calc = qb.first()[0]
+    # get the process run by the command
+    prev_calc = get_latest_process()
     # check the process has finished and exited correctly
     assert prev_calc.process_state == ProcessState.FINISHED
     assert prev_calc.exit_status == 0
\ No newline at end of file
@@ -0,0 +1,59 @@
+""" Test for launcher cli script
+
+"""
+
+import os
+import threading
+import time
+
+from aiida_gromacs.cli import launcher
+
+
+def test_launcher_runs_commands(tmp_path):
+    """
+    Test the launcher runs the commands sent to it in the working directory
+    of the sender, and refuses modules that are not CLIs of the plugin
+    """
+    socket_path = str(tmp_path / "launcher.sock")
+    thread = threading.Thread(target=launcher.serve, args=(socket_path,), daemon=True)
+    thread.start()
+    for _ in range(50):
+        if launcher.send_request({"status": True}, socket_path) is not None:
+            break
+        time.sleep(0.1)
+
+    response = launcher.send_request({
+        "module": "aiida_gromacs.cli.editconf",
+        "args": ["--bogus"],
+        "prog_name": "gmx_editconf",
+        "cwd": str(tmp_path),
+        "aiida_path": os.environ.get("AIIDA_PATH"),
+    }, socket_path)
+    assert response["exit_code"] == 2
+    assert "No such option: --bogus" in response["stderr"]
+
+    response = launcher.send_request({
+        "module": "aiida_gromacs.cli.launcher", "args": [], "cwd": str(tmp_path),
+        "aiida_path": os.environ.get("AIIDA_PATH"),
+    }, socket_path)
+    assert response["exit_code"] is None
+
+    assert launcher.send_request({"stop": True}, socket_path) is not None
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert not (tmp_path / "launcher.sock").exists()
+
+
+def test_launcher_not_running(tmp_path, monkeypatch):
+    """
+    Test commands are launched in their own process when no launcher is
+    listening on the socket
+    """
+    socket_path = tmp_path / "launcher.sock"
+    assert launcher.send_request({"status": True}, str(socket_path)) is None
+    # a socket left behind by a launcher that was not stopped
+    socket_path.touch()
+    assert launcher.send_request({"status": True}, str(socket_path)) is None
+
+    monkeypatch.setenv(launcher.SOCKET_ENV, str(socket_path))
+    assert launcher.forward_command("aiida_gromacs.cli.editconf", ["--bogus"]) is None
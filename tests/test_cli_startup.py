@@ -0,0 +1,73 @@
+""" Test the cli scripts start without importing the AiiDA engine
+
+"""
+
+import os
+import subprocess
+import sys
+
+# maximum cumulative time to import a cli module, in seconds
+IMPORT_TIME_BUDGET = 0.5
+
+CLI_MODULES = [
+    "aiida_gromacs.cli.batch",
+    "aiida_gromacs.cli.editconf",
+    "aiida_gromacs.cli.genericMD",
+    "aiida_gromacs.cli.genion",
+    "aiida_gromacs.cli.grompp",
+    "aiida_gromacs.cli.make_ndx",
+    "aiida_gromacs.cli.mdrun",
+    "aiida_gromacs.cli.pdb2gmx",
+    "aiida_gromacs.cli.solvate",
+]
+
+# modules only needed once a calculation is launched
+ENGINE_MODULES = ["aiida.engine", "aiida.orm", "sqlalchemy"]
+
+
+def get_import_times(module):
+    """
+    Import a module in a new interpreter with python -X importtime.
+
+    :param module: name of the module to import
+    :returns: the cumulative import time in seconds of each module imported
+    :rtype: dict
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True)
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            import_times[name.strip()] = int(cumulative) / 1e6
+    return import_times
+
+
+def test_cli_import_time():
+    """
+    Test the cli modules import within the time budget, without importing
+    the engine or the ORM
+    """
+    for module in CLI_MODULES:
+        import_times = get_import_times(module)
+        assert not set(ENGINE_MODULES) & set(import_times), module
+        assert import_times[module] < IMPORT_TIME_BUDGET, module
+
+
+def test_cli_help_without_profile(tmp_path):
+    """
+    Test --help and argument errors do not need an AiiDA profile
+    """
+    env = dict(os.environ, AIIDA_PATH=str(tmp_path))
+    for script in ["gmx_mdrun", "genericMD", "gmx_batch"]:
+        result = subprocess.run([script, "--help"], env=env,
+                                capture_output=True, text=True, check=True)
+        assert "Usage:" in result.stdout
+
+    result = subprocess.run(["gmx_editconf", "--bogus"], env=env,
+                            capture_output=True, text=True, check=False)
+    assert result.returncode == 2
+    assert "No such option: --bogus" in result.stderr
@@ -0,0 +1,66 @@
+""" Tests for the verdi data mdrun commands
+
+"""
+import os
+
+from click.testing import CliRunner
+
+from aiida import orm
+from aiida.common.links import LinkType
+
+from aiida_gromacs.commands.mdrun import mdrun
+from aiida_gromacs.utils import fileparsers
+
+from . import TEST_DIR
+
+
+def create_mdrun_node(computer, log_name):
+    """Store a finished mdrun calculation node with a logfile output."""
+    node = orm.CalcJobNode(computer=computer,
+                           process_type="aiida.calculations:gromacs.mdrun")
+    node.set_option("resources", {"num_machines": 1})
+    node.store()
+    logfile = orm.SinglefileData(
+        os.path.join(TEST_DIR, "input_files", f"{log_name}.log"))
+    logfile.base.links.add_incoming(node, LinkType.CREATE, "logfile")
+    logfile.store()
+    node.seal()
+    return node
+
+
+def test_reparse(aiida_localhost, monkeypatch):
+    """Test the logfiles of mdrun calculations are re-parsed into extras,
+    calculations already re-parsed are skipped when run again, and they are
+    re-parsed by a new version of the parsers."""
+
+    nodes = [create_mdrun_node(aiida_localhost, log_name)
+             for log_name in ["mdrun_1AKI_nvt", "mdrun_1AKI_minimised"]]
+
+    result = CliRunner().invoke(mdrun, ["reparse", "-n", "2"])
+    assert result.exit_code == 0
+    assert "Re-parsed the logfiles of 2 mdrun calculations" in result.output
+    for node in nodes:
+        assert node.base.extras.get("logfile_metadata_version") == fileparsers.PARSER_VERSION
+    summary = nodes[0].base.extras.get("logfile_metadata")["Summary"]
+    assert summary["Performance"]["(ns/day)"] == "37.118"
+
+    result = CliRunner().invoke(mdrun, ["reparse"])
+    assert "Re-parsed the logfiles of 0 mdrun calculations" in result.output
+
+    monkeypatch.setattr(fileparsers, "PARSER_VERSION", fileparsers.PARSER_VERSION + 1)
+    result = CliRunner().invoke(mdrun, ["reparse", "-n", "1"])
+    assert result.exit_code == 0
+    for node in nodes:
+        assert node.base.extras.get("logfile_metadata_version") == fileparsers.PARSER_VERSION
+
+
+def test_reparse_output_dict(aiida_localhost):
+    """Test the re-parsed metadata can be stored as new Dict nodes."""
+
+    node = create_mdrun_node(aiida_localhost, "mdrun_1AKI_nvt")
+
+    result = CliRunner().invoke(mdrun, ["reparse", "--output", "dict"])
+    assert result.exit_code == 0
+    metadata = orm.load_node(node.base.extras.get("logfile_metadata_uuid"))
+    assert isinstance(metadata, orm.Dict)
+    assert metadata["Input Parameters"]["integrator"] == "md"
@@ -0,0 +1,25 @@
+""" Tests for recording output files left on the remote computer
+
+"""
+import subprocess
+
+from aiida_gromacs.data import remotefiles
+
+
+def test_manifest(tmp_path):
+    """
+    Test the manifest written by the job script records the size and
+    checksum of each file, skipping files that were not produced
+    """
+    (tmp_path / "md.trr").write_bytes(b"abc")
+    (tmp_path / "state file.cpt").write_bytes(b"")
+    command = remotefiles.manifest_command(["md.trr", "state file.cpt", "md.xtc"])
+    subprocess.run(["bash", "-c", command], cwd=tmp_path, check=True)
+    with open(tmp_path / remotefiles.REMOTE_FILES_MANIFEST, encoding="utf-8") as handle:
+        files = remotefiles.parse_manifest(handle)
+    assert files == {
+        "md.trr": {"size": 3, "sha256":
+            "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"},
+        "state file.cpt": {"size": 0, "sha256":
+            "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"},
+    }
@@ -0,0 +1,131 @@
+""" Tests for monitors
+
+"""
+import os
+import re
+import time
+
+import pytest
+
+from aiida import orm
+from aiida.common.links import LinkType
+from aiida.plugins import DataFactory
+
+from aiida_gromacs.monitors import mdrun as monitors
+from aiida_gromacs.monitors.mdrun import check_performance, get_remote_time, log_progress
+
+from . import TEST_DIR
+
+
+def test_log_progress(aiida_localhost, tmp_path):
+    """Test the progress of a running mdrun is recorded from the lines
+    appended to its logfile between calls of the monitor."""
+
+    MdrunParameters = DataFactory("gromacs.mdrun")
+    parameters = MdrunParameters({"g": "md.log"}).store()
+    node = orm.CalcJobNode(computer=aiida_localhost,
+                           process_type="aiida.calculations:gromacs.mdrun")
+    node.base.links.add_incoming(parameters, LinkType.INPUT_CALC, "parameters")
+    node.set_option("resources", {"num_machines": 1})
+    node.set_remote_workdir(str(tmp_path))
+    node.store()
+
+    with open(os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_nvt.log"), "rb") as handle:
+        log = handle.read()
+    # mdrun has written the first two frames and the header of the third
+    headers = [match.start() for match in re.finditer(rb"   Step           Time", log)]
+    first_write = headers[2] + 30
+    logfile = tmp_path / "md.log"
+
+    with aiida_localhost.get_transport() as transport:
+        logfile.write_bytes(log[:first_write])
+        os.utime(logfile, (1000, 1000))
+        assert log_progress(node, transport) is None
+        progress = node.base.extras.get("mdrun_progress")
+        assert progress["step"] == 500
+        assert progress["time"] == 1.0
+        assert progress["offset"] < first_write
+
+        # a minute later the third frame has been written
+        logfile.write_bytes(log[:first_write + 300])
+        os.utime(logfile, (1060, 1060))
+        log_progress(node, transport)
+        progress = node.base.extras.get("mdrun_progress")
+        assert progress["step"] == 1000
+        assert progress["ns_per_day"] == pytest.approx(1.44)
+
+        # the run has finished and printed its performance
+        logfile.write_bytes(log)
+        log_progress(node, transport)
+        progress = node.base.extras.get("mdrun_progress")
+        assert progress["step"] == 2500
+        assert progress["ns_per_day"] == 37.118
+        assert progress["offset"] == len(log)
+
+
+def create_monitored_node(computer, workdir):
+    """Create the node of a running mdrun with a min_ns_per_day option."""
+    MdrunParameters = DataFactory("gromacs.mdrun")
+    parameters = MdrunParameters({"g": "md.log"}).store()
+    node = orm.CalcJobNode(computer=computer,
+                           process_type="aiida.calculations:gromacs.mdrun")
+    node.base.links.add_incoming(parameters, LinkType.INPUT_CALC, "parameters")
+    node.set_option("resources", {"num_machines": 1})
+    node.set_option("min_ns_per_day", 1.0)
+    node.set_remote_workdir(str(workdir))
+    return node.store()
+
+
+def test_check_performance(aiida_localhost, tmp_path, monkeypatch):
+    """Test a running mdrun is only killed once its ns/day has stayed below
+    the min_ns_per_day option for the grace period, recording the decision."""
+
+    node = create_monitored_node(aiida_localhost, tmp_path)
+    logfile = tmp_path / "md.log"
+    log = b""
+    with aiida_localhost.get_transport() as transport:
+        # 1 ps per minute is 1.44 ns/day, then 0.5 ps per minute 0.72 ns/day
+        for minute, sim_time in enumerate([0, 1, 1.5, 2, 2.5, 3]):
+            log += f"   Step           Time\n   {int(sim_time * 500)}   {sim_time:.5f}\n\n".encode()
+            logfile.write_bytes(log)
+            os.utime(logfile, (1000 + 60 * minute, 1000 + 60 * minute))
+            monkeypatch.setattr(monitors, "get_remote_time",
+                                lambda transport, now=1000 + 60 * minute: now)
+            message = check_performance(node, transport, grace_period=180)
+            performance = node.base.extras.get("mdrun_performance", {})
+            if minute == 1:
+                assert performance["decision"] == "continue"
+            elif 1 < minute < 5:
+                assert message is None
+                assert performance["decision"] == "wait"
+                assert performance["below_since"] == 1120
+
+        assert performance["ns_per_day"] == pytest.approx(0.72)
+        assert performance["decision"] == "kill"
+        assert "below the min_ns_per_day" in message
+
+
+def test_check_performance_stalled(aiida_localhost, tmp_path, monkeypatch):
+    """Test a running mdrun whose logfile stops growing is killed once it
+    has not been written for the grace period, measured against the time of
+    the remote computer."""
+
+    node = create_monitored_node(aiida_localhost, tmp_path)
+    logfile = tmp_path / "md.log"
+    log = b""
+    with aiida_localhost.get_transport() as transport:
+        # 1.44 ns/day, above the floor, until the run stalls after a minute
+        for minute, sim_time in enumerate([0, 1]):
+            log += f"   Step           Time\n   {int(sim_time * 500)}   {sim_time:.5f}\n\n".encode()
+            logfile.write_bytes(log)
+            os.utime(logfile, (1000 + 60 * minute, 1000 + 60 * minute))
+            monkeypatch.setattr(monitors, "get_remote_time",
+                                lambda transport, now=1000 + 60 * minute: now)
+            check_performance(node, transport, grace_period=180)
+        for now, decision in [(1200, "continue"), (1240, "kill")]:
+            monkeypatch.setattr(monitors, "get_remote_time", lambda transport, now=now: now)
+            message = check_performance(node, transport, grace_period=180)
+            assert node.base.extras.get("mdrun_performance")["decision"] == decision
+        assert "has not written to its logfile for 180 s" in message
+
+        assert get_remote_time(transport) == pytest.approx(time.time(), abs=5)
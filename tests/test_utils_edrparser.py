@@ -0,0 +1,67 @@
+""" Tests for the energy file reader
+
+"""
+import os
+
+import numpy as np
+import pytest
+
+from aiida_gromacs.utils import edrparser, fileparsers
+
+from . import TEST_DIR
+
+EDR_FILE = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_nvt.edr")
+
+
+def test_read_energy_file():
+    """
+    Test the energy terms in each frame of the energy file are read as
+    columns, skipping frames that only hold blocks
+    """
+    energies = edrparser.EnergyFile(EDR_FILE)
+    assert energies.version == 5
+    assert energies.nframes == 6
+    assert len(energies) == 17
+    assert list(energies.step) == [0, 500, 1000, 1500, 2000, 2500]
+    assert list(energies.time) == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+    assert energies.units["Temperature"] == "K"
+    assert energies["Temperature"].dtype == np.float64
+    assert energies["Temperature"][0] == pytest.approx(2.94025e02)
+    assert energies["Pres. DC (bar)"][-1] == pytest.approx(-2.58234e02)
+
+
+def test_energy_file_matches_logfile():
+    """
+    Test the energies read from the energy file match those printed in the
+    log file of the same run
+    """
+    log_file = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_nvt.log")
+    with open(log_file, "r", encoding="utf-8") as handle:
+        timeseries = fileparsers.parse_gromacs_energy_timeseries(handle)
+    arrays, units = edrparser.parse_gromacs_energy_file(EDR_FILE)
+    assert arrays.keys() == timeseries.keys()
+    assert units["time"] == "ps"
+    for name, values in timeseries.items():
+        np.testing.assert_allclose(arrays[name], values, rtol=1e-6)
+
+
+def test_read_truncated_energy_file(tmp_path):
+    """
+    Test reading stops at the last complete frame of a truncated energy
+    file, such as one from a run that is still going or was killed
+    """
+    truncated_file = tmp_path / "truncated.edr"
+    with open(EDR_FILE, "rb") as handle:
+        truncated_file.write_bytes(handle.read()[:-37])
+    energies = edrparser.EnergyFile(truncated_file)
+    assert list(energies.step) == [0, 500, 1000, 1500, 2000]
+    assert energies["Potential"].size == 5
+
+
+def test_read_invalid_energy_file():
+    """
+    Test a file that is not an energy file is not read
+    """
+    log_file = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_nvt.log")
+    with pytest.raises(ValueError):
+        edrparser.EnergyFile(log_file)
@@ -0,0 +1,34 @@
+""" Tests for exporting files from the repository
+
+"""
+import io
+import os
+
+from aiida_gromacs.utils import fileexport
+
+from . import TEST_DIR
+
+
+def test_export_file_on_disk(tmp_path):
+    """
+    Test a file opened from disk is exported without copying it through
+    python and its contents are unchanged
+    """
+    source = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_nvt.edr")
+    destination = tmp_path / "mdrun_1AKI_nvt.edr"
+    with open(source, "rb") as handle:
+        method = fileexport.export_file(handle, destination)
+    assert method in ["reflink", "sendfile"]
+    with open(source, "rb") as handle:
+        assert destination.read_bytes() == handle.read()
+
+
+def test_export_file_stream(tmp_path):
+    """
+    Test a file that is not on disk, such as a packed repository object,
+    is streamed to the destination
+    """
+    destination = tmp_path / "stream.txt"
+    method = fileexport.export_file(io.BytesIO(b"gromacs" * 1000), destination)
+    assert method == "copy"
+    assert destination.read_bytes() == b"gromacs" * 1000
@@ -0,0 +1,210 @@
+""" Tests for fileparsers utility functions
+
+"""
+import json
+import os
+
+from aiida_gromacs.utils import fileparsers
+
+from . import TEST_DIR
+
+
+def parse_test_logfile(log_name):
+    """Parse a logfile in the test input files directory and load the
+    metadata dictionary expected from it.
+
+    :param log_name: name of the logfile without the .log extension
+    :returns: the parsed dictionary and the expected dictionary
+    """
+    log_file = os.path.join(TEST_DIR, "input_files", f"{log_name}.log")
+    json_file = os.path.join(TEST_DIR, "input_files", f"{log_name}_metadata.json")
+    with open(log_file, "r", encoding="utf-8") as handle:
+        metadata = fileparsers.parse_gromacs_logfile_lines(handle)
+    with open(json_file, "r", encoding="utf-8") as handle:
+        expected = json.load(handle)
+    return metadata, expected
+
+
+def test_parse_md_logfile():
+    """
+    Test the metadata parsed from a logfile of an md run matches, including
+    the order of keys, the dictionary previously outputted as a json file
+    """
+    metadata, expected = parse_test_logfile("mdrun_1AKI_nvt")
+    assert json.dumps(metadata, indent=4) == json.dumps(expected, indent=4)
+
+
+def test_parse_minimisation_logfile():
+    """
+    Test the metadata parsed from a logfile of a minimisation run matches,
+    including the order of keys, the dictionary previously outputted as a
+    json file
+    """
+    metadata, expected = parse_test_logfile("mdrun_1AKI_minimised")
+    assert json.dumps(metadata, indent=4) == json.dumps(expected, indent=4)
+
+
+def test_parse_logfile_single_pass():
+    """
+    Test the logfile lines are only iterated over once, so that a file
+    handle can be streamed through the parser
+    """
+    log_file = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_nvt.log")
+    with open(log_file, "r", encoding="utf-8") as handle:
+        lines = iter(handle.readlines())
+    metadata = fileparsers.parse_gromacs_logfile_lines(lines)
+    assert metadata["Input Parameters"]["integrator"] == "md"
+    assert metadata["Summary"]["Performance"]["(ns/day)"] == "37.118"
+
+
+def test_parse_energy_timeseries():
+    """
+    Test the energies printed at each nstlog step are extracted into
+    columns, one for each energy term, and the step and time
+    """
+    log_file = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_nvt.log")
+    with open(log_file, "r", encoding="utf-8") as handle:
+        timeseries = fileparsers.parse_gromacs_energy_timeseries(handle)
+    assert len(timeseries) == 19
+    assert list(timeseries["step"]) == [0, 500, 1000, 1500, 2000, 2500]
+    assert list(timeseries["time"]) == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+    assert timeseries["Temperature"][0] == 2.94025e02
+    assert timeseries["Pres. DC (bar)"][-1] == -2.58234e02
+
+
+def test_parse_energy_timeseries_chunks():
+    """
+    Test the extracted energies do not depend on the number of frames
+    allocated at a time
+    """
+    log_file = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_minimised.log")
+    with open(log_file, "r", encoding="utf-8") as handle:
+        timeseries = fileparsers.parse_gromacs_energy_timeseries(handle)
+    with open(log_file, "r", encoding="utf-8") as handle:
+        timeseries_chunked = fileparsers.parse_gromacs_energy_timeseries(
+            handle, chunk_size=3
+        )
+    assert list(timeseries["step"]) == [0, 1, 2, 3]
+    assert timeseries.keys() == timeseries_chunked.keys()
+    for name, values in timeseries.items():
+        assert list(values) == list(timeseries_chunked[name])
+
+
+def test_parse_log_progress():
+    """
+    Test the latest step and time are found in the lines appended to a
+    logfile, leaving a step and time header without its values to be read
+    again, and the performance is found once the run has finished
+    """
+    log_file = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_nvt.log")
+    with open(log_file, "r", encoding="utf-8") as handle:
+        lines = handle.readlines()
+    headers = [i for i, line in enumerate(lines) if "   Step           Time" in line]
+
+    progress, n_read = fileparsers.parse_gromacs_log_progress(lines[:headers[2] + 1])
+    assert progress == {"step": 500, "time": 1.0}
+    assert n_read == headers[2]
+
+    progress, n_read = fileparsers.parse_gromacs_log_progress(lines[n_read:])
+    assert progress == {"step": 2500, "time": 5.0, "ns_per_day": 37.118}
+    assert n_read == len(lines) - headers[2]
+
+
+def test_parse_cycle_accounting_separate_pme_ranks():
+    """
+    Test the load imbalance statistics and the cycle accounting table of a
+    run with domain decomposition, separate PME ranks and GPU timings are
+    parsed into numbers
+    """
+    lines = [
+        " Dynamic load balancing report:\n",
+        " DLB was turned on during the run due to measured imbalance.\n",
+        " Average load imbalance: 8.6%.\n",
+        " The balanceable part of the MD step is 59%, load imbalance is computed from this.\n",
+        " Part of the total run time spent waiting due to load imbalance: 5.1%.\n",
+        " Average PME mesh/force load: 0.812\n",
+        " Part of the total run time spent waiting due to PP/PME imbalance: 2.1 %\n",
+        "\n",
+        "     R E A L   C Y C L E   A N D   T I M E   A C C O U N T I N G\n",
+        "\n",
+        "On 4 MPI ranks doing PP, each using 2 OpenMP threads, and\n",
+        "on 2 MPI ranks doing PME, each using 2 OpenMP threads\n",
+        "\n",
+        " Activity:              Num   Num      Call    Wall time         Giga-Cycles\n",
+        "                        Ranks Threads  Count      (s)         total sum    %\n",
+        "--------------------------------------------------------------------------------\n",
+        " Domain decomp.            4    2        126       0.577         13.834   2.7\n",
+        " Comm. coord.              4    2      12375       0.849         20.380   4.0\n",
+        " PME mesh *                2    2      12501       7.093         85.098  16.7\n",
+        " PME wait for PP *                                 6.938         83.248  16.3\n",
+        " Wait GPU NB nonloc.       4    2      12501       4.012         96.273  18.9\n",
+        "--------------------------------------------------------------------------------\n",
+        " Total                                            14.038        336.877 100.0\n",
+        "--------------------------------------------------------------------------------\n",
+        "(*) Note that with separate PME ranks, the walltime column actually sums to\n",
+        "    twice the total reported, but the cycle count total and % are correct.\n",
+        "--------------------------------------------------------------------------------\n",
+        " Breakdown of PME mesh activities\n",
+        "--------------------------------------------------------------------------------\n",
+        " PME 3D-FFT                2    2      50004       1.843         22.112   4.3\n",
+        "--------------------------------------------------------------------------------\n",
+        "\n",
+        " GPU timings\n",
+        "-----------------------------------------------------------------------------\n",
+        " Computing:                         Count  Wall t (s)      ms/step       %\n",
+        "-----------------------------------------------------------------------------\n",
+        " X / q H2D                          12501       0.187        0.075     5.1\n",
+        "-----------------------------------------------------------------------------\n",
+        " Force evaluation time GPU/CPU: 1.470 ms/1.402 ms = 1.049\n",
+        "\n",
+        "               Core t (s)   Wall t (s)        (%)\n",
+        "       Time:      224.608       14.038     1600.0\n",
+    ]
+    summary = fileparsers.parse_gromacs_logfile_lines(lines)["Summary"]
+    assert summary["Load Imbalance"] == {
+        "Average load imbalance (%)": 8.6,
+        "Balanceable part of MD step (%)": 59.0,
+        "Time waiting due to load imbalance (%)": 5.1,
+        "Average PME mesh/force load": 0.812,
+        "Time waiting due to PP/PME imbalance (%)": 2.1,
+    }
+    cycles = summary["Cycle Accounting"]
+    assert cycles["Parallelism"] == ("On 4 MPI ranks doing PP, each using 2 "
+            "OpenMP threads, and on 2 MPI ranks doing PME, each using 2 OpenMP threads")
+    assert list(cycles["Tasks"]) == ["Domain decomp.", "Comm. coord.", "PME mesh",
+            "PME wait for PP", "Wait GPU NB nonloc.", "Total"]
+    assert cycles["Tasks"]["PME mesh"] == {"Num Ranks": 2, "Num Threads": 2,
+            "Call Count": 12501, "Wall time (s)": 7.093, "Giga-Cycles": 85.098,
+            "%": 16.7}
+    assert cycles["Tasks"]["PME wait for PP"] == {"Wall time (s)": 6.938,
+            "Giga-Cycles": 83.248, "%": 16.3}
+    assert cycles["Breakdown of PME mesh activities"]["PME 3D-FFT"]["Call Count"] == 50004
+    assert cycles["GPU timings"]["X / q H2D"] == {"Count": 12501,
+            "Wall t (s)": 0.187, "ms/step": 0.075, "%": 5.1}
+    assert cycles["Force evaluation time GPU/CPU"] == 1.049
+    assert summary["Time"]["Core t (s)"] == "224.608"
+
+
+def test_get_mdrun_failure():
+    """
+    Test the failure of mdrun is found from its stderr and the last run in
+    its log file, and a domain decomposition error is told apart from the
+    signal stopping mdrun afterwards
+    """
+    stderr = [
+        "There is no domain decomposition for 16 ranks that is compatible with the given box",
+        "Change the number of ranks or mdrun option -rdd or -dds",
+        "Received the TERM signal, stopping within 100 steps",
+    ]
+    assert fileparsers.get_mdrun_failure(stderr) == "ERROR_DOMAIN_DECOMPOSITION"
+    assert fileparsers.get_mdrun_failure([], ["slurmstepd: error: Exceeded job memory limit"]) \
+        == "ERROR_OUT_OF_MEMORY"
+
+    logfile = [
+        "Started mdrun on rank 0 Fri Oct 17 09:00:00 2026",
+        "Step 2000: Too many LINCS warnings (1000)",
+        "Started mdrun on rank 0 Fri Oct 17 10:00:00 2026",
+        "Writing final coordinates.",
+    ]
+    assert fileparsers.get_mdrun_failure(logfile) is None
+    assert fileparsers.get_mdrun_failure(logfile[:2]) == "ERROR_CONSTRAINT_FAILURE"
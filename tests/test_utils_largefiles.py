@@ -0,0 +1,53 @@
+""" Tests for the storage policies of large output files
+
+"""
+import os
+from types import SimpleNamespace
+
+from aiida_gromacs.utils import largefiles
+
+
+def make_calc(policy):
+    """Make an object with the options of a calculation used to split its
+    retrieve list."""
+    options = SimpleNamespace(large_file_policy=policy, output_filename="mdrun.out")
+    return SimpleNamespace(metadata=SimpleNamespace(options=options))
+
+
+def test_split_retrieve_list():
+    """
+    Test the output files other than the stdout are only retrieved
+    temporarily with the store_once policies, keeping their order
+    """
+    output_files = ["mdrun.out", "md.gro", "md.edr", "md.log", "md.trr"]
+    assert largefiles.split_retrieve_list(make_calc("retrieve"), output_files) \
+        == (output_files, [])
+    for policy in ["store_once", "store_once_export"]:
+        retrieve_list, retrieve_temporary_list = largefiles.split_retrieve_list(
+            make_calc(policy), output_files)
+        assert retrieve_list == ["mdrun.out"]
+        assert retrieve_temporary_list == output_files[1:]
+
+
+def test_validate_large_file_policy():
+    """
+    Test only the known policies are accepted
+    """
+    assert largefiles.validate_large_file_policy("store_once", None) is None
+    assert "store_twice" in largefiles.validate_large_file_policy("store_twice", None)
+
+
+def test_export_temporary_file(tmp_path):
+    """
+    Test a temporary file is exported with its contents, replacing a file
+    exported before
+    """
+    source = tmp_path / "md.trr"
+    source.write_bytes(b"trajectory" * 1000)
+    destination = tmp_path / "output"
+    destination.mkdir()
+    (destination / "md.trr").write_bytes(b"old")
+    method = largefiles.export_temporary_file(source, destination / "md.trr")
+    assert method in ["hardlink", "copy"]
+    os.remove(source)
+    assert (destination / "md.trr").read_bytes() == b"trajectory" * 1000
@@ -0,0 +1,72 @@
+""" Tests for the parse cache
+
+"""
+import os
+
+from aiida import orm
+
+from aiida_gromacs.utils import fileparsers, parsecache
+
+from . import TEST_DIR
+
+
+def test_cache_key():
+    """
+    Test the cache key only depends on the content of the file and the
+    parser used
+    """
+    log_file = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_nvt.log")
+    with open(log_file, "rb") as handle:
+        content_hash = parsecache.get_content_hash(handle)
+    key = parsecache.get_cache_key(content_hash, fileparsers.parse_gromacs_logfile)
+    assert parsecache.get_cache_key(content_hash, fileparsers.parse_gromacs_logfile) == key
+    assert parsecache.get_cache_key(
+        content_hash, fileparsers.parse_gromacs_energy_timeseries) != key
+    log_file = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_minimised.log")
+    with open(log_file, "rb") as handle:
+        assert parsecache.get_cache_key(parsecache.get_content_hash(handle),
+                                        fileparsers.parse_gromacs_logfile) != key
+
+
+def test_object_hash():
+    """
+    Test the hash of a file in the repository of a stored node is its
+    object key, which is the hash of the file content
+    """
+    log_file = os.path.join(TEST_DIR, "input_files", "mdrun_1AKI_nvt.log")
+    with open(log_file, "rb") as handle:
+        content_hash = parsecache.get_content_hash(handle)
+    logfile = orm.SinglefileData(log_file)
+    assert parsecache.get_object_hash(logfile, logfile.filename) == content_hash
+    logfile.store()
+    assert parsecache.get_object_hash(logfile, logfile.filename) == content_hash
+
+
+def test_cache_get_put(tmp_path):
+    """
+    Test a stored dictionary is returned unchanged, including the order of
+    keys
+    """
+    cache = parsecache.ParseCache(path=tmp_path / "cache.sqlite")
+    assert cache.get("key") is None
+    cache.put("key", {"b": {"c": "1"}, "a": 2.5})
+    assert list(cache.get("key").items()) == [("b", {"c": "1"}), ("a", 2.5)]
+    assert len(cache) == 1
+    cache.clear()
+    assert cache.get("key") is None
+
+
+def test_cache_lru_eviction(tmp_path):
+    """
+    Test the least recently used entries are evicted once the cache is full
+    """
+    cache = parsecache.ParseCache(path=tmp_path / "cache.sqlite", max_size=100)
+    value = {"value": "x" * 30} # 43 bytes as json
+    cache.put("first", value)
+    cache.put("second", value)
+    assert cache.get("first") == value # now more recently used than second
+    cache.put("third", value)
+    assert len(cache) == 2
+    assert cache.get("second") is None
+    assert cache.get("first") == value
+    assert cache.get("third") == value
@@ -1,13 +1,19 @@
 """ Test for searchprevious utility functions
 
 """
+import io
 import os
 
+import pytest
+
 from aiida import orm
+from aiida.common.links import LinkType
+from aiida.engine import calcfunction
+from aiida.orm.nodes.process.process import ProcessState
 
 from aiida_gromacs.utils import searchprevious
 
-from . import test_calcs_genericMD
+from . import get_latest_process, test_calcs_genericMD
 
 
 def test_link_formats():
@@ -20,9 +26,72 @@ def test_link_formats():
     assert str1 == "1_consecutive_underscores_txt"
 
 
-def test_qb_returns(gromacs_code):
+@calcfunction
+def write_gro_file(content):
+    """Output a file with the given content, as a previous process would."""
+    return {"grofile": orm.SinglefileData(io.BytesIO(content.value.encode()),
+                                          filename="md.gro")}
+
+
+def test_link_previous_file_nodes_by_content():
+    """
+    Test new input files are replaced by the newest previous output, or
+    stored node, with the same name and content, and a file edited since
+    it was output is not replaced
+    """
+    first = write_gro_file(orm.Str("first"))["grofile"]
+    write_gro_file(orm.Str("second"))
+    stored = orm.SinglefileData(io.BytesIO(b"stored"), filename="md.top").store()
+
+    def new_file(content, filename):
+        return orm.SinglefileData(io.BytesIO(content), filename=filename)
+
+    inputs = searchprevious.link_previous_file_nodes(
+        {"md.gro": "grofile", "md.top": "topfile", "md.itp": "itpfile"},
+        {"grofile": new_file(b"first", "md.gro"),
+         "topfile": new_file(b"stored", "md.top"),
+         "itpfile": new_file(b"stored", "md.itp")})
+    assert inputs["grofile"].uuid == first.uuid
+    assert inputs["topfile"].uuid == stored.uuid
+    assert not inputs["itpfile"].is_stored
+
+    inputs = searchprevious.link_previous_file_nodes(
+        {"md.gro": "grofile"}, {"grofile": new_file(b"edited", "md.gro")})
+    assert not inputs["grofile"].is_stored
+
+
+def test_wait_for_previous_processes(aiida_localhost, monkeypatch):
+    """
+    Test only the running calculations that output the requested input
+    files are waited for, until the timeout
     """
-    Test for checking a query returns the correct outputs
+    monkeypatch.setattr(searchprevious, "POLL_INTERVAL", 0.1)
+    producer = orm.CalcJobNode(computer=aiida_localhost)
+    producer.base.links.add_incoming(orm.Dict({"o": "md.tpr"}).store(),
+                                     LinkType.INPUT_CALC, "parameters")
+    producer.set_process_state(ProcessState.RUNNING)
+    producer.store()
+    other = orm.CalcJobNode(computer=aiida_localhost)
+    other.set_option("retrieve_list", ["other.gro"])
+    other.set_process_state(ProcessState.WAITING)
+    other.store()
+
+    assert searchprevious.get_expected_output_files(producer) == {"md.tpr"}
+    assert searchprevious.find_producing_processes(["inputs/md.tpr"]) == [producer]
+    searchprevious.wait_for_previous_processes(["md.gro"], timeout=0.1)
+    assert searchprevious.wait_for_processes([producer], timeout=0.2) == [producer]
+    with pytest.raises(SystemExit):
+        searchprevious.wait_for_previous_processes(["md.tpr"], timeout=0.2)
+
+    producer.set_process_state(ProcessState.FINISHED)
+    producer.set_exit_status(0)
+    other.set_process_state(ProcessState.KILLED)
+    assert searchprevious.wait_for_processes([producer], timeout=5) == []
+
+
+def test_process_outputs(gromacs_code):
+    """
+    Test for checking the latest process has the correct outputs
 
     :param gromacs_code: The query entries of previous processes in the AiiDA database
     :type gromacs_code: :py:class:`aiida.orm.nodes.data.code.installed.InstalledCode`
@@ -30,17 +99,15 @@ def test_qb_returns(gromacs_code):
 
     # pylint: disable=unused-variable
     result, output_dir = test_calcs_genericMD.run_genericMD_pdb2gmx(gromacs_code)
-    qb = searchprevious.build_query()
     expected_outputs = [
-        "log",
         "pdb2gmx_1AKI_forcefield_gro",
         "pdb2gmx_1AKI_restraints_itp",
         "pdb2gmx_1AKI_topology_top",
         "remote_folder",
         "retrieved",
     ]
-    retrieved_outputs = list(qb.all()[0][0].outputs)
-    assert retrieved_outputs.sort() == expected_outputs.sort()
+    retrieved_outputs = list(get_latest_process().outputs)
+    assert sorted(retrieved_outputs) == sorted(expected_outputs)
 
 
 def test_previous_input_retrieval(gromacs_code):
@@ -55,8 +122,6 @@ def test_previous_input_retrieval(gromacs_code):
     # pylint: disable=unused-variable
     result, output_dir = test_calcs_genericMD.run_genericMD_pdb2gmx(gromacs_code)
 
-    qb = searchprevious.build_query()
-
     # input files used in editconf command
     inputs = ["pdb2gmx_1AKI_forcefield.gro"]
     input_files = {}
@@ -94,11 +159,9 @@ def test_previous_input_retrieval(gromacs_code):
 
     # check if previous processes have run and add previous outputs
     # as inputs for new process if file names match
-    process_inputs_new = {}
-    if qb.count() > 0:
-        process_inputs_new = searchprevious.append_prev_nodes(
-            qb, inputs, process_inputs.copy(), output_dir
-        )
+    process_inputs_new = searchprevious.append_prev_nodes(
+        inputs, process_inputs.copy(), output_dir
+    )
 
     # check output grofile from pdb2gmx process is an input in the
     # editconf process
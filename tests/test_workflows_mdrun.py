@@ -0,0 +1,96 @@
+""" Tests for the mdrun restart workchain
+
+"""
+import io
+
+from aiida import orm
+from aiida.common import AttributeDict
+from aiida.plugins import DataFactory
+
+from aiida_gromacs.calculations.mdrun import get_parent_files
+from aiida_gromacs.workflows.mdrun import (fetch_remote_files, get_fewer_ranks, get_maxh,
+                                          get_smaller_cells, is_incomplete_run)
+
+
+def test_get_maxh():
+    """
+    Test -maxh stops mdrun before the wallclock request runs out
+    """
+    assert get_maxh({"max_wallclock_seconds": 3600}) == "0.95"
+    assert get_maxh({}) == "22.8"
+
+
+def test_is_incomplete_run():
+    """
+    Test a log of a run stopped by -maxh is told apart from a finished run,
+    also when the finished run continued the stopped one
+    """
+    stopped = orm.SinglefileData(io.BytesIO(
+        b"Started mdrun on rank 0 Fri Oct 17 09:00:00 2026\n"
+        b"Step 2500: Run time exceeded 0.941 hours, will terminate the run within 10 steps\n"
+        b"Writing checkpoint, step 2510 at Fri Oct 17 10:00:00 2026\n"),
+        filename="md.log")
+    finished = orm.SinglefileData(io.BytesIO(
+        b"Started mdrun on rank 0 Fri Oct 17 10:01:00 2026\n"
+        b"Writing final coordinates.\nFinished mdrun on rank 0\n"),
+        filename="md.log")
+    continued = orm.SinglefileData(io.BytesIO(
+        stopped.get_content("rb") + finished.get_content("rb")), filename="md.log")
+    assert is_incomplete_run(stopped)
+    assert not is_incomplete_run(finished)
+    assert not is_incomplete_run(continued)
+
+
+def test_get_parent_files():
+    """
+    Test the output files and the checkpoint of a previous run are copied,
+    unless a checkpoint is given
+    """
+    MdrunParameters = DataFactory("gromacs.mdrun")
+    inputs = AttributeDict({
+        "parameters": MdrunParameters({"o": "prod.trr", "x": "prod.xtc", "cpo": "prod.cpt"}),
+    })
+    assert get_parent_files(inputs) == ["energy.edr", "md.log", "prod.trr", "prod.xtc", "prod.cpt"]
+
+    inputs.cpi_file = orm.SinglefileData(io.BytesIO(b""), filename="prod.cpt")
+    assert get_parent_files(inputs) == ["energy.edr", "md.log", "prod.trr", "prod.xtc"]
+
+
+def test_get_fewer_ranks():
+    """
+    Test the thread-MPI ranks set or derived from the resources are halved,
+    keeping the cores used, until a single rank is left
+    """
+    options = {"resources": {"num_machines": 1, "num_mpiprocs_per_machine": 4,
+                             "num_cores_per_mpiproc": 2}, "derive_thread_parameters": True}
+    assert get_fewer_ranks({}, options) == {"ntmpi": "2", "ntomp": "4"}
+    assert get_fewer_ranks({"ntmpi": "2", "ntomp": "4"}, options) == {"ntmpi": "1", "ntomp": "8"}
+    assert get_fewer_ranks({"ntmpi": "1"}, options) is None
+    assert get_fewer_ranks({}, {**options, "derive_thread_parameters": False}) is None
+    assert get_fewer_ranks({}, {**options, "withmpi": True}) is None
+
+
+def test_get_smaller_cells():
+    """
+    Test -dds is raised and -rdd shortened, until -dds reaches its limit
+    """
+    assert get_smaller_cells({}) == {"dds": "0.85"}
+    assert get_smaller_cells({"dds": "0.9", "rdd": "1.5"}) == {"dds": "0.95", "rdd": "1.2"}
+    assert get_smaller_cells({"dds": "0.95"}) is None
+
+
+def test_fetch_remote_files(aiida_localhost, tmp_path):
+    """
+    Test the trajectories kept on the remote computer are stored by their
+    output port, skipping the files that were not written
+    """
+    (tmp_path / "md.trr").write_bytes(b"abc")
+    RemoteFilesData = DataFactory("gromacs.remotefiles")
+    remote_files = RemoteFilesData(
+        files={"md.trr": {"size": 3, "sha256":
+            "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"}},
+        computer=aiida_localhost, remote_path=str(tmp_path))
+    outputs = fetch_remote_files(remote_files, orm.Dict({"trrfile": "md.trr", "x_file": "md.xtc"}))
+    assert list(outputs) == ["trrfile"]
+    assert outputs["trrfile"].filename == "md.trr"
+    assert outputs["trrfile"].get_content(mode="rb") == b"abc"
@@ -0,0 +1,84 @@
+""" Tests for the mdrun tuning workchain
+
+"""
+import io
+
+from aiida import orm
+from aiida.plugins import DataFactory
+
+from aiida_gromacs.workflows.mdruntune import (
+    MdrunTuneWorkChain,
+    get_fastest_parameters,
+    get_ns_per_day,
+    get_stages,
+    get_tuning_key,
+    tune_parameters,
+)
+
+
+def test_search_inputs():
+    """
+    Test only tunable parameters can be searched, with a known method
+    """
+    spec = MdrunTuneWorkChain.spec()
+    validator = spec.inputs["search_space"].validator
+    assert validator(orm.Dict({"ntmpi": ["1", "2"], "npme": ["0"]}), None) is None
+    assert validator(orm.Dict({"nsteps": ["100"]}), None)
+    assert validator(orm.Dict({"ntomp": []}), None)
+    assert spec.inputs["search"].validator(orm.Str("random"), None)
+
+
+def test_get_stages():
+    """
+    Test a grid search benchmarks every combination in one stage, and a
+    coordinate search benchmarks one parameter in each stage
+    """
+    search_space = {"ntmpi": [1, 2], "ntomp": ["4", "8"]}
+    assert get_stages(search_space, "grid") == [[
+        {"ntmpi": "1", "ntomp": "4"},
+        {"ntmpi": "1", "ntomp": "8"},
+        {"ntmpi": "2", "ntomp": "4"},
+        {"ntmpi": "2", "ntomp": "8"},
+    ]]
+    assert get_stages(search_space, "coordinate") == [
+        [{"ntmpi": "1"}, {"ntmpi": "2"}],
+        [{"ntomp": "4"}, {"ntomp": "8"}],
+    ]
+
+
+def test_tune_parameters():
+    """
+    Test the fastest benchmark is read from the logfile metadata and set in
+    the parameters, skipping failed benchmarks
+    """
+    logfile_metadata = orm.Dict({"Summary": {"Performance": {"(ns/day)": "104.213", "(hour/ns)": "0.230"}}})
+    assert get_ns_per_day(logfile_metadata) == 104.213
+    assert get_ns_per_day(orm.Dict({"Summary": {}})) is None
+
+    MdrunParameters = DataFactory("gromacs.mdrun")
+    benchmarks = orm.List([
+        {"parameters": {"ntmpi": "1", "ntomp": "8"}, "ns_per_day": 104.2},
+        {"parameters": {"ntmpi": "2", "ntomp": "4"}, "ns_per_day": 131.7},
+        {"parameters": {"ntmpi": "8", "ntomp": "1"}, "ns_per_day": None},
+    ])
+    fastest = get_fastest_parameters(benchmarks)
+    assert fastest.get_dict() == {"ntmpi": "2", "ntomp": "4"}
+    tuned = tune_parameters(MdrunParameters({"o": "prod.trr", "ntmpi": "4"}), fastest)
+    assert isinstance(tuned, MdrunParameters)
+    assert tuned["ntmpi"] == "2"
+    assert tuned["ntomp"] == "4"
+    assert tuned["o"] == "prod.trr"
+
+
+def test_get_tuning_key():
+    """
+    Test the tuned parameters are only reused for the same search
+    """
+    computer = orm.Computer(label="test_get_tuning_key", hostname="localhost",
+                            transport_type="core.local", scheduler_type="core.direct")
+    tprfile = orm.SinglefileData(io.BytesIO(b"tpr"), filename="md.tpr")
+    resources = {"num_machines": 1}
+    key = get_tuning_key(tprfile, computer, resources, {"ntmpi": [1, 2]}, "grid")
+    assert key == get_tuning_key(tprfile, computer, resources, {"ntmpi": ["1", "2"]}, "grid")
+    assert key != get_tuning_key(tprfile, computer, resources, {"ntmpi": [1, 2, 4]}, "grid")
+    assert key != get_tuning_key(tprfile, computer, resources, {"ntmpi": [1, 2]}, "coordinate")
@@ -0,0 +1,98 @@
+""" Tests for the multi-system setup workchain
+
+"""
+import io
+import stat
+
+from aiida import engine, orm
+from aiida.common.links import validate_link_label
+from aiida.plugins import CalculationFactory
+
+from aiida_gromacs.workflows.multisetup import MultiSetupWorkChain, get_systems
+
+
+def test_multisetup_inputs():
+    """
+    Test the pdb files and the number of concurrent setups are validated
+    """
+    spec = MultiSetupWorkChain.spec()
+    assert spec.inputs["max_concurrent"].validator(orm.Int(0), None)
+    assert spec.inputs["max_concurrent"].validator(orm.Int(4), None) is None
+    assert spec.inputs.validator({"pdbfiles": {}}, None)
+    assert spec.inputs.validator({"pdb_group": orm.Str("mutants")}, None) is None
+    assert spec.inputs.validator({"pdbfiles": {"1AKI": orm.SinglefileData(io.BytesIO(b"x"))}}, None)
+    assert spec.inputs.validator({"pdbfiles": {"mut__A": orm.SinglefileData(io.BytesIO(b"x"))}}, None)
+    assert "pdbfile" not in spec.inputs["setup"]
+
+
+def test_get_systems():
+    """
+    Test the pdb files of a group are named after their file name and pk,
+    alongside the pdb files given by name
+    """
+    wildtype = orm.SinglefileData(io.BytesIO(b"x"), filename="1AKI.pdb")
+    mutant = orm.SinglefileData(io.BytesIO(b"x"), filename="1AKI-D52N.pdb").store()
+    group = orm.Group(label="test_get_systems_mutants").store()
+    group.add_nodes([mutant, orm.Int(1).store()])
+
+    systems = get_systems({"wildtype": wildtype}, "test_get_systems_mutants")
+    assert systems == {"wildtype": wildtype, f"pdb_1AKI_D52N_{mutant.pk}": mutant}
+    for name in systems:
+        validate_link_label(name)
+
+
+class DelayedSetupWorkChain(engine.WorkChain):
+    """Stand-in for the setup of a system, taking as many seconds as its
+    pdb file says."""
+
+    @classmethod
+    def define(cls, spec):
+        super().define(spec)
+        spec.input("pdbfile", valid_type=orm.SinglefileData)
+        spec.input("code", valid_type=orm.AbstractCode)
+        spec.outline(cls.run_job, cls.result)
+        spec.output("result", valid_type=orm.SinglefileData)
+
+    def run_job(self):
+        """Run a job sleeping for the time in the pdb file."""
+        delay = self.inputs.pdbfile.get_content().strip()
+        future = self.submit(CalculationFactory("core.arithmetic.add"),
+                             x=orm.Int(1), y=orm.Int(1), code=self.inputs.code,
+                             metadata={"options": {"environment_variables": {"DELAY": delay}}})
+        return engine.ToContext(job=future)
+
+    def result(self):
+        """Output the pdb file."""
+        self.out("result", self.inputs.pdbfile)
+
+
+class DelayedMultiSetupWorkChain(MultiSetupWorkChain):
+    """MultiSetupWorkChain running the delayed stand-in setups."""
+
+    _setup_class = DelayedSetupWorkChain
+
+
+def test_refill_freed_places(aiida_localhost, tmp_path):
+    """
+    Test a setup is started as soon as any running setup finishes, rather
+    than once the oldest running setup has finished
+    """
+    script = tmp_path / "delayed_bash"
+    script.write_text('#!/bin/bash\nsleep "$DELAY"\nexec bash\n')
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    code = orm.InstalledCode(computer=aiida_localhost, filepath_executable=str(script),
+                             default_calc_job_plugin="core.arithmetic.add").store()
+
+    # the systems are started in the order of their names, slowest first
+    delays = {"system1": "30", "system2": "1", "system3": "1", "system4": "1"}
+    pdbfiles = {name: orm.SinglefileData(io.BytesIO(delay.encode()), filename=f"{name}.pdb")
+                for name, delay in delays.items()}
+    results, node = engine.run_get_node(DelayedMultiSetupWorkChain, setup={"code": code},
+                                        pdbfiles=pdbfiles, max_concurrent=orm.Int(2))
+    assert node.is_finished_ok
+    assert sorted(results["results"]) == sorted(delays)
+    setups = {link.link_label: link.node for link in node.base.links.get_outgoing().all()
+              if isinstance(link.node, orm.WorkChainNode)}
+    # the third setup runs in the place freed by the second, while the
+    # slow setup is still running
+    assert setups["setup_system3"].ctime < setups["setup_system1"].mtime
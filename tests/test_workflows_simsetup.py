@@ -0,0 +1,69 @@
+""" Tests for the simulation setup workchain
+
+"""
+import io
+
+from aiida import orm
+
+from aiida_gromacs.workflows.simsetup import SetupWorkChain, seed_mdpfile, seed_replica_mdpfiles
+
+
+def test_seed_mdpfile():
+    """
+    Test the seeds of an mdp file are replaced, keeping its other options
+    """
+    mdpfile = orm.SinglefileData(
+        io.BytesIO(b"integrator = md\ngen-seed = 5 ; old seed\ngen_vel = yes\n"),
+        filename="prod.mdp")
+    seeded = seed_mdpfile(mdpfile, orm.Int(42))
+    assert seeded.filename == "prod.mdp"
+    assert seeded.get_content().splitlines() == [
+        "integrator = md",
+        "gen_vel = yes",
+        "gen_seed                = 42",
+        "ld_seed                 = 42",
+    ]
+
+
+def test_replica_inputs():
+    """
+    Test the number of replicas and their seeds are validated
+    """
+    spec = SetupWorkChain.spec()
+    assert spec.inputs["num_replicas"].validator(orm.Int(0), None)
+    assert spec.inputs["num_replicas"].validator(orm.Int(3), None) is None
+    assert spec.inputs.validator(
+        {"num_replicas": orm.Int(3), "replica_seeds": orm.List([1, 2])}, None)
+    assert spec.inputs.validator(
+        {"num_replicas": orm.Int(2), "replica_seeds": orm.List([1, 2])}, None) is None
+
+
+def test_seed_replica_mdpfiles():
+    """
+    Test each replica gets a different mdp file, with a distinct random seed
+    unless the seeds are given
+    """
+    mdpfile = orm.SinglefileData(io.BytesIO(b"integrator = sd\n"), filename="prod.mdp")
+    assert seed_replica_mdpfiles(mdpfile, 1) == [mdpfile]
+
+    mdpfiles = seed_replica_mdpfiles(mdpfile, 4)
+    contents = {mdp.get_content() for mdp in mdpfiles}
+    assert len(mdpfiles) == 4
+    assert len(contents) == 4
+    for mdp in mdpfiles:
+        seed = mdp.creator.inputs.seed.value
+        assert mdp.get_content().splitlines()[-1] == f"ld_seed                 = {seed}"
+
+    mdpfiles = seed_replica_mdpfiles(mdpfile, 2, [7, 8])
+    assert [mdp.get_content().splitlines()[-1] for mdp in mdpfiles] == [
+        "ld_seed                 = 7", "ld_seed                 = 8"]
+
+
+def test_production_inputs():
+    """
+    Test the maximum number of runs of each production run is optional and
+    an exit code reports failed production runs
+    """
+    spec = SetupWorkChain.spec()
+    assert not spec.inputs["max_iterations"].required
+    assert spec.exit_codes.ERROR_PRODUCTION_FAILED.status == 400